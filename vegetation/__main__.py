@@ -0,0 +1,138 @@
+"""
+Headless runs of the Vegetation model, for batch jobs. From the repository root:
+
+    python -m vegetation --bounds -116.326332 33.975823 -116.289768 34.004147 \\
+        --steps 50 --seed 42 --agents trees.geojson --output runs/jotr-42
+
+Arguments are parsed and checked before anything else is imported, so that
+`--help` and bad arguments return immediately. The model, and with it mesa,
+mesa-geo and the geospatial stack, is only imported to run it, and the Solara
+app (and ipyleaflet) never is.
+"""
+
+import argparse
+import os
+import sys
+
+# Modules here import each other as top-level `config` and `patch` packages, as
+# when run from within this directory (e.g. by `solara run app.py`)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.paths import INITIAL_AGENTS_PATH, LOCAL_RASTER_CACHE_DIR  # noqa: E402
+
+# The small-ish bounds the Solara app runs on
+DEFAULT_BOUNDS = [-116.326332, 33.975823, -116.289768, 34.004147]
+DEFAULT_N_STEPS = 20
+LOG_LEVELS = ["OFF", "SUMMARY", "AGENT"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m vegetation",
+        description="Run the Vegetation model without the Solara app.",
+    )
+    parser.add_argument(
+        "--bounds",
+        type=float,
+        nargs=4,
+        default=DEFAULT_BOUNDS,
+        metavar=("MIN_X", "MIN_Y", "MAX_X", "MAX_Y"),
+        help="Study area bounds, in the crs given by --epsg",
+    )
+    parser.add_argument("--epsg", type=int, default=4326)
+    parser.add_argument("--steps", type=int, default=DEFAULT_N_STEPS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--agents",
+        default=INITIAL_AGENTS_PATH,
+        help="Initial Joshua trees, as a GeoJSON or GeoParquet file of points",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Directory to export every step's reporters to (see patch.export)",
+    )
+    parser.add_argument(
+        "--export-agents-every",
+        type=int,
+        default=None,
+        help="Also export every tree every this many steps",
+    )
+    parser.add_argument(
+        "--transitions",
+        default=None,
+        help="JSON file of transition parameters (see config.transitions)",
+    )
+    parser.add_argument(
+        "--aridity-series",
+        default=None,
+        help="Yearly aridity, as a raster with a band per year or a Zarr store (see patch.climate)",
+    )
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="Keep Joshua trees in numpy arrays rather than as agents",
+    )
+    parser.add_argument(
+        "--event-scheduling",
+        action="store_true",
+        help="Schedule adult and breeding trees by their next event rather than stepping them",
+    )
+    parser.add_argument(
+        "--seedling-cohorts",
+        action="store_true",
+        help="Keep seeds and seedlings as counts per cell until they're juveniles",
+    )
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="SUMMARY")
+    parser.add_argument("--raster-cache-dir", default=LOCAL_RASTER_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    min_x, min_y, max_x, max_y = args.bounds
+    if min_x >= max_x or min_y >= max_y:
+        parser.error(f"--bounds must be MIN_X MIN_Y MAX_X MAX_Y, got {args.bounds}")
+    if args.steps < 1:
+        parser.error("--steps must be at least 1")
+    if args.aridity_series is not None and not os.path.exists(args.aridity_series):
+        parser.error(f"No such file: {args.aridity_series}")
+    for path in [args.agents, args.transitions]:
+        if path is not None and not os.path.isfile(path):
+            parser.error(f"No such file: {path}")
+    if args.export_agents_every is not None and args.output is None:
+        parser.error("--export-agents-every needs --output")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from patch.events import EventLevel
+    from patch.model import Vegetation
+
+    model = Vegetation(
+        bounds=args.bounds,
+        epsg=args.epsg,
+        num_steps=args.steps,
+        export_data=args.output or False,
+        export_agents_every=args.export_agents_every,
+        vectorized=args.vectorized,
+        log_level=EventLevel[args.log_level],
+        raster_cache_dir=args.raster_cache_dir,
+        initial_agents=args.agents,
+        seed=args.seed,
+        transitions=args.transitions,
+        aridity_series=args.aridity_series,
+        event_scheduling=args.event_scheduling,
+        seedling_cohorts=args.seedling_cohorts,
+    )
+    for _ in range(args.steps):
+        model.step()
+
+    if model.exporter is not None:
+        model.exporter.close()
+        print(f"Exported to {model.exporter.directory}")
+
+    print(model.datacollector.get_model_vars_dataframe().tail(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
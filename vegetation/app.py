@@ -1,14 +1,15 @@
-import cProfile
-import pstats
 from typing import Tuple
 from ipyleaflet.leaflet import GeomanDrawControl
 
+import ipyleaflet
+import solara
+import xyzservices
+from matplotlib.figure import Figure
 from mesa.visualization import Slider, SolaraViz, make_plot_component
-from mesa_geo.visualization import make_geospace_component
-from patch.model import Vegetation, JoshuaTreeAgent
-from patch.space import VegCell
+from mesa.visualization.utils import update_counter
+from patch.model import Vegetation
+from patch.render import render_jotr_overlay
 # from patch.management import init_tree_management_control
-from config.stages import LIFE_STAGE_RGB_VIZ_MAP
 
 # Very big bounds for western JOTR
 # TST_JOTR_BOUNDS = [-116.380920, 33.933106, -116.163940, 34.042419]
@@ -30,55 +31,94 @@ TST_JOTR_BOUNDS = [-116.326332, 33.975823, -116.289768, 34.004147]
 # we wait on mesa-geo PR
 
 
+MAP_TILES = xyzservices.providers.OpenStreetMap.Mapnik
+
 model_params = {
     "num_steps": Slider("total number of steps", 20, 1, 100, 1),
     "export_data": False,
     "bounds": TST_JOTR_BOUNDS,
+    "planting_density": Slider("seedlings planted per cell", 10, 1, 100, 1),
+    "timing": {"type": "Checkbox", "value": False, "label": "Time step phases"},
 }
 
 
-def cell_portrayal(agent):
-
-    if isinstance(agent, VegCell):
+# The map is re-rendered every this many steps, see JoshuaTreeMap
+render_every = solara.reactive(1)
 
-        # This is very primitive, but essentially we color based on the furthest
-        # life stage of any Joshua Tree agent in the cell. If there are no agents,
-        # we color based on elevation.
 
-        patch_life_stages = [agent.life_stage for agent in agent.jotr_agents]
+def make_jotr_map_component(**kwargs):
+    # As mesa_geo's make_geospace_component, with kwargs passed to the map
+    def MakeJoshuaTreeMap(model):
+        return JoshuaTreeMap(model, **kwargs)
 
-        if len(patch_life_stages) > 0:
+    return MakeJoshuaTreeMap
 
-            max_stage = max(patch_life_stages)
-            rgba = LIFE_STAGE_RGB_VIZ_MAP[max_stage]
 
+@solara.component
+def JoshuaTreeMap(model, draw_control=None, **kwargs):
+    # The study area as a single image overlay, built from the rasters (see
+    # patch.render) rather than portrayed cell by cell. Joshua trees aren't
+    # drawn as agents, only through the color of their cell
+    update_counter.get()
 
-        else:
-            if not agent.refugia_status:
-                debug_normalized_elevation = int((agent.elevation / 5000) * 255)
-                rgba = (
-                    debug_normalized_elevation,
-                    debug_normalized_elevation,
-                    debug_normalized_elevation,
-                    .25,
-                )
-            else:
-                rgba = (0, 255, 0, 1)
-        return rgba
+    # Areas drawn with `draw_control` are planted in the current model, which
+    # changes whenever the app resets it
+    def connect_draw_control():
+        if draw_control is None:
+            return
+        draw_control.on_draw(model.add_agents_from_management_draw)
+        return lambda: draw_control.on_draw(
+            model.add_agents_from_management_draw, remove=True
+        )
 
-    if isinstance(agent, JoshuaTreeAgent):
+    solara.use_effect(connect_draw_control, [model])
+    if draw_control is not None:
+        kwargs = {"controls": [draw_control], **kwargs}
 
-        portrayal = {}
-        portrayal["shape"] = "circle"
-        portrayal["color"] = "red"
-        portrayal["opacity"] = 0.0
-        portrayal["fillOpacity"] = 0.0
-        portrayal["stroke"] = False
-        portrayal["radius"] = 0
+    def render():
+        # Timed as the model's "rendering" phase
+        with model.time_phase("rendering"):
+            return render_jotr_overlay(model.space)
 
-        portrayal["description"] = f"Agent ID: {agent.unique_id}"
+    url, bounds = solara.use_memo(
+        render, dependencies=[model, model.steps // render_every.value]
+    )
 
-        return portrayal
+    with solara.Column():
+        solara.SliderInt("Render map every N steps", value=render_every, min=1, max=20)
+        ipyleaflet.Map.element(
+            center=[
+                (bounds[0][0] + bounds[1][0]) / 2,
+                (bounds[0][1] + bounds[1][1]) / 2,
+            ],
+            layers=[
+                ipyleaflet.TileLayer.element(url=MAP_TILES.build_url()),
+                ipyleaflet.ImageOverlay.element(url=url, bounds=bounds),
+            ],
+            **kwargs,
+        )
+
+
+@solara.component
+def PhaseTimingPlot(model):
+    # Seconds per step spent in each phase, for models run with `timing`
+    update_counter.get()
+    if model.timer is None:
+        return solara.Markdown("Turn on *Time step phases* to plot step timings")
+
+    fig = Figure()
+    ax = fig.subplots()
+    phase_seconds = model.timer.get_phase_seconds()
+    if not phase_seconds.empty:
+        ax.stackplot(
+            phase_seconds.index,
+            phase_seconds.T.to_numpy(),
+            labels=phase_seconds.columns,
+        )
+        ax.legend(loc="upper left")
+    ax.set_xlabel("Step")
+    ax.set_ylabel("Seconds")
+    return solara.FigureMatplotlib(fig, format="png", bbox_inches="tight")
 
 
 model = Vegetation(bounds=TST_JOTR_BOUNDS)
@@ -90,13 +130,12 @@ tree_management = GeomanDrawControl(
     polyline={},
     circlemarker={}
 )
-tree_management.on_draw(model.add_agents_from_management_draw)
 
 page = SolaraViz(
     model,
     name="Veg Model",
     components=[
-        make_geospace_component(cell_portrayal, zoom=14, controls = [tree_management]),
+        make_jotr_map_component(zoom=14, draw_control=tree_management),
         make_plot_component(
             [
                 "Mean Age",
@@ -111,6 +150,7 @@ page = SolaraViz(
         make_plot_component(
             ["% Refugia Cells Occupied"],
         ),
+        PhaseTimingPlot,
     ],
     model_params=model_params,
 )
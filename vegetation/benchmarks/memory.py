@@ -0,0 +1,207 @@
+"""
+Memory per JoshuaTreeAgent and per VegCell, on a synthetic raster.
+
+Run from the `vegetation` directory, e.g.
+
+    python -m benchmarks.memory --n-agents 100000 --n-cells 100000 --output memory.json
+
+Bytes are what creating the objects allocates, including the model's and the
+space's references to them: Python allocations as traced by tracemalloc, and
+(on Linux) the growth of the process's RSS, which also counts allocations made
+outside Python, e.g. by GEOS for shapely geometries. What bare GeoAgents cost
+is measured too, since part of any agent's cost is mesa's and mesa-geo's own
+bookkeeping. Compare runs between commits to see what a change to either
+layout costs or saves.
+"""
+
+import argparse
+import gc
+import json
+import resource
+import sys
+import tempfile
+import tracemalloc
+
+import mesa_geo as mg
+import numpy as np
+
+from benchmarks.run import get_git_commit
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents
+
+DEFAULT_RASTER_SIZE = 400
+DEFAULT_N_AGENTS = 100000
+DEFAULT_N_CELLS = 100000
+STATM_PATH = "/proc/self/statm"
+
+
+def get_rss_bytes():
+    # Current (not peak) RSS, or None where /proc isn't available
+    try:
+        with open(STATM_PATH) as f:
+            n_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return n_pages * resource.getpagesize()
+
+
+def measure(fn, n):
+    # (traced bytes, RSS bytes) per object of fn(), which creates n of them
+    gc.collect()
+    rss_at_start = get_rss_bytes()
+    tracemalloc.start()
+    traced_at_start, _ = tracemalloc.get_traced_memory()
+    objects = fn()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = get_rss_bytes()
+
+    rss_per_object = None
+    if rss_at_start is not None:
+        rss_per_object = (rss - rss_at_start) / n
+    return objects, (traced - traced_at_start) / n, rss_per_object
+
+
+def measure_cells(model, n_cells, rng):
+    # Views of cells that haven't been touched yet, with no trees linked
+    layer = model.space.raster_layer
+    n_cells = min(n_cells, layer.width * layer.height - layer.n_cell_views)
+    untouched = np.setdiff1d(
+        np.arange(layer.width * layer.height),
+        [x * layer.height + y for x, y in layer._cell_views],
+    )
+    x, y = np.divmod(rng.choice(untouched, n_cells, replace=False), layer.height)
+
+    def touch_cells():
+        return [layer.get_cell(x_i, y_i) for x_i, y_i in zip(x.tolist(), y.tolist())]
+
+    cells, traced, rss = measure(touch_cells, n_cells)
+    return {
+        "cell_class": type(cells[0]).__name__,
+        "n_cells": n_cells,
+        "traced_bytes_per_cell": traced,
+        "rss_bytes_per_cell": rss,
+    }
+
+
+def measure_agents(model, n_agents, rng):
+    # Trees old enough to be agents with any engine options, uniformly placed.
+    # Cells are touched, and the space's lazily built arrays built, first, so
+    # that only what each agent costs is counted
+    layer = model.space.raster_layer
+    for x in range(layer.width):
+        for y in range(layer.height):
+            layer.get_cell(x, y)
+    model.space.jotr_occupancy
+    model.space.jotr_rates
+
+    float_cols = rng.uniform(0, layer.width, n_agents)
+    float_rows = rng.uniform(0, layer.height, n_agents)
+    x, y = layer.transform @ (float_cols, float_rows)
+    age = rng.integers(model.transitions["stage_ages"]["juvenile"] + 1, 100, n_agents)
+
+    def create_agents():
+        return model._create_jotr_agents(
+            np.asarray(x), np.asarray(y), age, float_cols, float_rows
+        )
+
+    jotr_agents, traced, rss = measure(create_agents, n_agents)
+    return {
+        "agent_class": type(jotr_agents[0]).__name__,
+        "n_agents": n_agents,
+        "traced_bytes_per_agent": traced,
+        "rss_bytes_per_agent": rss,
+    }
+
+
+def measure_geo_agent_floor(model, n_agents):
+    # What any agent costs in mesa and mesa-geo's own bookkeeping (the model's
+    # agent sets, the space's index, and the agent's unique_id), measured with
+    # bare GeoAgents, to compare with what's left to JoshuaTreeAgent itself
+    crs = model.space.crs
+
+    def create_agents():
+        geo_agents = [
+            mg.GeoAgent(model=model, geometry=None, crs=crs) for _ in range(n_agents)
+        ]
+        model.space.add_agents(geo_agents)
+        return geo_agents
+
+    _, traced, rss = measure(create_agents, n_agents)
+    return {
+        "traced_bytes_per_geo_agent": traced,
+        "rss_bytes_per_geo_agent": rss,
+    }
+
+
+def run_memory_benchmark(
+    raster_size=DEFAULT_RASTER_SIZE,
+    n_agents=DEFAULT_N_AGENTS,
+    n_cells=DEFAULT_N_CELLS,
+    seed=0,
+):
+    from patch.events import EventLevel
+    from patch.model import Vegetation
+
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as raster_cache_dir:
+        bounds = cache_synthetic_dem(raster_cache_dir, raster_size, rng)
+
+        def make_model():
+            return Vegetation(
+                bounds=bounds,
+                log_level=EventLevel.OFF,
+                raster_cache_dir=raster_cache_dir,
+                initial_agents=make_initial_agents(bounds, 0, rng),
+                seed=seed,
+            )
+
+        # Cells first, while none have been touched by trees
+        model = make_model()
+        cells = measure_cells(model, n_cells, rng)
+        jotr_agents = measure_agents(model, n_agents, rng)
+
+        # In a model of its own, so that the model's and the space's dicts
+        # grow from the same size as they did for the trees
+        del model
+        geo_agents = measure_geo_agent_floor(make_model(), n_agents)
+
+    return {
+        "git_commit": get_git_commit(),
+        "python": sys.version.split()[0],
+        "raster_size": raster_size,
+        **cells,
+        **jotr_agents,
+        **geo_agents,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--raster-size", type=int, default=DEFAULT_RASTER_SIZE)
+    parser.add_argument("--n-agents", type=int, default=DEFAULT_N_AGENTS)
+    parser.add_argument("--n-cells", type=int, default=DEFAULT_N_CELLS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON here, else stdout")
+    args = parser.parse_args(argv)
+
+    results = run_memory_benchmark(
+        raster_size=args.raster_size,
+        n_agents=args.n_agents,
+        n_cells=args.n_cells,
+        seed=args.seed,
+    )
+
+    print(
+        f"{results['traced_bytes_per_agent']:.0f} bytes per {results['agent_class']} "
+        f"(of which {results['traced_bytes_per_geo_agent']:.0f} for any GeoAgent), "
+        f"{results['traced_bytes_per_cell']:.0f} bytes per {results['cell_class']} (traced)"
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
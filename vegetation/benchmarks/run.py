@@ -0,0 +1,209 @@
+"""
+Offline benchmarks for the Vegetation model, on synthetic rasters.
+
+Run from the `vegetation` directory, e.g.
+
+    python -m benchmarks.run --raster-sizes 100 400 --populations 1000 10000 --output bench.json
+
+Each case (engine x raster size x initial population) runs in a fresh process,
+so that peak RSS is per case, and results are written as JSON so runs can be
+compared between commits.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents
+from config.stages import LifeStage
+
+ENGINES = ["agent", "vectorized"]
+DEFAULT_RASTER_SIZES = [100, 400]
+DEFAULT_POPULATIONS = [100, 1000]
+DEFAULT_N_STEPS = 5
+DEFAULT_N_DISPERSAL_PARENTS = 100
+DEFAULT_N_SEEDS_PER_PARENT = 10
+N_METRICS_REPEATS = 100
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_repeated(fn, n_repeats):
+    time_at_start = time.perf_counter()
+    for _ in range(n_repeats):
+        fn()
+    return (time.perf_counter() - time_at_start) / n_repeats
+
+
+def _benchmark_dispersal(model, n_parents, n_seeds_per_parent):
+    # Seeds created per second by one batched dispersal from `n_parents` trees,
+    # whatever their life stage, so the cost doesn't depend on the run so far
+    n_seeds = np.full(n_parents, n_seeds_per_parent)
+    if model.vectorized:
+        population = model.jotr_population
+        if len(population) == 0:
+            return np.nan
+        parent_idx = model.rng.integers(0, len(population), n_parents)
+        time_at_start = time.perf_counter()
+        population.disperse_seeds(parent_idx, n_seeds)
+    else:
+        jotr_agents = list(model.materialize_jotr_agents())
+        if len(jotr_agents) == 0:
+            return np.nan
+        parents = [
+            jotr_agents[i] for i in model.rng.integers(0, len(jotr_agents), n_parents)
+        ]
+        time_at_start = time.perf_counter()
+        model.disperse_seeds(parents, n_seeds)
+    elapsed = time.perf_counter() - time_at_start
+    return n_parents * n_seeds_per_parent / elapsed
+
+
+def run_case(engine, raster_size, population, n_steps, seed, dispersal_args):
+    # Imported here, so that the model's imports count towards the baseline RSS
+    from patch.events import EventLevel
+    from patch.model import Vegetation
+
+    rng = np.random.default_rng(seed)
+    baseline_rss_mb = get_peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as raster_cache_dir:
+        bounds = cache_synthetic_dem(raster_cache_dir, raster_size, rng)
+        initial_agents = make_initial_agents(bounds, population, rng)
+
+        time_at_start = time.perf_counter()
+        model = Vegetation(
+            bounds=bounds,
+            vectorized=engine == "vectorized",
+            log_level=EventLevel.OFF,
+            raster_cache_dir=raster_cache_dir,
+            initial_agents=initial_agents,
+            seed=seed,
+        )
+        build_seconds = time.perf_counter() - time_at_start
+
+        step_seconds = []
+        for _ in range(n_steps):
+            time_at_start = time.perf_counter()
+            model.step()
+            step_seconds.append(time.perf_counter() - time_at_start)
+
+        n_agents = model.n_agents
+        update_metrics_seconds = time_repeated(model.update_metrics, N_METRICS_REPEATS)
+        check_metrics_seconds = time_repeated(model.check_metrics, 1)
+        seeds_per_second = _benchmark_dispersal(model, *dispersal_args)
+
+    return {
+        "engine": engine,
+        "raster_size": raster_size,
+        "n_cells": raster_size * raster_size,
+        "initial_population": population,
+        "n_steps": n_steps,
+        "build_seconds": build_seconds,
+        "step_seconds": step_seconds,
+        "steps_per_second": n_steps / sum(step_seconds),
+        "final_n_agents": n_agents,
+        "final_n_seeds": model.jotr_metrics.count(LifeStage.SEED),
+        "update_metrics_seconds": update_metrics_seconds,
+        "check_metrics_seconds": check_metrics_seconds,
+        "dispersal_seeds_per_second": seeds_per_second,
+        "baseline_rss_mb": baseline_rss_mb,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    engines=ENGINES,
+    raster_sizes=DEFAULT_RASTER_SIZES,
+    populations=DEFAULT_POPULATIONS,
+    n_steps=DEFAULT_N_STEPS,
+    seed=0,
+    dispersal_args=(DEFAULT_N_DISPERSAL_PARENTS, DEFAULT_N_SEEDS_PER_PARENT),
+):
+    cases = []
+    for engine in engines:
+        for raster_size in raster_sizes:
+            for population in populations:
+                print(f"Benchmarking {engine}, {raster_size}x{raster_size} cells, {population} agents")
+
+                # A fresh process per case, so peak RSS isn't carried over
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                    case = executor.submit(
+                        run_case,
+                        engine,
+                        raster_size,
+                        population,
+                        n_steps,
+                        seed,
+                        dispersal_args,
+                    ).result()
+
+                print(
+                    f"    {case['steps_per_second']:.2f} steps/s, {case['peak_rss_mb']:.0f} MB peak RSS"
+                )
+                cases.append(case)
+
+    return {
+        "git_commit": get_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument(
+        "--raster-sizes", nargs="+", type=int, default=DEFAULT_RASTER_SIZES
+    )
+    parser.add_argument("--populations", nargs="+", type=int, default=DEFAULT_POPULATIONS)
+    parser.add_argument("--steps", type=int, default=DEFAULT_N_STEPS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dispersal-parents", type=int, default=DEFAULT_N_DISPERSAL_PARENTS)
+    parser.add_argument(
+        "--seeds-per-parent", type=int, default=DEFAULT_N_SEEDS_PER_PARENT
+    )
+    parser.add_argument("--output", help="Write results as JSON here, else stdout")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        engines=args.engines,
+        raster_sizes=args.raster_sizes,
+        populations=args.populations,
+        n_steps=args.steps,
+        seed=args.seed,
+        dispersal_args=(args.dispersal_parents, args.seeds_per_parent),
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
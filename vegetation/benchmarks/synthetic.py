@@ -0,0 +1,157 @@
+import datetime
+import os
+
+import numpy as np
+import pystac
+import rasterio
+from affine import Affine
+
+from patch.cache import RasterCache
+from patch.space import DEM_STAC_COLLECTION, DEM_STAC_ASSET
+
+# Roughly the Copernicus 30m DEM's resolution, in degrees
+SYNTHETIC_CELL_SIZE = 1 / 3600
+SYNTHETIC_ORIGIN = (-116.4, 33.9)
+MAX_SYNTHETIC_AGE = 60
+STAC_PROJECTION_EXTENSION = (
+    "https://stac-extensions.github.io/projection/v1.1.0/schema.json"
+)
+
+
+def get_synthetic_bounds(raster_size, origin=SYNTHETIC_ORIGIN):
+    min_x, min_y = origin
+    extent = raster_size * SYNTHETIC_CELL_SIZE
+    return [min_x, min_y, min_x + extent, min_y + extent]
+
+
+def make_synthetic_dem(raster_size, rng):
+    # Smooth hills plus a little noise, in the park's elevation range
+    rows, cols = np.mgrid[0:raster_size, 0:raster_size] / raster_size
+    hills = np.sin(rows * 3 * np.pi) * np.cos(cols * 2 * np.pi)
+    noise = rng.normal(0, 0.05, (raster_size, raster_size))
+    return 1200 + 400 * (hills + noise)
+
+
+def cache_synthetic_dem(raster_cache_dir, raster_size, rng, epsg=4326):
+    """
+    Put a synthetic DEM in the raster cache in place of the STAC download, so
+    that a StudyArea for the returned bounds can be built without any network
+    access. Aridity and refugia status are derived from it as usual.
+    """
+
+    bounds = get_synthetic_bounds(raster_size)
+    RasterCache(raster_cache_dir).put(
+        source=DEM_STAC_COLLECTION,
+        bounds=bounds,
+        crs=f"EPSG:{epsg}",
+        bands={"elevation": make_synthetic_dem(raster_size, rng)},
+    )
+    return bounds
+
+
+def write_synthetic_stac_catalog(catalog_dir, raster_size, n_tiles, rng, epsg=4326):
+    """
+    Write a synthetic DEM as a static STAC catalog of `n_tiles` x `n_tiles`
+    non-overlapping COGs, laid out like the Copernicus DEM collection, so that
+    the STAC download path can be run offline by pointing a StudyArea (or
+    VEGETATION_DEM_STAC_PATH) at the returned catalog.json.
+    """
+
+    bounds = get_synthetic_bounds(raster_size)
+    dem = make_synthetic_dem(raster_size, rng).astype(np.float32)
+    min_x, _, _, max_y = bounds
+    edges = np.linspace(0, raster_size, n_tiles + 1).round().astype(np.int64)
+
+    catalog = pystac.Catalog(id="synthetic-dem", description="Synthetic DEM tiles")
+    collection = pystac.Collection(
+        id=DEM_STAC_COLLECTION,
+        description="Synthetic stand-in for the Copernicus DEM",
+        extent=pystac.Extent(
+            spatial=pystac.SpatialExtent([bounds]),
+            temporal=pystac.TemporalExtent([[datetime.datetime(2021, 4, 22), None]]),
+        ),
+    )
+    catalog.add_child(collection)
+
+    cog_dir = os.path.join(catalog_dir, "cogs")
+    os.makedirs(cog_dir, exist_ok=True)
+    for row_start, row_stop in zip(edges[:-1], edges[1:]):
+        for col_start, col_stop in zip(edges[:-1], edges[1:]):
+            tile_id = f"synthetic_dem_{row_start}_{col_start}"
+            tile = dem[row_start:row_stop, col_start:col_stop]
+            transform = Affine(
+                SYNTHETIC_CELL_SIZE,
+                0.0,
+                min_x + col_start * SYNTHETIC_CELL_SIZE,
+                0.0,
+                -SYNTHETIC_CELL_SIZE,
+                max_y - row_start * SYNTHETIC_CELL_SIZE,
+            )
+            cog_path = os.path.join(cog_dir, f"{tile_id}.tif")
+            with rasterio.open(
+                cog_path,
+                "w",
+                driver="COG",
+                height=tile.shape[0],
+                width=tile.shape[1],
+                count=1,
+                dtype=tile.dtype,
+                crs=f"EPSG:{epsg}",
+                transform=transform,
+                nodata=np.nan,
+            ) as dst:
+                dst.write(tile, 1)
+
+            tile_min_x, tile_max_y = transform @ (0, 0)
+            tile_max_x, tile_min_y = transform @ (tile.shape[1], tile.shape[0])
+            item = pystac.Item(
+                id=tile_id,
+                geometry={
+                    "type": "Polygon",
+                    "coordinates": [
+                        [
+                            [tile_min_x, tile_min_y],
+                            [tile_max_x, tile_min_y],
+                            [tile_max_x, tile_max_y],
+                            [tile_min_x, tile_max_y],
+                            [tile_min_x, tile_min_y],
+                        ]
+                    ],
+                },
+                bbox=[tile_min_x, tile_min_y, tile_max_x, tile_max_y],
+                datetime=datetime.datetime(2021, 4, 22),
+                properties={
+                    "proj:epsg": epsg,
+                    "proj:shape": list(tile.shape),
+                    "proj:transform": list(transform)[:6],
+                },
+                stac_extensions=[STAC_PROJECTION_EXTENSION],
+            )
+            item.add_asset(
+                DEM_STAC_ASSET,
+                pystac.Asset(href=cog_path, media_type=pystac.MediaType.COG),
+            )
+            collection.add_item(item)
+
+    catalog.normalize_hrefs(catalog_dir)
+    catalog.save(catalog_type=pystac.CatalogType.SELF_CONTAINED)
+    return bounds, os.path.join(catalog_dir, "catalog.json")
+
+
+def make_initial_agents(bounds, n_agents, rng, max_age=MAX_SYNTHETIC_AGE):
+    # Uniformly placed trees of uniformly distributed ages, as a GeoJSON dict
+    min_x, min_y, max_x, max_y = bounds
+    x = rng.uniform(min_x, max_x, n_agents)
+    y = rng.uniform(min_y, max_y, n_agents)
+    ages = rng.integers(0, max_age, n_agents)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(x_i), float(y_i)]},
+                "properties": {"age": int(age)},
+            }
+            for x_i, y_i, age in zip(x, y, ages)
+        ],
+    }
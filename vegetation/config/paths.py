@@ -1 +1,30 @@
-INITIAL_AGENTS_PATH = "/workspaces/mesa_abm_poc/vegetation/data/initial_agents.json"
+import os
+
+# Initial Joshua trees, see patch.inventory for the formats this can be in
+INITIAL_AGENTS_PATH = os.environ.get(
+    "VEGETATION_INITIAL_AGENTS_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "data",
+        "initial_agents.json",
+    ),
+)
+
+# Elevation is read from this STAC API, or from a static STAC catalog of COGs if
+# this is a path to its catalog.json (e.g. for working offline)
+DEM_STAC_PATH = os.environ.get(
+    "VEGETATION_DEM_STAC_PATH", "https://planetarycomputer.microsoft.com/api/stac/v1/"
+)
+
+# Elevation and the bands derived from it are cached here across model builds,
+# see patch.cache.RasterCache
+LOCAL_RASTER_CACHE_DIR = os.environ.get(
+    "VEGETATION_RASTER_CACHE_DIR", "/local_dev_data/raster_cache"
+)
+LOCAL_RASTER_CACHE_MAX_BYTES = int(
+    os.environ.get("VEGETATION_RASTER_CACHE_MAX_BYTES", 4 * 1024**3)
+)
+
+# Runs with `export_data=True` stream their results to a new directory under
+# here, see patch.export.ModelExporter
+LOCAL_EXPORT_DIR = os.environ.get("VEGETATION_EXPORT_DIR", "/local_dev_data/exports")
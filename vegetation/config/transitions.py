@@ -1,38 +1,133 @@
+import json
+
 from config.stages import LifeStage
 
-JOTR_JUVENILE_AGE = 8
-JOTR_ADULT_AGE = 15
-JOTR_REPRODUCTIVE_AGE = 30
-JOTR_SEED_DISPERSAL_DISTANCE = 30
+# Transition parameters for Joshua trees. Every rate is linear in aridity,
+# base_rate + aridity_coefficient * aridity, with survival rates raised by the
+# stage's nurse_bonus where there is a nurse plant. A SEED's survival rate is
+# its emergence rate.
+#
+# Nurse plants are other ADULT or BREEDING trees within nurse_radius meters (see
+# patch.neighborhood), or, with a nurse_radius of None, are not modeled at all.
+#
+# Life stages are set by age: SEED at age 0, SEEDLING up to and including the
+# juvenile age, JUVENILE up to and including the adult age, ADULT until the
+# reproductive age, and BREEDING from then on.
+#
+# Alternative parameter sets can be loaded from JSON files of the same shape,
+# see read_jotr_transitions, and are compiled into per-cell rate rasters by
+# patch.rates.JoshuaTreeRates
+JOTR_TRANSITIONS = {
+    "stage_ages": {
+        "juvenile": 8,
+        "adult": 15,
+        "reproductive": 30,
+    },
+    "survival": {
+        "SEED": {"base_rate": 0.8, "aridity_coefficient": -1e-4, "nurse_bonus": 0.0},
+        "SEEDLING": {
+            "base_rate": 0.55,
+            "aridity_coefficient": -1e-5,
+            "nurse_bonus": 0.2,
+        },
+        "JUVENILE": {
+            "base_rate": 0.8,
+            "aridity_coefficient": -1e-5,
+            "nurse_bonus": 0.2,
+        },
+        "ADULT": {
+            "base_rate": 0.99,
+            "aridity_coefficient": -1e-5,
+            "nurse_bonus": 0.2,
+        },
+        "BREEDING": {
+            "base_rate": 0.97,
+            "aridity_coefficient": -1e-5,
+            "nurse_bonus": 0.2,
+        },
+    },
+    "breeding_poisson_lambda": {"base_rate": 10, "aridity_coefficient": -1e-3},
+    "seed_dispersal_distance": 30,
+    "nurse_radius": None,
+}
 
-# TODO: Refactor to be more like a config
-# Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/14
-# This is a temporary solution to get the transition rates to be
-# valid for the JOTR model, but this doesn't scale well - we need this
-# to probably be more abstract and use a config for at least our initial
+JOTR_JUVENILE_AGE = JOTR_TRANSITIONS["stage_ages"]["juvenile"]
+JOTR_ADULT_AGE = JOTR_TRANSITIONS["stage_ages"]["adult"]
+JOTR_REPRODUCTIVE_AGE = JOTR_TRANSITIONS["stage_ages"]["reproductive"]
+JOTR_SEED_DISPERSAL_DISTANCE = JOTR_TRANSITIONS["seed_dispersal_distance"]
 
+# Life stages with a survival rate, i.e. every living stage
+JOTR_SURVIVAL_STAGES = [
+    LifeStage.SEED,
+    LifeStage.SEEDLING,
+    LifeStage.JUVENILE,
+    LifeStage.ADULT,
+    LifeStage.BREEDING,
+]
 
-def get_jotr_emergence_rate(aridity):
-    rate = 0.8 - (aridity / 10000)
-    return rate
+# Life stages that act as nurse plants
+JOTR_NURSE_STAGES = [LifeStage.ADULT, LifeStage.BREEDING]
 
+# Long-lived life stages, which can be scheduled by their next event rather
+# than stepped every year (see patch.schedule)
+JOTR_SCHEDULED_STAGES = [LifeStage.ADULT, LifeStage.BREEDING]
 
-def get_jotr_survival_rate(life_stage, aridity, nurse_indicator):
-    if life_stage == LifeStage.SEEDLING:
-        rate = 0.55
-    if life_stage == LifeStage.JUVENILE:
-        rate = 0.8
-    if life_stage == LifeStage.ADULT:
-        rate = 0.99
-    if life_stage == LifeStage.BREEDING:
-        rate = 0.97
 
-    rate = rate - (aridity / 100_000)
-    if nurse_indicator:
-        rate = rate + 0.2
+def _merge_parameters(defaults, overrides):
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(merged.get(key), dict) and isinstance(value, dict):
+            value = _merge_parameters(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+def merge_jotr_transitions(transitions):
+    # Parameters missing from `transitions`, at any depth, keep their defaults,
+    # e.g. {"stage_ages": {"adult": 20}} only moves the adult age
+    transitions = _merge_parameters(JOTR_TRANSITIONS, transitions)
+
+    missing_stages = [
+        life_stage.name
+        for life_stage in JOTR_SURVIVAL_STAGES
+        if not isinstance(transitions["survival"].get(life_stage.name), dict)
+    ]
+    if missing_stages:
+        raise ValueError(f"No survival parameters for {missing_stages}")
+    return transitions
+
+
+def read_jotr_transitions(path):
+    with open(path, "r") as f:
+        overrides = json.load(f)
+    try:
+        return merge_jotr_transitions(overrides)
+    except ValueError as e:
+        raise ValueError(f"{e} in {path}") from None
 
+
+def get_linear_rate(params, aridity):
+    return params["base_rate"] + params["aridity_coefficient"] * aridity
+
+
+# The functions below work on scalars and on arrays of aridity. The model looks
+# rates up in rasters compiled from them (see patch.rates) rather than calling
+# them per tree
+
+
+def get_jotr_emergence_rate(aridity, transitions=JOTR_TRANSITIONS):
+    return get_linear_rate(transitions["survival"][LifeStage.SEED.name], aridity)
+
+
+def get_jotr_survival_rate(
+    life_stage, aridity, nurse_indicator, transitions=JOTR_TRANSITIONS
+):
+    params = transitions["survival"][LifeStage(life_stage).name]
+    rate = get_linear_rate(params, aridity)
+    if nurse_indicator:
+        rate = rate + params["nurse_bonus"]
     return rate
 
 
-def get_jotr_breeding_poisson_lambda(aridity):
-    return 10 - (aridity / 1000)
+def get_jotr_breeding_poisson_lambda(aridity, transitions=JOTR_TRANSITIONS):
+    return get_linear_rate(transitions["breeding_poisson_lambda"], aridity)
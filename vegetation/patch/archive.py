@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class JoshuaTreeArchive:
+    """
+    Append-only, columnar record of Joshua trees that have been compacted out
+    of a `Vegetation` model.
+
+    Each compaction appends one chunk per column, so archiving is cheap and
+    the columns are only concatenated when they are read. This keeps lineage
+    (unique_id -> parent_id) and lifespan analysis possible without holding on
+    to the agent objects of every tree that ever died.
+    """
+
+    COLUMNS = {
+        "unique_id": np.int64,
+        "parent_id": np.int64,
+        "birth_step": np.int64,
+        "death_step": np.int64,
+        "age": np.int64,
+    }
+
+    def __init__(self):
+        self._chunks = {column: [] for column in self.COLUMNS}
+        self._n = 0
+
+        # Running totals so model metrics can account for archived agents
+        # without touching the archived columns
+        self.age_sum = 0
+
+    def __len__(self):
+        return self._n
+
+    def __getattr__(self, name):
+        # Columns are read as a single array, e.g. `archive.parent_id`
+        if name in JoshuaTreeArchive.COLUMNS:
+            return self.get_column(name)
+        raise AttributeError(name)
+
+    def append(self, unique_id, parent_id, birth_step, death_step, age):
+        columns = {
+            "unique_id": unique_id,
+            "parent_id": parent_id,
+            "birth_step": birth_step,
+            "death_step": death_step,
+            "age": age,
+        }
+        n_new = None
+        for column, values in columns.items():
+            values = np.asarray(values, dtype=self.COLUMNS[column])
+            if n_new is None:
+                n_new = len(values)
+            elif len(values) != n_new:
+                raise ValueError(
+                    f"Archive column {column} has {len(values)} values, expected {n_new}"
+                )
+            self._chunks[column].append(values)
+
+        self._n += n_new
+        self.age_sum += int(self._chunks["age"][-1].sum())
+
+    def get_column(self, column):
+        chunks = self._chunks[column]
+        if not chunks:
+            return np.empty(0, dtype=self.COLUMNS[column])
+        if len(chunks) > 1:
+            # Collapse to a single chunk so repeated reads don't re-concatenate
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    def to_dict(self):
+        return {column: self.get_column(column) for column in self.COLUMNS}
@@ -0,0 +1,306 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from affine import Affine
+from rasterio.transform import from_bounds
+from rasterio.windows import from_bounds as window_from_bounds
+
+from config.paths import LOCAL_RASTER_CACHE_DIR, LOCAL_RASTER_CACHE_MAX_BYTES
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_LOCK_FILENAME = "manifest.lock"
+NATIVE_RESOLUTION = "native"
+
+
+def get_raster_cache_key(source, bounds, crs, resolution=None):
+    # Content-addressed by everything that determines the pixels we'd download
+    key_fields = {
+        "source": source,
+        "bounds": [round(float(bound), 9) for bound in bounds],
+        "crs": str(crs).lower(),
+        "resolution": NATIVE_RESOLUTION if resolution is None else resolution,
+    }
+    return hashlib.sha256(json.dumps(key_fields, sort_keys=True).encode()).hexdigest()
+
+
+def get_content_hash(bands):
+    content_hash = hashlib.sha256()
+    for band_name in sorted(bands):
+        band = np.ascontiguousarray(bands[band_name])
+        content_hash.update(band_name.encode())
+        content_hash.update(str(band.dtype).encode())
+        content_hash.update(str(band.shape).encode())
+        content_hash.update(band.data)
+    return content_hash.hexdigest()
+
+
+class CachedRaster:
+    """
+    Bands (as (row, col) arrays) and georeferencing for one cache entry, or a
+    crop of one.
+    """
+
+    def __init__(self, key, bands, transform, crs, exact=True, content_hash=None):
+        self.key = key
+        self.bands = bands
+        self.transform = transform
+        self.crs = crs
+        # False when cropped from a larger cached extent, in which case bands
+        # that depend on the whole extent (e.g. percentiles) need recomputing
+        self.exact = exact
+        self.content_hash = content_hash
+
+    @property
+    def height(self):
+        return next(iter(self.bands.values())).shape[0]
+
+    @property
+    def width(self):
+        return next(iter(self.bands.values())).shape[1]
+
+    @property
+    def total_bounds(self):
+        min_x, max_y = self.transform @ (0, 0)
+        max_x, min_y = self.transform @ (self.width, self.height)
+        return [min_x, min_y, max_x, max_y]
+
+
+class RasterCache:
+    """
+    On-disk cache of StudyArea raster bands (elevation and everything derived
+    from it), shared across model builds and processes.
+
+    Each entry is a directory of one `.npy` file per band, so bands can be
+    added to an entry as they are derived and read back memory-mapped. Entries
+    are keyed by source, bounds, crs and resolution; a request for bounds that
+    fall within a cached entry's extent is served by cropping that entry. The
+    cache is bounded to `max_bytes`, evicting least recently used entries.
+    """
+
+    def __init__(self, cache_dir=LOCAL_RASTER_CACHE_DIR, max_bytes=LOCAL_RASTER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_FILENAME)
+
+    @contextmanager
+    def _locked(self):
+        # Models in other processes (tiles, ensemble members) share the cache,
+        # so every read-modify-write of the manifest holds this lock
+        with open(os.path.join(self.cache_dir, MANIFEST_LOCK_FILENAME), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        # Write then rename, so concurrent readers never see a partial manifest
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _save_band(self, key, band_name, band):
+        # Also written then renamed, as another process may have it mapped
+        fd, tmp_path = tempfile.mkstemp(dir=self._entry_dir(key), suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.asarray(band))
+        os.replace(tmp_path, os.path.join(self._entry_dir(key), f"{band_name}.npy"))
+
+    def _load_bands(self, key, entry, window=None, mmap=True):
+        bands = {}
+        for band_name in entry["bands"]:
+            band = np.load(
+                os.path.join(self._entry_dir(key), f"{band_name}.npy"),
+                mmap_mode="r" if mmap else None,
+            )
+            if window is not None:
+                (row_start, row_stop), (col_start, col_stop) = window
+                band = np.array(band[row_start:row_stop, col_start:col_stop])
+            bands[band_name] = band
+        return bands
+
+    def get(self, source, bounds, crs, resolution=None, mmap=True):
+        with self._locked():
+            return self._get(source, bounds, crs, resolution, mmap)
+
+    def _get(self, source, bounds, crs, resolution, mmap):
+        manifest = self._read_manifest()
+
+        key = get_raster_cache_key(source, bounds, crs, resolution)
+        entry = manifest.get(key)
+        if entry is not None:
+            cached = CachedRaster(
+                key=key,
+                bands=self._load_bands(key, entry, mmap=mmap),
+                transform=Affine(*entry["transform"]),
+                crs=entry["crs"],
+                content_hash=entry["content_hash"],
+            )
+        else:
+            cached = self._get_from_superset(manifest, source, bounds, crs, resolution)
+            if cached is None:
+                return None
+            entry = manifest[cached.key]
+
+        entry["last_access"] = time.time()
+        self._write_manifest(manifest)
+        return cached
+
+    def get_by_key(self, key, content_hash=None, mmap=True):
+        # An entry by its key, e.g. as recorded in a checkpoint. If the entry's
+        # content has changed since `content_hash` was taken, it isn't the same
+        # raster anymore, so this raises rather than returning it
+        with self._locked():
+            manifest = self._read_manifest()
+            entry = manifest.get(key)
+            if entry is None:
+                raise ValueError(f"Raster {key[:8]} is not in the cache at {self.cache_dir}")
+            if content_hash is not None and entry["content_hash"] != content_hash:
+                raise ValueError(
+                    f"Raster {key[:8]} has changed since it was referenced "
+                    f"(content hash {entry['content_hash'][:8]}, expected {content_hash[:8]})"
+                )
+
+            entry["last_access"] = time.time()
+            self._write_manifest(manifest)
+            return CachedRaster(
+                key=key,
+                bands=self._load_bands(key, entry, mmap=mmap),
+                transform=Affine(*entry["transform"]),
+                crs=entry["crs"],
+                content_hash=entry["content_hash"],
+            )
+
+    def _get_from_superset(self, manifest, source, bounds, crs, resolution):
+        min_x, min_y, max_x, max_y = bounds
+        resolution = NATIVE_RESOLUTION if resolution is None else resolution
+
+        candidates = [
+            (key, entry)
+            for key, entry in manifest.items()
+            if entry["source"] == source
+            and entry["crs"] == str(crs).lower()
+            and entry["resolution"] == resolution
+            and entry["bounds"][0] <= min_x
+            and entry["bounds"][1] <= min_y
+            and entry["bounds"][2] >= max_x
+            and entry["bounds"][3] >= max_y
+        ]
+        if not candidates:
+            return None
+
+        # Smallest covering extent means the least to read
+        key, entry = min(candidates, key=lambda candidate: candidate[1]["nbytes"])
+        transform = Affine(*entry["transform"])
+        height, width = entry["shape"]
+
+        window = window_from_bounds(min_x, min_y, max_x, max_y, transform=transform)
+        row_start = max(int(np.floor(window.row_off)), 0)
+        col_start = max(int(np.floor(window.col_off)), 0)
+        row_stop = min(int(np.ceil(window.row_off + window.height)), height)
+        col_stop = min(int(np.ceil(window.col_off + window.width)), width)
+
+        print(f"Cropping cached raster {key[:8]} to requested bounds")
+        return CachedRaster(
+            key=key,
+            bands=self._load_bands(
+                key, entry, window=((row_start, row_stop), (col_start, col_stop))
+            ),
+            transform=transform @ Affine.translation(col_start, row_start),
+            crs=entry["crs"],
+            exact=False,
+        )
+
+    def put(self, source, bounds, crs, bands, transform=None, resolution=None):
+        key = get_raster_cache_key(source, bounds, crs, resolution)
+        height, width = next(iter(bands.values())).shape
+        if transform is None:
+            transform = from_bounds(*bounds, width, height)
+
+        with self._locked():
+            os.makedirs(self._entry_dir(key), exist_ok=True)
+            for band_name, band in bands.items():
+                self._save_band(key, band_name, band)
+
+            manifest = self._read_manifest()
+            manifest[key] = {
+                "source": source,
+                "bounds": [float(bound) for bound in bounds],
+                "crs": str(crs).lower(),
+                "resolution": NATIVE_RESOLUTION if resolution is None else resolution,
+                "transform": list(transform)[:6],
+                "shape": [height, width],
+                "bands": sorted(bands),
+                "content_hash": get_content_hash(bands),
+                "nbytes": sum(np.asarray(band).nbytes for band in bands.values()),
+                "last_access": time.time(),
+            }
+            self._evict(manifest, keep=key)
+            self._write_manifest(manifest)
+
+        return CachedRaster(
+            key=key,
+            bands=dict(bands),
+            transform=transform,
+            crs=str(crs).lower(),
+            content_hash=manifest[key]["content_hash"],
+        )
+
+    def put_band(self, key, band_name, band):
+        # Add a derived band to an existing entry
+        with self._locked():
+            manifest = self._read_manifest()
+            entry = manifest[key]
+
+            self._save_band(key, band_name, band)
+
+            bands = self._load_bands(key, entry)
+            bands[band_name] = band
+            entry["bands"] = sorted(bands)
+            entry["content_hash"] = get_content_hash(bands)
+            entry["nbytes"] = sum(np.asarray(band).nbytes for band in bands.values())
+            entry["last_access"] = time.time()
+
+            self._evict(manifest, keep=key)
+            self._write_manifest(manifest)
+            return entry["content_hash"]
+
+    def _evict(self, manifest, keep=None):
+        total_bytes = sum(entry["nbytes"] for entry in manifest.values())
+        by_last_access = sorted(manifest, key=lambda key: manifest[key]["last_access"])
+        for key in by_last_access:
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            print(f"Evicting cached raster {key[:8]}")
+            total_bytes -= manifest[key]["nbytes"]
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del manifest[key]
+
+    def clear(self):
+        with self._locked():
+            for key in self._read_manifest():
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self._write_manifest({})
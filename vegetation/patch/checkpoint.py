@@ -0,0 +1,259 @@
+import io
+import itertools
+import json
+import os
+
+import mesa_geo as mg
+import numpy as np
+from shapely.geometry import Point
+
+from config.paths import LOCAL_RASTER_CACHE_DIR
+from config.stages import LifeStage
+from patch.cache import RasterCache
+from patch.model import Vegetation, JoshuaTreeAgent, EMPTY_GEOJSON
+from patch.population import JoshuaTreePopulation, NO_PARENT_ID, NO_STEP
+
+CHECKPOINT_VERSION = 1
+
+# Constructor arguments that define the model (rather than how it's run), and
+# so are saved with it
+CHECKPOINT_MODEL_PARAMS = [
+    "bounds",
+    "num_steps",
+    "vectorized",
+    "compact_every",
+    "compact_dead_fraction",
+    "export_data",
+    "transitions",
+    "planting_density",
+    "aridity_series",
+    "event_scheduling",
+    "seedling_cohorts",
+]
+
+
+def _to_json(value):
+    # numpy scalars (e.g. DataCollector values) that json doesn't know about
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Can't write {type(value)} to a checkpoint")
+
+
+def _set_agent_state(model, fields):
+    jotr_agents = []
+    for i in range(len(fields["unique_id"])):
+        parent_id = int(fields["parent_id"][i])
+        death_step = int(fields["death_step"][i])
+
+        agent = JoshuaTreeAgent(
+            model=model,
+            geometry=Point(fields["x"][i], fields["y"][i]),
+            crs=model.space.crs,
+            age=int(fields["age"][i]),
+            parent_id=None if parent_id == NO_PARENT_ID else parent_id,
+        )
+        agent.unique_id = int(fields["unique_id"][i])
+        agent.birth_step = int(fields["birth_step"][i])
+        agent.death_step = None if death_step == NO_STEP else death_step
+        agent.life_stage = LifeStage(fields["life_stage"][i])
+        jotr_agents.append(agent)
+
+    if jotr_agents:
+        model.space.add_agents(jotr_agents)
+
+
+def save_checkpoint(model, file):
+    """
+    Save the state of a `Vegetation` model between steps to `file` (a path or a
+    binary file object), as an uncompressed npz of the population and archive
+    arrays plus a JSON header with everything else.
+
+    The rasters aren't copied: the checkpoint refers to the model's raster
+    cache entry by key and content hash, so the entry has to still be in the
+    cache (unchanged) when the checkpoint is loaded.
+    """
+
+    cached_raster = model.space.cached_raster
+    if cached_raster is None or cached_raster.key is None:
+        raise ValueError(
+            "Checkpoints refer to rasters in the raster cache, but this model's rasters aren't cached"
+        )
+
+    jotr_fields = model.get_jotr_state()
+
+    # Peek at the next unique id, putting it back for the model being saved
+    next_unique_id = next(mg.GeoAgent._ids[model])
+    mg.GeoAgent._ids[model] = itertools.count(next_unique_id)
+
+    header = {
+        "version": CHECKPOINT_VERSION,
+        "model_params": {
+            param: getattr(model, param) for param in CHECKPOINT_MODEL_PARAMS
+        },
+        "epsg": model.space.epsg,
+        "raster": {
+            "key": cached_raster.key,
+            "content_hash": cached_raster.content_hash,
+        },
+        "steps": model.steps,
+        "next_unique_id": next_unique_id,
+        "rng_state": model.rng.bit_generator.state,
+        "random_state": model.random.getstate(),
+        "metrics": {
+            "life_stage_counts": model.jotr_metrics.life_stage_counts.tolist(),
+            "n_total": model.jotr_metrics.n_total,
+            "age_sum": model.jotr_metrics.age_sum,
+        },
+        "model_vars": model.datacollector.model_vars,
+    }
+    if model.jotr_cohorts is not None:
+        header["cohorts"] = {
+            "n_dead": model.jotr_cohorts.n_dead,
+            "dead_age_sum": model.jotr_cohorts.dead_age_sum,
+        }
+
+    arrays = {"header": np.array(json.dumps(header, default=_to_json))}
+    for field in JoshuaTreePopulation.FIELDS:
+        arrays[f"jotr/{field}"] = jotr_fields[field]
+    for column, values in model.jotr_archive.to_dict().items():
+        arrays[f"archive/{column}"] = values
+    if model.jotr_cohorts is not None:
+        arrays["cohorts/counts"] = model.jotr_cohorts.counts
+
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            np.savez(f, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def load_checkpoint(
+    file, rng=None, raster_cache_dir=LOCAL_RASTER_CACHE_DIR, **model_kwargs
+):
+    """
+    Restore a `Vegetation` model from a checkpoint written by `save_checkpoint`,
+    ready to continue stepping from where it was saved.
+
+    By default the model resumes the saved random streams, so it continues
+    exactly as the original would have - except with event scheduling, whose
+    queue isn't saved but drawn again (see patch.schedule). Passing `rng` instead starts a new
+    stream from the saved state, to fork it (see `fork_checkpoint`). Other
+    `model_kwargs` are passed on to Vegetation, e.g. `log_level`, and take
+    precedence over the saved model params (e.g. to export somewhere else).
+    """
+
+    with np.load(file) as checkpoint:
+        header = json.loads(checkpoint["header"].item())
+        if header["version"] != CHECKPOINT_VERSION:
+            raise ValueError(
+                f"Checkpoint version {header['version']} is not supported (expected {CHECKPOINT_VERSION})"
+            )
+        jotr_fields = {
+            field: checkpoint[f"jotr/{field}"] for field in JoshuaTreePopulation.FIELDS
+        }
+        archive_columns = {
+            key.split("/", 1)[1]: checkpoint[key]
+            for key in checkpoint.files
+            if key.startswith("archive/")
+        }
+        cohort_counts = checkpoint.get("cohorts/counts")
+
+    rasters = RasterCache(raster_cache_dir).get_by_key(**header["raster"])
+
+    model = Vegetation(
+        epsg=header["epsg"],
+        raster_cache_dir=raster_cache_dir,
+        rasters=rasters,
+        initial_agents=EMPTY_GEOJSON,
+        rng=rng,
+        **{**header["model_params"], **model_kwargs},
+    )
+
+    if rng is None:
+        model.rng.bit_generator.state = header["rng_state"]
+        version, state, gauss_next = header["random_state"]
+        model.random.setstate((version, tuple(state), gauss_next))
+
+    model.steps = header["steps"]
+
+    if model.vectorized:
+        model.jotr_population.set_state(jotr_fields)
+    else:
+        _set_agent_state(model, jotr_fields)
+
+    # After the agents, whose creation draws ids that they're then given back
+    mg.GeoAgent._ids[model] = itertools.count(header["next_unique_id"])
+
+    if len(archive_columns["unique_id"]):
+        model.jotr_archive.append(**archive_columns)
+
+    if model.jotr_cohorts is not None and cohort_counts is not None:
+        model.jotr_cohorts.set_state(cohort_counts, **header["cohorts"])
+
+    # The running metrics cover trees that are no longer in the model, so they
+    # are restored as saved rather than rebuilt from the restored trees
+    metrics = model.jotr_metrics
+    metrics.life_stage_counts = np.array(
+        header["metrics"]["life_stage_counts"], dtype=np.int64
+    )
+    metrics.n_total = header["metrics"]["n_total"]
+    metrics.age_sum = header["metrics"]["age_sum"]
+    model.space.n_refugia_cells_occupied = model.space.count_refugia_cells_occupied()
+
+    model.datacollector.model_vars = header["model_vars"]
+    model.update_metrics()
+
+    return model
+
+
+def fork_checkpoint(file, n_forks, seed=None, **model_kwargs):
+    """
+    Restore `n_forks` independent copies of a checkpointed model, each with its
+    own random stream spawned from `seed`, e.g. to run several management
+    scenarios from the same warm-started state.
+
+    Forks of a model exporting to a directory (saved, or given as
+    `export_data`) each export to their own `fork-{i}` subdirectory of it.
+    """
+
+    if not isinstance(file, str):
+        # Read a file object once, since each fork needs to load it
+        file = io.BytesIO(file.read())
+
+    export_data = model_kwargs.pop("export_data", None)
+    if export_data is None:
+        with np.load(file) as checkpoint:
+            header = json.loads(checkpoint["header"].item())
+        export_data = header["model_params"]["export_data"]
+
+    models = []
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_forks)
+    for i, seed_sequence in enumerate(seed_sequences):
+        if not isinstance(file, str):
+            file.seek(0)
+        fork_export_data = export_data
+        if isinstance(export_data, str):
+            fork_export_data = os.path.join(export_data, f"fork-{i}")
+        models.append(
+            load_checkpoint(
+                file,
+                rng=np.random.default_rng(seed_sequence),
+                export_data=fork_export_data,
+                **model_kwargs,
+            )
+        )
+    return models
+
+
+def fork_model(model, n_forks, seed=None, **model_kwargs):
+    # Fork a running model without writing a checkpoint to disk
+    checkpoint = io.BytesIO()
+    save_checkpoint(model, checkpoint)
+    checkpoint.seek(0)
+    return fork_checkpoint(
+        checkpoint,
+        n_forks,
+        seed=seed,
+        raster_cache_dir=model.space.raster_cache.cache_dir,
+        **model_kwargs,
+    )
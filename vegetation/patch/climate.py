@@ -0,0 +1,121 @@
+import concurrent.futures
+
+import numpy as np
+import rasterio
+
+from patch.stac import read_cog_window
+
+ARIDITY_VARIABLE = "aridity"
+
+# Series stored as xarray datasets (Zarr stores, or netCDF files), with their
+# years along TIME_DIM. Anything else is read with rasterio, one band per year
+XARRAY_EXTENSIONS = (".zarr", ".nc")
+TIME_DIM, Y_DIM, X_DIM = "time", "y", "x"
+
+
+def get_cell_centers(transform, shape):
+    # (x, y) coordinates of the centers of the columns and rows of a grid
+    height, width = shape
+    x, _ = transform @ (np.arange(width) + 0.5, np.full(width, 0.5))
+    _, y = transform @ (np.full(height, 0.5), np.arange(height) + 0.5)
+    return np.asarray(x), np.asarray(y)
+
+
+class RasterBandSeries:
+    # Years as the bands of anything rasterio can open, e.g. a multi-band
+    # (tiled) GeoTIFF, or a VRT stacking a file per year. Each year is warped
+    # onto the grid as it's read, so only the study area's window is read
+    def __init__(self, path, transform, shape, crs):
+        self.path = path
+        self.transform = transform
+        self.shape = shape
+        self.crs = crs
+        with rasterio.open(path) as src:
+            self.n_years = src.count
+
+    def read(self, year):
+        height, width = self.shape
+        _, aridity = read_cog_window(
+            self.path, self.transform, self.crs, (0, height, 0, width), band=year + 1
+        )
+        return aridity
+
+
+class XarraySeries:
+    # Years along the time dimension of a variable of a Zarr store or netCDF
+    # file, on a grid in the study area's crs. The store is opened lazily
+    # (chunked with dask), and each year is read at the cell centers of the
+    # grid, nearest neighbor, so only the chunks covering the study area are read
+    def __init__(self, path, transform, shape, variable=ARIDITY_VARIABLE):
+        import xarray as xr
+
+        if path.rstrip("/").endswith(".zarr"):
+            dataset = xr.open_zarr(path)
+        else:
+            dataset = xr.open_dataset(path, chunks={})
+        if variable not in dataset:
+            raise ValueError(f"No {variable} variable in {path}")
+
+        self.data = dataset[variable]
+        self.n_years = self.data.sizes[TIME_DIM]
+        self.x, self.y = get_cell_centers(transform, shape)
+
+    def read(self, year):
+        aridity = self.data.isel({TIME_DIM: year}).sel(
+            {Y_DIM: self.y, X_DIM: self.x}, method="nearest"
+        )
+        return aridity.transpose(Y_DIM, X_DIM).to_numpy().astype(np.float64)
+
+
+class AriditySeries:
+    """
+    A yearly aridity series on the StudyArea's grid, streamed from disk a year
+    at a time rather than read into memory as a whole.
+
+    `path` is a multi-band raster (one band per year, see RasterBandSeries) or
+    a Zarr store or netCDF file (see XarraySeries). Step `n` of the model reads
+    year `n - 1` of the series, and steps past its end keep its last year.
+
+    Reading a year starts reading the next one in a background thread, so that
+    it's read while the model steps. At most two years are held at once: the
+    one in use, and the one being read.
+    """
+
+    def __init__(self, path, transform, shape, crs, variable=ARIDITY_VARIABLE):
+        if path.lower().rstrip("/").endswith(XARRAY_EXTENSIONS):
+            self.reader = XarraySeries(path, transform, shape, variable)
+        else:
+            self.reader = RasterBandSeries(path, transform, shape, crs)
+        if self.reader.n_years < 1:
+            raise ValueError(f"No years in aridity series {path}")
+
+        self.path = path
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="aridity"
+        )
+        self._next_year = None
+        self._next_aridity = None
+
+    @property
+    def n_years(self):
+        return self.reader.n_years
+
+    def get_year(self, step):
+        return min(max(step - 1, 0), self.n_years - 1)
+
+    def prefetch(self, step):
+        # Start reading the year for `step`, unless it's already being read
+        year = self.get_year(step)
+        if year != self._next_year:
+            self._next_year = year
+            self._next_aridity = self._executor.submit(self.reader.read, year)
+
+    def get(self, step):
+        # The (row, col) aridity for `step`, then start reading the next step's
+        self.prefetch(step)
+        aridity = self._next_aridity.result()
+        self.prefetch(step + 1)
+        return aridity
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
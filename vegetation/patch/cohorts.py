@@ -0,0 +1,164 @@
+import numpy as np
+
+from config.stages import LifeStage
+from patch.metrics import NOT_COUNTED
+
+
+class JoshuaTreeCohorts:
+    """
+    Seeds and seedlings as counts per age and cell, rather than as individual
+    trees.
+
+    Most seeds never emerge, and most seedlings die within a year or two, so
+    rather than creating (and compacting away) an agent or population row for
+    every one of them, young trees are kept here until they're JUVENILE:
+    `counts` is an (age, row, col) array of the number of trees of each age,
+    up to the juvenile age (see config.transitions), in each cell. Each step,
+    the trees of each age in each cell survive as one binomial draw at the
+    cell's survival rate, and age a year. Trees that reach the JUVENILE stage
+    are handed over to the model as individual trees, placed uniformly at
+    random within their cell.
+
+    Cohort trees are counted in the model's metrics and the StudyArea's
+    occupancy index like any other tree, except that dead ones are dropped as
+    they die (as if compacted straight away). Trees lose their exact position
+    and their parent when they join a cohort.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.space = model.space
+
+        # The oldest age kept in cohorts, i.e. the last SEEDLING age
+        self.max_age = model.transitions["stage_ages"]["juvenile"]
+
+        raster_layer = model.space.raster_layer
+        self.counts = np.zeros(
+            (self.max_age + 1, raster_layer.height, raster_layer.width),
+            dtype=np.int32,
+        )
+
+        # Dead cohort trees, which are still counted in the model's metrics
+        self.n_dead = 0
+        self.dead_age_sum = 0
+
+    def is_cohort_age(self, age):
+        return np.asarray(age) <= self.max_age
+
+    def add(self, rows, cols, ages):
+        # Trees joining cohorts, e.g. dispersed seeds
+        if len(ages) == 0:
+            return
+
+        np.add.at(self.counts, (ages, rows, cols), 1)
+
+        life_stages = self.space.jotr_rates.get_life_stage(ages)
+        not_counted = np.full(len(ages), NOT_COUNTED)
+        self.space.update_jotr_occupancy(rows, cols, not_counted, life_stages)
+        self.model.jotr_metrics.update_life_stages(not_counted, life_stages)
+        self.model.jotr_metrics.add_to_age_sum(np.sum(ages))
+
+    def step(self):
+        ages, rows, cols = np.nonzero(self.counts)
+        if len(ages) == 0:
+            return
+
+        space = self.space
+        metrics = self.model.jotr_metrics
+        rng = self.model.rng
+        rates = space.jotr_rates
+
+        # Survival (or, for seeds, emergence) of every cohort in one draw
+        n = self.counts[ages, rows, cols].astype(np.int64)
+        life_stages = rates.get_life_stage(ages)
+        survival_rate = rates.get_survival_rate(
+            life_stages,
+            rows,
+            cols,
+            space.get_jotr_nurse_indicator(life_stages, rows, cols),
+        )
+        n_survived = rng.binomial(n, np.clip(survival_rate, 0, 1))
+        n_died = n - n_survived
+
+        # As with individual trees, trees age in the step they die in
+        next_ages = ages + 1
+        next_life_stages = rates.get_life_stage(next_ages)
+        metrics.add_to_age_sum(n.sum())
+        metrics.update_life_stages(
+            life_stages, np.full(len(ages), LifeStage.DEAD), n_died
+        )
+        metrics.update_life_stages(life_stages, next_life_stages, n_survived)
+        self.n_dead += int(n_died.sum())
+        self.dead_age_sum += int((n_died * next_ages).sum())
+
+        not_counted = np.full(len(ages), NOT_COUNTED)
+        space.update_jotr_occupancy(rows, cols, life_stages, not_counted, counts=n)
+
+        self.counts[ages, rows, cols] = 0
+        stays = next_ages <= self.max_age
+        self.counts[next_ages[stays], rows[stays], cols[stays]] = n_survived[stays]
+        space.update_jotr_occupancy(
+            rows[stays],
+            cols[stays],
+            not_counted[stays],
+            next_life_stages[stays],
+            counts=n_survived[stays],
+        )
+
+        # Hand juveniles over to the model, which counts them again as it adds
+        # them as individual trees
+        n_leaving = n_survived[~stays]
+        n_left = int(n_leaving.sum())
+        if n_left == 0:
+            return
+
+        age = self.max_age + 1
+        metrics.remove(rates.get_life_stage(age), n_left, n_left * age)
+
+        float_cols = np.repeat(cols[~stays], n_leaving) + rng.random(n_left)
+        float_rows = np.repeat(rows[~stays], n_leaving) + rng.random(n_left)
+        x, y = space.raster_layer.transform @ (float_cols, float_rows)
+        self.model.add_jotr_trees(
+            np.asarray(x),
+            np.asarray(y),
+            np.full(n_left, age, dtype=np.int64),
+            float_cols,
+            float_rows,
+            birth_step=self.model.steps - age,
+        )
+
+    def get_metrics(self):
+        # (n_total, age_sum, life_stage_counts) of the trees in, or that died
+        # in, cohorts, for Vegetation.check_metrics
+        ages = np.arange(self.max_age + 1)
+        n_by_age = self.counts.sum(axis=(1, 2), dtype=np.int64)
+        life_stage_counts = np.bincount(
+            self.space.jotr_rates.get_life_stage(ages),
+            weights=n_by_age,
+            minlength=len(LifeStage),
+        ).astype(np.int64)
+        life_stage_counts[LifeStage.DEAD] += self.n_dead
+        return (
+            int(n_by_age.sum()) + self.n_dead,
+            int((n_by_age * ages).sum()) + self.dead_age_sum,
+            life_stage_counts,
+        )
+
+    def set_state(self, counts, n_dead, dead_age_sum):
+        # Fill empty cohorts from saved counts (see patch.checkpoint). As with
+        # JoshuaTreePopulation.set_state, only the occupancy index is updated
+        if self.counts.any():
+            raise ValueError("Can only set the state of empty cohorts")
+
+        self.counts[:] = counts
+        self.n_dead = n_dead
+        self.dead_age_sum = dead_age_sum
+
+        ages, rows, cols = np.nonzero(self.counts)
+        self.space.update_jotr_occupancy(
+            rows,
+            cols,
+            np.full(len(ages), NOT_COUNTED),
+            self.space.jotr_rates.get_life_stage(ages),
+            counts=self.counts[ages, rows, cols],
+        )
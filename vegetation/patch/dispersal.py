@@ -0,0 +1,71 @@
+import functools
+
+import numpy as np
+from pyproj import Transformer
+
+from config.transitions import JOTR_SEED_DISPERSAL_DISTANCE
+
+JOTR_UTM_PROJ = "+proj=utm +zone=11 +ellps=WGS84 +datum=WGS84 +units=m +no_defs +north"
+
+# TODO: Use the best projection for valid seed dispersal
+# Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/12
+# For now this uses UTM zone 11N, cuz it's in meters and
+# works, but it may not be best for accurate linear distance?
+
+
+@functools.lru_cache(maxsize=None)
+def get_transformer(crs_from, crs_to):
+    # Building a Transformer is far more expensive than using one, so they are
+    # built once per process and shared by every dispersal call
+    return Transformer.from_crs(crs_from, crs_to, always_xy=True)
+
+
+def disperse_seed_locations(
+    parent_x,
+    parent_y,
+    n_seeds,
+    rng,
+    crs="EPSG:4326",
+    max_dispersal_distance=JOTR_SEED_DISPERSAL_DISTANCE,
+):
+    """
+    Disperse `n_seeds[i]` seeds around each parent location (`parent_x[i]`,
+    `parent_y[i]`), uniformly in direction and in distance up to
+    `max_dispersal_distance` meters.
+
+    Returns the index of each seed's parent along with the seed locations, in
+    the same crs as the parents.
+    """
+
+    n_seeds = np.asarray(n_seeds, dtype=np.int64)
+    parent_idx = np.repeat(np.arange(len(n_seeds)), n_seeds)
+    n_total = len(parent_idx)
+
+    # Transform parent locations to UTM, a single round trip for all seeds
+    to_utm = get_transformer(crs, JOTR_UTM_PROJ)
+    from_utm = get_transformer(JOTR_UTM_PROJ, crs)
+    x_utm, y_utm = to_utm.transform(
+        np.asarray(parent_x, dtype=np.float64),
+        np.asarray(parent_y, dtype=np.float64),
+    )
+
+    # Random direction in radians, and distance in meters up to dispersal distance
+    angle = rng.uniform(0, 2 * np.pi, n_total)
+    dispersal_distance = rng.uniform(0, max_dispersal_distance, n_total)
+
+    seed_x_utm = x_utm[parent_idx] + dispersal_distance * np.cos(angle)
+    seed_y_utm = y_utm[parent_idx] + dispersal_distance * np.sin(angle)
+
+    seed_x, seed_y = from_utm.transform(seed_x_utm, seed_y_utm)
+
+    return parent_idx, np.asarray(seed_x), np.asarray(seed_y)
+
+
+def get_raster_indices(transform, x, y):
+    # Invert the raster's affine transform for many points at once, converting
+    # from geographic (x, y) to float raster (col, row) coordinates
+    float_col, float_row = ~transform @ (
+        np.asarray(x, dtype=np.float64),
+        np.asarray(y, dtype=np.float64),
+    )
+    return float_col, float_row
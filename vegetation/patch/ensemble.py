@@ -0,0 +1,110 @@
+import concurrent.futures
+
+import mesa
+import numpy as np
+import pandas as pd
+
+from config.paths import LOCAL_RASTER_CACHE_DIR
+from patch.events import EventLevel
+from patch.model import Vegetation
+from patch.space import StudyArea
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def load_rasters(bounds, epsg=4326, raster_cache_dir=LOCAL_RASTER_CACHE_DIR):
+    # Build (or load) the study area's bands once, so that they're in the raster
+    # cache before any replicate starts. Replicates then read them from there
+    # memory-mapped, so every process shares the same read-only pages
+    space = StudyArea(
+        bounds, epsg=epsg, model=mesa.Model(), raster_cache_dir=raster_cache_dir
+    )
+    space.get_elevation()
+    space.get_aridity()
+    space.get_refugia_status()
+    return space.cached_raster
+
+
+def _run_replicate(replicate, seed_sequence, model_kwargs):
+    model = Vegetation(rng=np.random.default_rng(seed_sequence), **model_kwargs)
+    for _ in range(model.num_steps):
+        model.step()
+
+    model_vars = model.datacollector.get_model_vars_dataframe()
+    model_vars.index.name = "step"
+    return replicate, model_vars
+
+
+class EnsembleResult:
+    """
+    Stacked DataCollector model variables of every replicate of an ensemble,
+    indexed by (replicate, step), with summaries across replicates.
+    """
+
+    def __init__(self, runs, seed):
+        self.runs = runs
+        self.seed = seed
+
+    @property
+    def n_replicates(self):
+        return self.runs.index.get_level_values("replicate").nunique()
+
+    def get_replicate(self, replicate):
+        return self.runs.xs(replicate, level="replicate")
+
+    def mean(self):
+        return self.runs.groupby(level="step").mean()
+
+    def quantile(self, q=DEFAULT_QUANTILES):
+        # Indexed by (step, quantile)
+        quantiles = self.runs.groupby(level="step").quantile(list(q))
+        quantiles.index.names = ["step", "quantile"]
+        return quantiles
+
+    def summarize(self, q=DEFAULT_QUANTILES):
+        # One row per step, with (variable, statistic) columns
+        summary = {"mean": self.mean()}
+        for quantile, values in self.quantile(q).groupby(level="quantile"):
+            summary[f"q{quantile:g}"] = values.droplevel("quantile")
+        return pd.concat(summary, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+def run_ensemble(n_replicates, seed=None, n_workers=None, **model_kwargs):
+    """
+    Run `n_replicates` replicates of `Vegetation(**model_kwargs)` for
+    `num_steps` steps each, across a pool of `n_workers` processes.
+
+    Each replicate gets its own rng, from an independent stream spawned from
+    the master `seed`, so a given seed reproduces the whole ensemble (however
+    it's spread across workers) and replicates are statistically independent.
+    The rasters are loaded once up front and shared with the workers through
+    the raster cache. Replicates log nothing unless `log_level` is passed.
+    """
+
+    model_kwargs.setdefault("log_level", EventLevel.OFF)
+
+    load_rasters(
+        model_kwargs["bounds"],
+        epsg=model_kwargs.get("epsg", 4326),
+        raster_cache_dir=model_kwargs.get("raster_cache_dir", LOCAL_RASTER_CACHE_DIR),
+    )
+
+    seed_sequence = np.random.SeedSequence(seed)
+    replicate_seed_sequences = seed_sequence.spawn(n_replicates)
+
+    runs = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(_run_replicate, replicate, replicate_seed_sequence, model_kwargs)
+            for replicate, replicate_seed_sequence in enumerate(replicate_seed_sequences)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            replicate, model_vars = future.result()
+            runs[replicate] = model_vars
+
+    runs = pd.concat(
+        [runs[replicate] for replicate in range(n_replicates)],
+        keys=range(n_replicates),
+        names=["replicate", "step"],
+    )
+    return EnsembleResult(runs, seed=seed_sequence.entropy)
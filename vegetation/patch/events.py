@@ -0,0 +1,147 @@
+import json
+import queue
+import sys
+import threading
+import weakref
+from enum import IntEnum
+
+import numpy as np
+
+DEFAULT_EVENT_BATCH_SIZE = 10_000
+
+
+class EventLevel(IntEnum):
+    OFF = 0
+    SUMMARY = 1
+    AGENT = 2
+
+
+class NDJSONEventWriter:
+    """
+    Writes batches of events as newline-delimited JSON from a background thread.
+
+    The stepping thread only hands over whole batches, so all of the formatting
+    and I/O happens off of it. A batch is a list of events, where each event is
+    a dict of either scalars (one line) or equal-length arrays (one line per
+    element, for events logged in bulk by the vectorized population).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        if path is None:
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "w", buffering=1024 * 1024)
+
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="NDJSONEventWriter", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, batch):
+        self._queue.put(batch)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            for event in batch:
+                self._write_event(event)
+        self._file.flush()
+
+    def _write_event(self, event):
+        columns = {
+            key: value.tolist()
+            for key, value in event.items()
+            if isinstance(value, np.ndarray)
+        }
+        if not columns:
+            self._file.write(json.dumps(event, default=_to_json) + "\n")
+            return
+
+        scalars = {key: value for key, value in event.items() if key not in columns}
+        for values in zip(*columns.values()):
+            row = dict(scalars)
+            row.update(zip(columns.keys(), values))
+            self._file.write(json.dumps(row, default=_to_json) + "\n")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def _close_writer(writer, batch):
+    # Run by the EventLog's finalizer, which mustn't hold on to the log itself
+    if batch:
+        writer.put(list(batch))
+        batch.clear()
+    writer.close()
+
+
+def _to_json(value):
+    # numpy scalars and enums (e.g. LifeStage) that json doesn't know about
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class EventLog:
+    """
+    Leveled event log for the step loop.
+
+    Callers check `summary_enabled` / `agent_enabled` before building an event,
+    so that at lower levels nothing is formatted or allocated at all:
+
+        if self.model.event_log.agent_enabled:
+            self.model.event_log.agent("died", unique_id=self.unique_id, ...)
+
+    Summary messages are printed as they are logged. Per-agent events are
+    buffered in memory and handed to an `NDJSONEventWriter` in batches, either
+    to `path` or to stdout.
+    """
+
+    def __init__(
+        self, level=EventLevel.SUMMARY, path=None, batch_size=DEFAULT_EVENT_BATCH_SIZE
+    ):
+        if isinstance(level, str):
+            level = EventLevel[level.upper()]
+        self.level = EventLevel(level)
+        self.summary_enabled = self.level >= EventLevel.SUMMARY
+        self.agent_enabled = self.level >= EventLevel.AGENT
+
+        self.batch_size = batch_size
+        self._batch = []
+        self._writer = None
+        if self.agent_enabled:
+            self._writer = NDJSONEventWriter(path)
+            # Closed at exit if it hasn't been by then, or once the log is
+            # garbage collected
+            self._finalizer = weakref.finalize(
+                self, _close_writer, self._writer, self._batch
+            )
+
+    def summary(self, message):
+        if self.summary_enabled:
+            print(message)
+
+    def agent(self, event, **fields):
+        if not self.agent_enabled:
+            return
+        fields["event"] = event
+        self._batch.append(fields)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            self._writer.put(list(self._batch))
+            self._batch.clear()
+
+    def close(self):
+        if self._writer is not None:
+            self._finalizer()
+            self._writer = None
@@ -0,0 +1,222 @@
+import glob
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_EXPORT_CHUNK_STEPS = 100
+METADATA_FILENAME = "metadata.json"
+MODEL_VARS_PREFIX = "model_vars"
+AGENTS_PREFIX = "agents"
+
+
+def get_export_dir(export_root):
+    # A new directory per run, named by when it started. The random suffix
+    # keeps runs started within the same second (e.g. forks, or ensemble
+    # members in one worker) apart, and an existing directory is never reused
+    os.makedirs(export_root, exist_ok=True)
+    return tempfile.mkdtemp(
+        prefix=time.strftime("%Y%m%d-%H%M%S") + "-", dir=export_root
+    )
+
+
+class NPZChunkWriter:
+    """
+    Writes chunks (dicts of equal-length column arrays) as compressed npz files
+    from a background thread, so compression and I/O happen off of the stepping
+    thread. Each chunk is written under a temporary name and renamed into
+    place, so readers never see a partial file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="NPZChunkWriter", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, filename, columns):
+        self._queue.put((filename, columns))
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            filename, columns = chunk
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **columns)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _flush_model_vars(writer, steps, columns):
+    # Hands the buffered steps to `writer` and empties the buffers in place,
+    # so that ModelExporter's finalizer sees the same lists
+    if not steps:
+        return
+
+    chunk = {name: np.asarray(values) for name, values in columns.items()}
+    chunk["step"] = np.asarray(steps, dtype=np.int64)
+    writer.put(f"{MODEL_VARS_PREFIX}_{steps[0]:08d}_{steps[-1]:08d}.npz", chunk)
+
+    steps.clear()
+    for values in columns.values():
+        values.clear()
+
+
+def _close_exporter(writer, steps, columns):
+    _flush_model_vars(writer, steps, columns)
+    writer.close()
+
+
+class ModelExporter:
+    """
+    Streams a model's per-step reporter values, and optionally snapshots of
+    every Joshua tree every `agents_every` steps, to chunked npz files in
+    `directory`:
+
+        model_vars_{first step}_{last step}.npz   one array per reporter, plus "step"
+        agents_{step}.npz                         one array per tree field
+
+    Model variables are buffered for `chunk_steps` steps and handed to an
+    `NPZChunkWriter` a chunk at a time, after which the model's DataCollector
+    is trimmed to the most recent chunk, so memory stays flat however long the
+    model runs. Use `read_model_vars` and `read_agent_snapshots` to read the
+    export back.
+    """
+
+    def __init__(
+        self,
+        directory,
+        reporters,
+        chunk_steps=DEFAULT_EXPORT_CHUNK_STEPS,
+        agents_every=None,
+        metadata=None,
+    ):
+        self.directory = directory
+        self.reporters = reporters
+        self.chunk_steps = chunk_steps
+        self.agents_every = agents_every
+
+        self._writer = NPZChunkWriter(directory)
+        self._steps = []
+        self._columns = {name: [] for name in reporters}
+
+        with open(os.path.join(directory, METADATA_FILENAME), "w") as f:
+            json.dump(
+                {
+                    "reporters": reporters,
+                    "chunk_steps": chunk_steps,
+                    "agents_every": agents_every,
+                    **(metadata or {}),
+                },
+                f,
+                indent=2,
+            )
+
+        # Closed at exit if it hasn't been by then, or once the exporter is
+        # garbage collected
+        self._finalizer = weakref.finalize(
+            self, _close_exporter, self._writer, self._steps, self._columns
+        )
+
+    def record_step(self, model):
+        self._steps.append(model.steps)
+        for name, attr_name in self.reporters.items():
+            self._columns[name].append(getattr(model, attr_name))
+
+        if self.agents_every and model.steps % self.agents_every == 0:
+            self._writer.put(
+                f"{AGENTS_PREFIX}_{model.steps:08d}.npz", model.get_jotr_state()
+            )
+
+        if len(self._steps) >= self.chunk_steps:
+            self.flush()
+
+            # The export now has the full history, so the DataCollector only
+            # needs to hold on to the latest chunk (e.g. for plotting)
+            for values in model.datacollector.model_vars.values():
+                del values[: -self.chunk_steps]
+
+    def flush(self):
+        _flush_model_vars(self._writer, self._steps, self._columns)
+
+    def close(self):
+        if self._writer is not None:
+            self._finalizer()
+            self._writer = None
+
+
+def _select_steps(step, steps):
+    if steps is None:
+        return np.ones(len(step), dtype=bool)
+    return np.isin(step, np.asarray(list(steps)))
+
+
+def read_model_vars(directory, columns=None, steps=None):
+    """
+    Read exported model variables as a DataFrame indexed by step, loading only
+    the chunks that overlap `steps` (any iterable of step numbers, e.g. a
+    range) and only the requested `columns`.
+    """
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, f"{MODEL_VARS_PREFIX}_*.npz"))):
+        first, last = (
+            int(step)
+            for step in os.path.basename(path)[: -len(".npz")].split("_")[-2:]
+        )
+        if steps is not None and not any(first <= step <= last for step in steps):
+            continue
+
+        with np.load(path) as chunk:
+            step = chunk["step"]
+            selected = _select_steps(step, steps)
+            names = columns or [name for name in chunk.files if name != "step"]
+            frames.append(
+                pd.DataFrame(
+                    {name: chunk[name][selected] for name in names},
+                    index=pd.Index(step[selected], name="step"),
+                )
+            )
+
+    if not frames:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="step"))
+    return pd.concat(frames)
+
+
+def read_agent_snapshots(directory, columns=None, steps=None):
+    """
+    Read exported Joshua tree snapshots as a single DataFrame, with a `step`
+    column, loading only the snapshots in `steps` and the requested `columns`.
+    """
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, f"{AGENTS_PREFIX}_*.npz"))):
+        step = int(os.path.basename(path)[: -len(".npz")].split("_")[-1])
+        if steps is not None and step not in steps:
+            continue
+
+        with np.load(path) as snapshot:
+            names = columns or snapshot.files
+            frame = pd.DataFrame({name: snapshot[name] for name in names})
+        frame.insert(0, "step", step)
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=["step", *(columns or [])])
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+import pyproj
+
+# GeoJSON is always lon / lat, see https://datatracker.ietf.org/doc/html/rfc7946#section-4
+GEOJSON_CRS = "epsg:4326"
+
+GEOPARQUET_EXTENSIONS = (".parquet", ".geoparquet")
+
+
+def get_geojson_points(agents_geojson):
+    # (x, y, age) arrays for the point features of a GeoJSON dict
+    features = agents_geojson["features"]
+    coords = np.array(
+        [feature["geometry"]["coordinates"] for feature in features],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    ages = np.array(
+        [feature["properties"].get("age") or 0 for feature in features],
+        dtype=np.int64,
+    )
+    return coords[:, 0], coords[:, 1], ages
+
+
+def read_geoparquet_points(path):
+    # (x, y, age) arrays and the crs of a GeoParquet file of points. geopandas
+    # needs pyarrow for this, which nothing else here does, so it's only
+    # imported for GeoParquet inventories
+    import geopandas as gpd
+
+    gdf = gpd.read_parquet(path)
+    ages = np.zeros(len(gdf), dtype=np.int64)
+    if "age" in gdf:
+        ages = gdf["age"].fillna(0).to_numpy(dtype=np.int64)
+    return (
+        gdf.geometry.x.to_numpy(dtype=np.float64),
+        gdf.geometry.y.to_numpy(dtype=np.float64),
+        ages,
+        gdf.crs,
+    )
+
+
+def read_jotr_inventory(initial_agents, crs):
+    """
+    (x, y, age) arrays of the Joshua trees in `initial_agents`, in `crs`.
+
+    `initial_agents` is a GeoJSON dict of point features with an optional
+    `age` property, or a path to a GeoJSON or GeoParquet file of them (e.g. a
+    survey inventory), so that trees can be located on the raster and added to
+    the model in bulk rather than parsed into agents one feature at a time.
+    """
+
+    if isinstance(initial_agents, dict):
+        x, y, age = get_geojson_points(initial_agents)
+        inventory_crs = GEOJSON_CRS
+    elif initial_agents.lower().endswith(GEOPARQUET_EXTENSIONS):
+        x, y, age, inventory_crs = read_geoparquet_points(initial_agents)
+    else:
+        with open(initial_agents, "r") as f:
+            x, y, age = get_geojson_points(json.load(f))
+        inventory_crs = GEOJSON_CRS
+
+    crs = pyproj.CRS.from_user_input(crs)
+    if inventory_crs is not None and not crs.equals(inventory_crs):
+        x, y = pyproj.Transformer.from_crs(
+            inventory_crs, crs, always_xy=True
+        ).transform(x, y)
+    return x, y, age
@@ -0,0 +1,80 @@
+import numpy as np
+
+from config.stages import LifeStage
+
+NOT_COUNTED = -1
+
+
+class JoshuaTreeMetrics:
+    """
+    Running population counters for a `Vegetation` model.
+
+    Agents (or the vectorized population, in bulk) report their state changes
+    here as they happen, so that model-level metrics are O(1) reads instead of
+    passes over every agent. Like the per-agent metrics they replace, the
+    counters cover every Joshua tree the model has had, including dead trees
+    that have since been compacted into the archive - compaction is not a
+    state change, so it is never reported here.
+    """
+
+    def __init__(self):
+        self.life_stage_counts = np.zeros(len(LifeStage), dtype=np.int64)
+        self.n_total = 0
+        self.age_sum = 0
+
+    def update_life_stage(self, initial_life_stage, life_stage):
+        if initial_life_stage is None:
+            self.n_total += 1
+        else:
+            self.life_stage_counts[initial_life_stage] -= 1
+        if life_stage is not None:
+            self.life_stage_counts[life_stage] += 1
+
+    def update_life_stages(self, initial_life_stages, life_stages, counts=None):
+        # Bulk version of update_life_stage, with NOT_COUNTED in place of None.
+        # With `counts`, each entry stands for that many trees (see patch.cohorts)
+        initial_life_stages = np.asarray(initial_life_stages)
+        life_stages = np.asarray(life_stages)
+
+        is_new = initial_life_stages == NOT_COUNTED
+        is_counted = life_stages != NOT_COUNTED
+        if counts is None:
+            self.n_total += int(is_new.sum())
+            old_weights = new_weights = None
+        else:
+            counts = np.asarray(counts)
+            self.n_total += int(counts[is_new].sum())
+            old_weights, new_weights = counts[~is_new], counts[is_counted]
+
+        n_life_stages = len(self.life_stage_counts)
+        self.life_stage_counts -= np.bincount(
+            initial_life_stages[~is_new], weights=old_weights, minlength=n_life_stages
+        ).astype(np.int64)
+        self.life_stage_counts += np.bincount(
+            life_stages[is_counted], weights=new_weights, minlength=n_life_stages
+        ).astype(np.int64)
+
+    def remove(self, life_stage, n, age_sum):
+        # Stop counting `n` trees of `life_stage`, `age_sum` years old between
+        # them, e.g. cohort trees handed over to the model, which counts them
+        # again as they're created (see patch.cohorts)
+        self.life_stage_counts[life_stage] -= n
+        self.n_total -= n
+        self.age_sum -= int(age_sum)
+
+    def update_age(self, initial_age, age):
+        self.age_sum += (age or 0) - (initial_age or 0)
+
+    def add_to_age_sum(self, delta):
+        self.age_sum += int(delta)
+
+    def count(self, life_stage):
+        return int(self.life_stage_counts[life_stage])
+
+    @property
+    def n_alive(self):
+        return self.n_total - self.count(LifeStage.DEAD)
+
+    @property
+    def mean_age(self):
+        return self.age_sum / self.n_total if self.n_total else np.nan
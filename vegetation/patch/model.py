@@ -1,75 +1,221 @@
+import concurrent.futures
+import itertools
+import weakref
+
 import mesa
 import mesa_geo as mg
 import numpy as np
-from shapely.geometry import Point
-import random
-import json
-from scipy.stats import poisson
-from pyproj import Transformer
+import shapely
 
 from config.stages import LifeStage
-from patch.space import StudyArea, VegCell
+from patch.space import NO_JOTR_AGENTS, StudyArea
 from config.transitions import (
-    JOTR_JUVENILE_AGE,
-    JOTR_REPRODUCTIVE_AGE,
-    JOTR_ADULT_AGE,
-    JOTR_SEED_DISPERSAL_DISTANCE,
-    get_jotr_emergence_rate,
-    get_jotr_survival_rate,
-    get_jotr_breeding_poisson_lambda,
+    JOTR_SCHEDULED_STAGES,
+    JOTR_TRANSITIONS,
+    merge_jotr_transitions,
+    read_jotr_transitions,
+)
+from config.paths import INITIAL_AGENTS_PATH, LOCAL_RASTER_CACHE_DIR, LOCAL_EXPORT_DIR
+from patch.population import JoshuaTreePopulation, NO_PARENT_ID, NO_STEP
+from patch.inventory import read_jotr_inventory
+from patch.planting import (
+    DEFAULT_PLANTING_AGE,
+    DEFAULT_PLANTING_DENSITY,
+    DRAW_CRS,
+    sample_planting_area,
 )
-from config.paths import INITIAL_AGENTS_PATH
+from patch.dispersal import disperse_seed_locations, get_raster_indices
+from patch.archive import JoshuaTreeArchive
+from patch.metrics import JoshuaTreeMetrics, NOT_COUNTED
+from patch.events import EventLog, EventLevel
+from patch.export import ModelExporter, get_export_dir, DEFAULT_EXPORT_CHUNK_STEPS
+from patch.timing import PhaseTimer, NO_TIMING
+from patch.schedule import JoshuaTreeSchedule, JOTR_IS_SCHEDULED_STAGE
+from patch.cohorts import JoshuaTreeCohorts
 
-JOTR_UTM_PROJ = "+proj=utm +zone=11 +ellps=WGS84 +datum=WGS84 +units=m +no_defs +north"
 STD_INDENT = "    "
 
+LIFE_STAGES = list(LifeStage)
+
+JOTR_MODEL_REPORTERS = {
+    "Mean Age": "mean_age",
+    "N Agents": "n_agents",
+    "N Seeds": "n_seeds",
+    "N Seedlings": "n_seedlings",
+    "N Juveniles": "n_juveniles",
+    "N Adults": "n_adults",
+    "N Breeding": "n_breeding",
+    "% Refugia Cells Occupied": "pct_refugia_cells_occupied",
+}
+
+
+EMPTY_GEOJSON = {"type": "FeatureCollection", "features": []}
+
+
+def get_model_rng(seed=None, rng=None):
+    # mesa.Model only seeds self.random from `seed`, leaving self.rng to OS
+    # entropy, so a seed is handed to mesa as `rng` instead, which seeds both
+    if seed is not None and rng is not None:
+        raise ValueError("Pass either seed or rng, not both")
+    return rng if seed is None else seed
+
+
+def log_step_header(event_log, steps):
+    if event_log.summary_enabled:
+        timestep_str = f"# {STD_INDENT*0}🕰️  Time passes. It is the year {steps}. #"
+        nchar_timestep_str = len(timestep_str)
+        event_log.summary("#" * (nchar_timestep_str - 1))
+        event_log.summary(timestep_str)
+        event_log.summary("#" * (nchar_timestep_str - 1))
+
+
+def log_step_summary(event_log, model):
+    if event_log.summary_enabled:
+        event_log.summary(
+            f"{STD_INDENT*1}🌳 {model.n_agents} living agents ({model.n_seeds} seeds, {model.n_seedlings} seedlings, {model.n_juveniles} juveniles, {model.n_adults} adults, {model.n_breeding} breeding)"
+        )
+
 class JoshuaTreeAgent(mg.GeoAgent):
-    def __init__(self, model, geometry, crs, age=None, parent_id=None):
+    # A model can hold millions of agents, so they keep their state in slots,
+    # and their position only as float raster indices: the geometry, indices
+    # and pos are derived from those when asked for (see benchmarks.memory).
+    # Life stages and ages are LifeStage members and small ints, which are
+    # shared rather than allocated per agent. mesa's and mesa-geo's own
+    # attributes (model, unique_id, pos, crs) stay in the __dict__ their
+    # classes give every agent
+    __slots__ = (
+        "_life_stage",
+        "_age",
+        "_scheduled_step",
+        "_float_col",
+        "_float_row",
+        "parent_id",
+        "birth_step",
+        "death_step",
+    )
+
+    def __init__(
+        self, model, geometry, crs, age=None, parent_id=None, float_indices=None
+    ):
+        self._life_stage = None
+        self._age = None
+
+        # Step as of which _age is counted, while the agent is in the model's
+        # event schedule (see Vegetation._step_jotr_schedule)
+        self._scheduled_step = None
+
+        # The geometry is set below, from float_indices if they're given
         super().__init__(
             model=model,
-            geometry=geometry,
+            geometry=None,
             crs=crs,
         )
 
+        # With the model's event schedule, new agents are stepped until they're
+        # in a life stage that's scheduled
+        if model.jotr_schedule is not None and not model.vectorized:
+            model.unscheduled_jotr_agents.add(self)
+
         self.age = age
         self.parent_id = parent_id
         self.life_stage = None
 
+        # Kept so lineage and lifespans survive compaction into the archive
+        self.birth_step = model.steps
+        self.death_step = None
+
         # TODO: When we create the agent, we need to know its own indices relative
         # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/6
         # to the rasterlayer. This seems like very foundational mesa / mesa-geo stuff,
         # which should be handled by the GeoAgent or GeoBase, but the examples are
         # inconsistent. For now, invert the affine transformation to get the indices,
         # converting from geographic (lat, lon) to raster (col, row) coordinates
-
-        self.float_indices = ~self.model.space.raster_layer._transform * (
-            np.float64(geometry.x),
-            np.float64(geometry.y),
-        )
-
-        # According to wang-boyu, mesa-geo maintainer:
-        # pos = (x, y), with an origin at the lower left corner of the raster grid
-        # indices = (row, col) format with an origin at the upper left corner of the raster grid
-        # See https://github.com/projectmesa/mesa-geo/issues/267
-
-        # pos = (np.float64(geometry.x), np.float64(geometry.y))
-        # self._pos = pos
-
-        self.indices = (int(self.float_indices[0]), int(self.float_indices[1]))
-        self._pos = (
-            self.indices[0],
-            self.model.space.raster_layer.height - self.indices[1],
-        )
+        # (see the geometry setter). Bulk creation (e.g. seed dispersal) inverts all
+        # points at once and passes the result in as `float_indices`
+        if float_indices is None:
+            self.geometry = geometry
+        else:
+            self._float_col, self._float_row = float_indices
 
         # TODO: Figure out how to set the life stage on init
         # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/3
         # Seems natural to set the life stage on init, but in
         # see lines 181-190 in mesa_geo/geoagent.py, the agents are instantiated before the
         # GeoAgent gets the attributes within the geojson, so we need to call _update_life_stage
-        # after init when the age is known to the agent
+        # after init when the age is known to the agent. Vegetation._create_jotr_agents
+        # sidesteps this by looking up the life stages of a whole batch at once
 
         # self._update_life_stage()
 
+    @property
+    def geometry(self):
+        x, y = self.model.space.raster_layer.transform @ self.float_indices
+        return shapely.Point(x, y)
+
+    @geometry.setter
+    def geometry(self, geometry):
+        # GeoAgent.__init__ sets None, before the agent has a position
+        if geometry is None:
+            return
+        self._float_col, self._float_row = ~self.model.space.raster_layer.transform @ (
+            float(geometry.x),
+            float(geometry.y),
+        )
+
+    @property
+    def float_indices(self):
+        return self._float_col, self._float_row
+
+    # According to wang-boyu, mesa-geo maintainer:
+    # pos = (x, y), with an origin at the lower left corner of the raster grid
+    # indices = (row, col) format with an origin at the upper left corner of the raster grid
+    # See https://github.com/projectmesa/mesa-geo/issues/267
+    # Agents keep theirs as (col, row), and _pos is their cell's pos
+
+    @property
+    def indices(self):
+        return int(self._float_col), int(self._float_row)
+
+    @property
+    def _pos(self):
+        return (
+            int(self._float_col),
+            self.model.space.raster_layer.height - 1 - int(self._float_row),
+        )
+
+    # Every state change (birth, aging, promotion, death) goes through the
+    # properties below, so this is where the StudyArea's occupancy index and the
+    # model's running metrics are kept up to date. In vectorized models agents
+    # are just views of the population, which does its own bookkeeping
+
+    @property
+    def life_stage(self):
+        return self._life_stage
+
+    @life_stage.setter
+    def life_stage(self, life_stage):
+        initial_life_stage = self._life_stage
+        self._life_stage = life_stage
+        if initial_life_stage != life_stage and not self.model.vectorized:
+            self.model.space.update_jotr_occupancy(
+                self.indices[1], self.indices[0], initial_life_stage, life_stage
+            )
+            self.model.jotr_metrics.update_life_stage(initial_life_stage, life_stage)
+
+    @property
+    def age(self):
+        # Scheduled agents age without being stepped
+        if self._scheduled_step is None:
+            return self._age
+        return self._age + self.model.steps - self._scheduled_step
+
+    @age.setter
+    def age(self, age):
+        initial_age = self._age
+        self._age = age
+        if not self.model.vectorized:
+            self.model.jotr_metrics.update_age(initial_age, age)
+
     def step(self):
 
         # Save initial life stage for logging
@@ -79,60 +225,68 @@ class JoshuaTreeAgent(mg.GeoAgent):
         if self.life_stage == LifeStage.DEAD:
             return
 
-        # Find the underlying cell - it must exist, else raise an error
-        intersecting_cell_filter = self.model.space.raster_layer.iter_neighbors(
-            self.indices, moore=False, include_center=True, radius=0
+        # Rates are looked up in rasters compiled for the study area's aridity
+        # (see StudyArea.jotr_rates) at the agent's indices, rather than finding
+        # the underlying cell. For seeds, the survival rate is the emergence rate
+        col, row = self.indices
+        space = self.model.space
+        survival_rate = space.jotr_rates.get_survival_rate(
+            self.life_stage,
+            row,
+            col,
+            space.get_jotr_nurse_indicator(self.life_stage, row, col),
         )
-        intersecting_cell = next(intersecting_cell_filter)
-        if not intersecting_cell:
-            raise ValueError("No intersecting cell found")
 
-        # If seed, get emergence rate, if not, get survival rate
-        if self.life_stage == LifeStage.SEED:
-            survival_rate = get_jotr_emergence_rate(intersecting_cell.aridity)
-        else:
-            survival_rate = get_jotr_survival_rate(
-                self.life_stage,
-                intersecting_cell.aridity,
-                0,  # Assume no nurse plants for now
-            )
-
-        # Roll the dice to see if the agent survives
-        dice_roll_zero_to_one = random.random()
+        # Roll the dice to see if the agent survives, drawing from the model's
+        # own stream so that replicates can be seeded independently
+        dice_roll_zero_to_one = self.model.rng.random()
 
         # Check survival, comparing dice roll to survival rate
-        if dice_roll_zero_to_one < survival_rate:
-            print(
-                f"{STD_INDENT*1}💪 Agent {self.unique_id} ({self.life_stage.name}, age {self.age}) survived! (dice roll {dice_roll_zero_to_one:.2f} w/ survival prob {survival_rate:.2f})"
-            )
+        survived = dice_roll_zero_to_one < survival_rate
 
-        else:
-            print(
-                f"{STD_INDENT*1}💀 Agent {self.unique_id} ({self.life_stage.name}, age {self.age}) died! (dice roll {dice_roll_zero_to_one:.2f} w/ survival prob {survival_rate:.2f})"
+        event_log = self.model.event_log
+        if event_log.agent_enabled:
+            event_log.agent(
+                "survived" if survived else "died",
+                step=self.model.steps,
+                unique_id=self.unique_id,
+                life_stage=self.life_stage.name,
+                age=self.age,
+                dice_roll=dice_roll_zero_to_one,
+                survival_rate=survival_rate,
             )
-            self.life_stage = LifeStage.DEAD
 
+        if not survived:
+            self.life_stage = LifeStage.DEAD
+            self.death_step = self.model.steps
 
         # Increment age
         self.age += 1
         life_stage_promotion = self._update_life_stage()
 
-        if life_stage_promotion:
-            print(
-                f"{STD_INDENT*2}🔄 Agent {self.unique_id} ({initial_life_stage.name}) promoted to {self.life_stage.name}!"
+        if life_stage_promotion and event_log.agent_enabled:
+            event_log.agent(
+                "promoted",
+                step=self.model.steps,
+                unique_id=self.unique_id,
+                initial_life_stage=initial_life_stage.name,
+                life_stage=self.life_stage.name,
             )
 
-        # Update underlying patch
-        intersecting_cell.add_agent_link(self)
-
-        # Disperse
+        # Disperse - seeds are drawn and created for all breeding agents at once
+        # by the model, at the end of the step (see Vegetation.disperse_seeds)
         if self.life_stage == LifeStage.BREEDING:
-            jotr_breeding_poisson_lambda = get_jotr_breeding_poisson_lambda(
-                intersecting_cell.aridity
+            jotr_breeding_poisson_lambda = space.jotr_rates.get_breeding_poisson_lambda(
+                row, col
             )
-            n_seeds = poisson.rvs(jotr_breeding_poisson_lambda)
+            self.model.queue_seed_dispersal(self, jotr_breeding_poisson_lambda)
 
-            self.disperse_seeds(n_seeds)
+        # Long-lived agents join the model's event schedule from here on
+        if (
+            self.model.jotr_schedule is not None
+            and JOTR_IS_SCHEDULED_STAGE[self.life_stage]
+        ):
+            self.model.queue_jotr_scheduling(self)
 
     def _update_life_stage(self):
 
@@ -142,180 +296,829 @@ class JoshuaTreeAgent(mg.GeoAgent):
             return
 
         age = self.age if self.age else 0
-        if age == 0:
-            life_stage = LifeStage.SEED
-        elif age > 0 and age <= JOTR_JUVENILE_AGE:
-            life_stage = LifeStage.SEEDLING
-        elif age >= JOTR_JUVENILE_AGE and age <= JOTR_ADULT_AGE:
-            life_stage = LifeStage.JUVENILE
-        elif age > JOTR_ADULT_AGE and age < JOTR_REPRODUCTIVE_AGE:
-            life_stage = LifeStage.ADULT
-        else:
-            life_stage = LifeStage.BREEDING
-        self.life_stage = life_stage
+        self.life_stage = LifeStage(self.model.space.jotr_rates.get_life_stage(age))
 
         if initial_life_stage != self.life_stage:
             return True
         else:
             return False
 
-    def disperse_seeds(
-        self, n_seeds, max_dispersal_distance=JOTR_SEED_DISPERSAL_DISTANCE
-    ):
+    def disperse_seeds(self, n_seeds, max_dispersal_distance=None):
 
         if self.life_stage != LifeStage.BREEDING:
             raise ValueError(
                 f"Agent {self.unique_id} is not breeding and cannot disperse seeds"
             )
 
-        print(f"{STD_INDENT*2}🌰 Agent {self.unique_id} ({self.life_stage.name}) is dispersing {n_seeds} seeds...")
+        return self.model.disperse_seeds(
+            [self], [n_seeds], max_dispersal_distance=max_dispersal_distance
+        )
 
-        # TODO: Use the best projection for valid seed dispersal
-        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/12
-        # For now this uses UTM zone 11N, cuz it's in meters and
-        # works, but it may not be best for accurate linear distance?
 
-        # Create transformers to disperse seeds accurately in meters
-        wgs84_to_utm = Transformer.from_crs("EPSG:4326", JOTR_UTM_PROJ, always_xy=True)
-        utm_to_wgs84 = Transformer.from_crs(JOTR_UTM_PROJ, "EPSG:4326", always_xy=True)
+class Vegetation(mesa.Model):
+    def __init__(
+        self,
+        bounds,
+        export_data=False,
+        num_steps=20,
+        epsg=4326,
+        vectorized=False,
+        compact_every=None,
+        compact_dead_fraction=None,
+        metrics_debug=False,
+        log_level=EventLevel.SUMMARY,
+        event_log_path=None,
+        raster_cache_dir=LOCAL_RASTER_CACHE_DIR,
+        rasters=None,
+        initial_agents=None,
+        seed=None,
+        rng=None,
+        export_agents_every=None,
+        export_chunk_steps=DEFAULT_EXPORT_CHUNK_STEPS,
+        timing=False,
+        transitions=None,
+        planting_density=DEFAULT_PLANTING_DENSITY,
+        aridity_series=None,
+        event_scheduling=False,
+        seedling_cohorts=False,
+    ):
+        # All of the model's randomness comes from self.rng (and self.random,
+        # which mesa seeds from it), see mesa.Model for `seed` and `rng`
+        super().__init__(rng=get_model_rng(seed, rng))
+        self.bounds = bounds
+        self.export_data = export_data
+        self.num_steps = num_steps
 
-        # Transform parent location to UTM
-        x_utm, y_utm = wgs84_to_utm.transform(self.geometry.x, self.geometry.y)
+        # Joshua tree transition parameters: config.transitions.JOTR_TRANSITIONS
+        # by default, or overrides of any of them as a dict of the same shape
+        # or a path to one as JSON. They're compiled into per-cell rate rasters
+        # by the StudyArea (see StudyArea.jotr_rates)
+        if transitions is None:
+            transitions = JOTR_TRANSITIONS
+        elif isinstance(transitions, str):
+            transitions = read_jotr_transitions(transitions)
+        else:
+            transitions = merge_jotr_transitions(transitions)
+        self.transitions = transitions
+
+        # With `event_scheduling`, ADULT and BREEDING trees aren't stepped every
+        # year, they're queued by the step of their next event instead (see
+        # patch.schedule.JoshuaTreeSchedule). That needs their rates to stay the
+        # same between events, which nurse plants don't allow
+        self.event_scheduling = event_scheduling
+        self.jotr_schedule = None
+        if event_scheduling:
+            if transitions.get("nurse_radius") is not None:
+                raise ValueError(
+                    "Event scheduling needs survival rates that don't depend on neighbors, set nurse_radius to None"
+                )
+            self.jotr_schedule = JoshuaTreeSchedule(
+                transitions["stage_ages"]["reproductive"]
+            )
+            self.unscheduled_jotr_agents = mesa.agent.AgentSet([], random=self.random)
+            self._scheduled_jotr_agents = {
+                life_stage: {} for life_stage in JOTR_SCHEDULED_STAGES
+            }
+            self._jotr_scheduling_queue = []
+
+        # Dead agents are moved out of the model (schedule, space and cells) and
+        # into `jotr_archive` every `compact_every` steps, and/or whenever dead
+        # agents make up more than `compact_dead_fraction` of the Joshua trees
+        self.compact_every = compact_every
+        self.compact_dead_fraction = compact_dead_fraction
+        self.jotr_archive = JoshuaTreeArchive()
+
+        # Metrics are kept as running counters, updated as agents change state.
+        # With `metrics_debug`, every update_metrics also recomputes them from
+        # scratch and raises if the two disagree
+        self.jotr_metrics = JoshuaTreeMetrics()
+        self.metrics_debug = metrics_debug
 
-        for __seed_idx in np.arange(0, n_seeds):
-            # Random direction in radians
-            angle = random.uniform(0, 2 * np.pi)
+        # With `vectorized`, Joshua trees live in a JoshuaTreePopulation (numpy
+        # arrays) instead of as JoshuaTreeAgent objects. Agents can still be built
+        # on demand for visualization or analysis via `materialize_jotr_agents`
+        self.vectorized = vectorized
 
-            # Random distance in meters, up to dispersal distance
-            dispersal_distance = random.uniform(0, max_dispersal_distance)
+        # Step loop logging: OFF, SUMMARY (a few lines per step) or AGENT (every
+        # survival roll, death, promotion and seed, as NDJSON to event_log_path,
+        # or stdout if not given)
+        self.event_log = EventLog(log_level, path=event_log_path)
+
+        # With `timing`, the wall time, calls and allocated objects of each phase
+        # of the step (see time_phase) are recorded per step in `timer`
+        self.timer = PhaseTimer() if timing else None
+
+        self.space = StudyArea(
+            bounds, epsg=epsg, model=self, raster_cache_dir=raster_cache_dir
+        )
+
+        # Rasters can be handed in (as a patch.cache.CachedRaster with elevation,
+        # aridity and refugia_status bands) instead of fetched for `bounds`
+        if rasters is None:
+            self.space.get_elevation()
+            self.space.get_aridity()
+            self.space.get_refugia_status()
+        else:
+            self.space.set_rasters(rasters)
 
-            # Calculate new seed location in UTM
-            seed_x_utm = x_utm + dispersal_distance * np.cos(angle)
-            seed_y_utm = y_utm + dispersal_distance * np.sin(angle)
+        # Aridity can also change year to year, from a series on disk (a path to
+        # a raster with a band per year, or a Zarr store) streamed a step at a
+        # time, see patch.climate.AriditySeries
+        self.aridity_series = aridity_series
+        if aridity_series is not None:
+            self.space.set_aridity_series(aridity_series)
 
-            # Transform back to WGS84
-            seed_x_wgs84, seed_y_wgs84 = utm_to_wgs84.transform(seed_x_utm, seed_y_utm)
+        # Breeding agents queue their seed output here during the step, so that
+        # all seeds can be dispersed in a single batch afterwards
+        self._seed_dispersal_queue = []
 
-            # Create new seed agent
-            seed_agent = JoshuaTreeAgent(
-                model=self.model,
-                geometry=Point(seed_x_wgs84, seed_y_wgs84),
-                crs=self.crs,
-                age=0,
-                parent_id=self.unique_id,
+        # Areas drawn on the map are planted with `planting_density` seedlings
+        # per cell. Plantings are sampled off of the calling thread and wait
+        # here until the next step adds them, see plant
+        self.planting_density = planting_density
+        self._pending_plantings = []
+        self._planting_executor = None
+
+        self.jotr_population = None
+        if self.vectorized:
+            self.jotr_population = JoshuaTreePopulation(self)
+
+        # With `seedling_cohorts`, seeds and seedlings are kept as counts per age
+        # and cell rather than as individual trees, until they're JUVENILE (see
+        # patch.cohorts.JoshuaTreeCohorts)
+        self.seedling_cohorts = seedling_cohorts
+        self.jotr_cohorts = JoshuaTreeCohorts(self) if seedling_cohorts else None
+
+        # Initial agents can likewise be handed in, as a GeoJSON dict or a path
+        # to a GeoJSON or GeoParquet file (see patch.inventory)
+        if initial_agents is None:
+            initial_agents = INITIAL_AGENTS_PATH
+
+        self._add_initial_agents(initial_agents)
+
+        self.datacollector = mesa.DataCollector(JOTR_MODEL_REPORTERS)
+
+        # With `export_data` (True, for a new directory under LOCAL_EXPORT_DIR, or
+        # a directory path), every step's reporters, and every tree every
+        # `export_agents_every` steps, are streamed to disk
+        self.exporter = None
+        if export_data:
+            export_dir = (
+                get_export_dir(LOCAL_EXPORT_DIR) if export_data is True else export_data
             )
-            seed_agent._update_life_stage()
+            self.exporter = ModelExporter(
+                export_dir,
+                reporters=JOTR_MODEL_REPORTERS,
+                chunk_steps=export_chunk_steps,
+                agents_every=export_agents_every,
+                metadata={"bounds": bounds, "vectorized": vectorized},
+            )
+
+    def _add_initial_agents(self, initial_agents):
+        x, y, age = read_jotr_inventory(initial_agents, self.space.crs)
+
+        if self.vectorized:
+            self.jotr_population.add(x, y, age)
+            self.update_metrics()
+            return
+
+        raster_layer = self.space.raster_layer
+        float_cols, float_rows = get_raster_indices(raster_layer.transform, x, y)
 
-            # Add the seed agent to the model
-            self.model.space.add_agents(seed_agent)
-            delta_x_index = self.indices[0] - seed_agent.indices[0]
-            delta_y_index = self.indices[1] - seed_agent.indices[1]
+        # Agents outside of the raster have no cell to grow in, so they are dropped,
+        # as with seeds dispersed off of the raster
+        on_raster = self.space.is_on_raster(float_cols, float_rows)
+        self._create_jotr_agents(
+            x[on_raster],
+            y[on_raster],
+            age[on_raster],
+            float_cols[on_raster],
+            float_rows[on_raster],
+        )
+        self.update_metrics()
+
+    def add_agents_from_management_draw(
+        self, draw_control=None, action=None, geo_json=None
+    ):
+        # GeomanDrawControl.on_draw callback. Polygons drawn on the map are
+        # planted, other draw actions (edits, removals, ...) are ignored
+        if action != "create":
+            return
+
+        geometries = [
+            feature["geometry"]
+            for feature in geo_json
+            if feature["geometry"]["type"] in ("Polygon", "MultiPolygon")
+        ]
+        if geometries:
+            self.plant(geometries, density=self.planting_density)
 
-            print(
-                f"{STD_INDENT*3}➕ Seed ({seed_agent.unique_id}, lifestage {seed_agent.life_stage}) to {seed_agent._pos} (🔺index: {delta_x_index}, {delta_y_index})"
+    def plant(
+        self,
+        geometries,
+        density=None,
+        n_trees=None,
+        age=DEFAULT_PLANTING_AGE,
+        crs=DRAW_CRS,
+    ):
+        """
+        Plant trees in the area covered by `geometries` (GeoJSON geometry dicts
+        in `crs`), at `density` trees per cell or `n_trees` in total, of `age`
+        or an inclusive (min, max) range of ages (see patch.planting).
+
+        The area is rasterized and the trees sampled in a background thread, so
+        this returns right away (e.g. to the map's draw callback), and the trees
+        are added to the model in one batch at the start of the next step.
+        Returns a future of the sampled trees.
+        """
+
+        # Seeded from the model's stream here rather than in the thread, so
+        # plantings are reproducible
+        rng = np.random.default_rng(self.rng.integers(np.iinfo(np.int64).max))
+
+        if self._planting_executor is None:
+            self._planting_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="VegetationPlanting"
             )
+            # Shut down once the model is garbage collected, or at exit
+            weakref.finalize(self, self._planting_executor.shutdown)
+        raster_layer = self.space.raster_layer
+        future = self._planting_executor.submit(
+            sample_planting_area,
+            geometries,
+            raster_layer.transform,
+            (raster_layer.height, raster_layer.width),
+            self.space.crs.to_string(),
+            rng,
+            density=density,
+            n_trees=n_trees,
+            age=age,
+            geometries_crs=crs,
+        )
+        self._pending_plantings.append(future)
+        return future
 
+    def _add_pending_plantings(self):
+        # In the order they were planted, waiting for any still being sampled
+        pending_plantings, self._pending_plantings = self._pending_plantings, []
+        for future in pending_plantings:
+            x, y, age, float_cols, float_rows = future.result()
+            self.add_jotr_trees(x, y, age, float_cols, float_rows)
 
-class Vegetation(mesa.Model):
-    def __init__(self, bounds, export_data=False, num_steps=20, epsg=4326):
-        super().__init__()
-        self.bounds = bounds
-        self.export_data = export_data
-        self.num_steps = num_steps
+            if self.event_log.summary_enabled:
+                self.event_log.summary(f"{STD_INDENT*1}🌱 Planted {len(x)} trees")
+
+    def add_jotr_trees(self, x, y, age, float_cols, float_rows, birth_step=None):
+        # Trees at (x, y) that are on the raster at (float_cols, float_rows), as
+        # population rows or agents depending on the engine
+        if self.vectorized:
+            self.jotr_population.add(
+                x,
+                y,
+                age,
+                row=np.floor(float_rows).astype(np.int64),
+                col=np.floor(float_cols).astype(np.int64),
+                birth_step=birth_step,
+            )
+        else:
+            self._create_jotr_agents(
+                x, y, age, float_cols, float_rows, birth_step=birth_step
+            )
 
-        self.space = StudyArea(bounds, epsg=epsg, model=self)
+    def time_phase(self, name):
+        if self.timer is None:
+            return NO_TIMING
+        return self.timer.phase(name)
 
-        self.space.get_elevation()
-        self.space.get_aridity()
-        self.space.get_refugia_status()
+    def queue_seed_dispersal(self, jotr_agent, jotr_breeding_poisson_lambda):
+        self._seed_dispersal_queue.append((jotr_agent, jotr_breeding_poisson_lambda))
 
-        with open(INITIAL_AGENTS_PATH, "r") as f:
-            initial_agents_geojson = json.loads(f.read())
+    def queue_jotr_scheduling(self, jotr_agent):
+        self._jotr_scheduling_queue.append(jotr_agent)
 
-        self._add_agents_from_geojson(initial_agents_geojson)
+    def _schedule_jotr_agents(self, jotr_agents, step):
+        # Queue the next events of `jotr_agents`, whose ages are as of the end
+        # of `step`
+        if not jotr_agents:
+            return
 
-        self.datacollector = mesa.DataCollector(
-            {
-                "Mean Age": "mean_age",
-                "N Agents": "n_agents",
-                "N Seeds": "n_seeds",
-                "N Seedlings": "n_seedlings",
-                "N Juveniles": "n_juveniles",
-                "N Adults": "n_adults",
-                "N Breeding": "n_breeding",
-                "% Refugia Cells Occupied": "pct_refugia_cells_occupied",
-            }
+        life_stages = np.array([agent._life_stage for agent in jotr_agents])
+        ages = np.array([agent._age for agent in jotr_agents])
+        cols, rows = np.array([agent.indices for agent in jotr_agents]).T
+        items = np.empty(len(jotr_agents), dtype=object)
+        items[:] = jotr_agents
+        self.jotr_schedule.push(
+            items,
+            step,
+            life_stages,
+            ages,
+            self.space.jotr_rates.get_survival_rate(life_stages, rows, cols),
+            self.rng,
         )
 
-    def _add_agents_from_geojson(self, agents_geojson):
-        agents = mg.AgentCreator(JoshuaTreeAgent, model=self).from_GeoJSON(
-            agents_geojson
+        for jotr_agent in jotr_agents:
+            jotr_agent._scheduled_step = step
+            self._scheduled_jotr_agents[jotr_agent._life_stage][jotr_agent] = None
+
+    def _step_jotr_schedule(self):
+        """
+        Step the agents in the event schedule, after the rest have stepped:
+        every scheduled agent ages a year, those with an event in this step die
+        or are promoted, and every BREEDING one is queued to disperse seeds.
+        Agents that stepped into a scheduled life stage then join the schedule.
+
+        The schedule is redrawn, from the end of the last step, whenever the
+        rates change (e.g. with an aridity series).
+        """
+
+        schedule = self.jotr_schedule
+        scheduled = self._scheduled_jotr_agents
+        self.jotr_metrics.add_to_age_sum(sum(len(agents) for agents in scheduled.values()))
+
+        if schedule.rates is not self.space.jotr_rates:
+            schedule.clear()
+            jotr_agents = [agent for agents in scheduled.values() for agent in agents]
+            for jotr_agent in jotr_agents:
+                jotr_agent._age = jotr_agent.age - 1
+            self._schedule_jotr_agents(jotr_agents, self.steps - 1)
+            schedule.rates = self.space.jotr_rates
+
+        event_log = self.event_log
+        promoted = []
+        events = schedule.pop(self.steps)
+        if events is not None:
+            for jotr_agent, is_death in zip(*events):
+                initial_life_stage = jotr_agent.life_stage
+                del scheduled[initial_life_stage][jotr_agent]
+                jotr_agent._age = jotr_agent.age
+                jotr_agent._scheduled_step = None
+
+                if is_death:
+                    jotr_agent.life_stage = LifeStage.DEAD
+                    jotr_agent.death_step = self.steps
+                    if event_log.agent_enabled:
+                        event_log.agent(
+                            "died",
+                            step=self.steps,
+                            unique_id=jotr_agent.unique_id,
+                            life_stage=initial_life_stage.name,
+                            age=jotr_agent.age - 1,
+                        )
+                else:
+                    jotr_agent.life_stage = LifeStage.BREEDING
+                    promoted.append(jotr_agent)
+                    if event_log.agent_enabled:
+                        event_log.agent(
+                            "promoted",
+                            step=self.steps,
+                            unique_id=jotr_agent.unique_id,
+                            initial_life_stage=initial_life_stage.name,
+                            life_stage=jotr_agent.life_stage.name,
+                        )
+        self._schedule_jotr_agents(promoted, self.steps)
+
+        # Agents that stepped into BREEDING this step have already queued their
+        # seeds, and aren't in the schedule yet
+        breeders = list(scheduled[LifeStage.BREEDING])
+        if breeders:
+            cols, rows = np.array([agent.indices for agent in breeders]).T
+            self._seed_dispersal_queue.extend(
+                zip(
+                    breeders,
+                    self.space.jotr_rates.get_breeding_poisson_lambda(rows, cols),
+                )
+            )
+
+        jotr_agents = self._jotr_scheduling_queue
+        self._jotr_scheduling_queue = []
+        for jotr_agent in jotr_agents:
+            self.unscheduled_jotr_agents.discard(jotr_agent)
+        self._schedule_jotr_agents(jotr_agents, self.steps)
+
+    def _disperse_queued_seeds(self):
+        if not self._seed_dispersal_queue:
+            return []
+
+        parents, jotr_breeding_poisson_lambdas = zip(*self._seed_dispersal_queue)
+        self._seed_dispersal_queue = []
+
+        with self.time_phase("dispersal"):
+            n_seeds = self.rng.poisson(jotr_breeding_poisson_lambdas)
+        return self.disperse_seeds(parents, n_seeds)
+
+    def disperse_seeds(self, parents, n_seeds, max_dispersal_distance=None):
+        if max_dispersal_distance is None:
+            max_dispersal_distance = self.transitions["seed_dispersal_distance"]
+
+        event_log = self.event_log
+        if event_log.agent_enabled:
+            for parent, parent_n_seeds in zip(parents, n_seeds):
+                event_log.agent(
+                    "dispersing",
+                    step=self.steps,
+                    unique_id=parent.unique_id,
+                    n_seeds=parent_n_seeds,
+                )
+
+        with self.time_phase("dispersal"):
+            raster_layer = self.space.raster_layer
+            parent_x, parent_y = raster_layer.transform @ tuple(
+                np.array(
+                    [parent.float_indices for parent in parents], dtype=np.float64
+                ).reshape(-1, 2).T
+            )
+            seed_parent_idx, seed_x, seed_y = disperse_seed_locations(
+                parent_x,
+                parent_y,
+                n_seeds,
+                self.rng,
+                crs=self.space.crs.to_string(),
+                max_dispersal_distance=max_dispersal_distance,
+            )
+
+            float_cols, float_rows = get_raster_indices(
+                raster_layer.transform, seed_x, seed_y
+            )
+
+            # Seeds that land outside of the raster have no cell to grow in, so
+            # they are dropped rather than added to the model
+            on_raster = self.space.is_on_raster(float_cols, float_rows)
+
+        with self.time_phase("agent_creation"):
+            return self._create_seed_agents(
+                parents,
+                seed_parent_idx[on_raster],
+                seed_x[on_raster],
+                seed_y[on_raster],
+                float_cols[on_raster],
+                float_rows[on_raster],
+            )
+
+    def _create_seed_agents(
+        self, parents, seed_parent_idx, seed_x, seed_y, float_cols, float_rows
+    ):
+        seed_agents = self._create_jotr_agents(
+            seed_x,
+            seed_y,
+            np.zeros(len(seed_x), dtype=np.int64),
+            float_cols,
+            float_rows,
+            parent_ids=[parents[parent_idx].unique_id for parent_idx in seed_parent_idx],
         )
 
-        # TODO: Find a way to update life stage on init
-        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/9
-        # Since .from_GeoJSON() sets attributes after init, we call
-        # _update_life_stage after init, but before we add to the grid
-        self.agents.select(agent_type=JoshuaTreeAgent).do("_update_life_stage")
+        event_log = self.event_log
+        if event_log.agent_enabled:
+            for parent_idx, seed_agent in zip(seed_parent_idx, seed_agents):
+                parent = parents[parent_idx]
+                event_log.agent(
+                    "seed",
+                    step=self.steps,
+                    unique_id=seed_agent.unique_id,
+                    parent_id=parent.unique_id,
+                    pos=seed_agent._pos,
+                    delta_index=(
+                        parent.indices[0] - seed_agent.indices[0],
+                        parent.indices[1] - seed_agent.indices[1],
+                    ),
+                )
 
-        self.space.add_agents(agents)
-        self.update_metrics()
+        return seed_agents
 
-    # def add_agents_from_management_draw(event, geo_json, action):
-    def add_agents_from_management_draw(*args, **kwargs):
-        
-        assert kwargs.get("action") == "create"
-        management_area = kwargs.get('geo_json')
+    def _create_jotr_agents(
+        self, x, y, age, float_cols, float_rows, parent_ids=None, birth_step=None
+    ):
+        """
+        JoshuaTreeAgents at (x, y), in the space's crs, which are on the raster
+        at (float_cols, float_rows), which is all the agents keep of where they
+        are. Life stages are looked up for every age at once, and occupancy and
+        metrics are updated for the whole batch, before the agents are added to
+        the space in one go.
 
-        # Use geojson to creates agents within polygon area
-        # agents = mg.AgentCreator(JoshuaTreeAgent, model=self).from_GeoJSON(geojson)
-        # self.space.add_agents(agents)
+        With the model's cohorts, seeds and seedlings are counted there instead,
+        and aren't returned.
+        """
 
-    # @property
-    def update_metrics(self):
-        # Mean age
-        mean_age = self.agents.select(agent_type=JoshuaTreeAgent).agg("age", np.mean)
-        self.mean_age = mean_age
+        if self.jotr_cohorts is not None:
+            is_cohort = self.jotr_cohorts.is_cohort_age(age)
+            if is_cohort.any():
+                self.jotr_cohorts.add(
+                    np.floor(float_rows[is_cohort]).astype(np.int64),
+                    np.floor(float_cols[is_cohort]).astype(np.int64),
+                    age[is_cohort],
+                )
+                keep = ~is_cohort
+                x, y, age = x[keep], y[keep], age[keep]
+                float_cols, float_rows = float_cols[keep], float_rows[keep]
+                if parent_ids is not None:
+                    parent_ids = list(itertools.compress(parent_ids, keep))
+
+        if len(x) == 0:
+            return []
+
+        life_stages = self.space.jotr_rates.get_life_stage(age)
+        if parent_ids is None:
+            parent_ids = itertools.repeat(None)
+
+        crs = self.space.crs
+        jotr_agents = []
+        # Agents are placed by their float indices alone, as plain floats rather
+        # than numpy scalars (see JoshuaTreeAgent)
+        for agent_age, life_stage, float_col, float_row, parent_id in zip(
+            age.tolist(),
+            life_stages.tolist(),
+            np.asarray(float_cols, dtype=np.float64).tolist(),
+            np.asarray(float_rows, dtype=np.float64).tolist(),
+            parent_ids,
+        ):
+            jotr_agent = JoshuaTreeAgent(
+                model=self,
+                geometry=None,
+                crs=crs,
+                parent_id=parent_id,
+                float_indices=(float_col, float_row),
+            )
+            # Set behind the age and life_stage properties, since their
+            # bookkeeping is done for the whole batch below
+            jotr_agent._age = agent_age
+            jotr_agent._life_stage = LIFE_STAGES[life_stage]
+            if birth_step is not None:
+                jotr_agent.birth_step = birth_step
+            jotr_agents.append(jotr_agent)
+
+        not_counted = np.full(len(jotr_agents), NOT_COUNTED)
+        self.space.update_jotr_occupancy(
+            np.floor(float_rows).astype(np.int64),
+            np.floor(float_cols).astype(np.int64),
+            not_counted,
+            life_stages,
+        )
+        self.jotr_metrics.update_life_stages(not_counted, life_stages)
+        self.jotr_metrics.add_to_age_sum(age.sum())
+
+        self.space.add_agents(jotr_agents)
+        return jotr_agents
+
+    def remove_jotr_agents(self, jotr_agents):
+        # Note that this doesn't touch StudyArea.jotr_occupancy, which callers
+        # update for agents whose life stage is being counted
+        touched_cells = set()
+        for jotr_agent in jotr_agents:
+            self.space.remove_agent(jotr_agent)
+            jotr_agent.remove()
+            if self.jotr_schedule is not None and not self.vectorized:
+                self.unscheduled_jotr_agents.discard(jotr_agent)
+            touched_cells.add(
+                self.space.raster_layer.cells[jotr_agent._pos[0]][jotr_agent._pos[1]]
+            )
+
+        # Rebuild each touched cell's links once, rather than list.remove per agent
+        removed_ids = {jotr_agent.unique_id for jotr_agent in jotr_agents}
+        for cell in touched_cells:
+            cell.jotr_agents = [
+                jotr_agent
+                for jotr_agent in cell.jotr_agents
+                if jotr_agent.unique_id not in removed_ids
+            ] or NO_JOTR_AGENTS
+
+    def _should_compact(self):
+        if self.compact_every and self.steps % self.compact_every == 0:
+            return True
+
+        if self.compact_dead_fraction is not None:
+            # Cohort trees, dead or alive, are counted but never resident
+            n_dead_resident = self.n_dead - len(self.jotr_archive)
+            n_living_resident = self.n_agents
+            if self.jotr_cohorts is not None:
+                n_dead_resident -= self.jotr_cohorts.n_dead
+                n_living_resident -= int(self.jotr_cohorts.counts.sum(dtype=np.int64))
+            n_resident = n_living_resident + n_dead_resident
+            if n_resident and n_dead_resident / n_resident > self.compact_dead_fraction:
+                return True
+
+        return False
 
-        # Number of agents by life stage
-        count_dict = (
-            self.agents.select(agent_type=JoshuaTreeAgent).groupby("life_stage").count()
+    def compact_dead_agents(self):
+        if self.vectorized:
+            return self.jotr_population.compact(self.jotr_archive)
+
+        dead_agents = list(
+            self.agents.select(agent_type=JoshuaTreeAgent).select(
+                filter_func=lambda agent: agent.life_stage == LifeStage.DEAD
+            )
+        )
+        if not dead_agents:
+            return 0
+
+        self.jotr_archive.append(
+            unique_id=[agent.unique_id for agent in dead_agents],
+            parent_id=[
+                -1 if agent.parent_id is None else agent.parent_id
+                for agent in dead_agents
+            ],
+            birth_step=[agent.birth_step for agent in dead_agents],
+            death_step=[
+                -1 if agent.death_step is None else agent.death_step
+                for agent in dead_agents
+            ],
+            age=[agent.age for agent in dead_agents],
         )
-        self.n_seeds = count_dict.get(LifeStage.SEED, 0)
-        self.n_seedlings = count_dict.get(LifeStage.SEEDLING, 0)
-        self.n_juveniles = count_dict.get(LifeStage.JUVENILE, 0)
-        self.n_adults = count_dict.get(LifeStage.ADULT, 0)
-        self.n_breeding = count_dict.get(LifeStage.BREEDING, 0)
-        self.n_dead = count_dict.get(LifeStage.DEAD, 0)
-
-        # Number of agents (JoshuaTreeAgent)
-        n_agents = len(self.agents.select(agent_type=JoshuaTreeAgent))
-        self.n_agents = n_agents - self.n_dead
-
-        # Number of refugia cells occupied by JoshuaTreeAgents
-        count_dict = (
-            self.agents.select(agent_type=VegCell) \
-                .select(filter_func = lambda agent: agent.refugia_status) \
-                .groupby("occupied_by_jotr_agents") \
-                .count()
+        self.space.update_jotr_occupancy(
+            [agent.indices[1] for agent in dead_agents],
+            [agent.indices[0] for agent in dead_agents],
+            [LifeStage.DEAD] * len(dead_agents),
+            [NOT_COUNTED] * len(dead_agents),
         )
-        self.pct_refugia_cells_occupied = count_dict.get(True, 0) / (count_dict.get(True, 0) + count_dict.get(False, 0))
+        self.remove_jotr_agents(dead_agents)
+
+        return len(dead_agents)
+
+    def get_jotr_state(self):
+        # Every Joshua tree still in the model (i.e. not archived) as parallel
+        # arrays, with the same fields as JoshuaTreePopulation
+        if self.vectorized:
+            return self.jotr_population.get_state()
+
+        jotr_agents = list(self.agents_by_type.get(JoshuaTreeAgent, []))
+        x, y = self.space.raster_layer.transform @ tuple(
+            np.array(
+                [agent.float_indices for agent in jotr_agents], dtype=np.float64
+            ).reshape(-1, 2).T
+        )
+        fields = {
+            "unique_id": [agent.unique_id for agent in jotr_agents],
+            "parent_id": [
+                NO_PARENT_ID if agent.parent_id is None else agent.parent_id
+                for agent in jotr_agents
+            ],
+            "age": [agent.age for agent in jotr_agents],
+            "life_stage": [agent.life_stage for agent in jotr_agents],
+            "row": [agent.indices[1] for agent in jotr_agents],
+            "col": [agent.indices[0] for agent in jotr_agents],
+            "x": x,
+            "y": y,
+            "birth_step": [agent.birth_step for agent in jotr_agents],
+            "death_step": [
+                NO_STEP if agent.death_step is None else agent.death_step
+                for agent in jotr_agents
+            ],
+        }
+        return {
+            field: np.asarray(values, dtype=JoshuaTreePopulation.FIELDS[field])
+            for field, values in fields.items()
+        }
+
+    def materialize_jotr_agents(self):
+        if not self.vectorized:
+            return list(self.agents.select(agent_type=JoshuaTreeAgent))
+        return self.jotr_population.materialize()
+
+    def _recompute_metrics_from_population(self):
+        population = self.jotr_population
+        archive = self.jotr_archive
+
+        n_total = len(population) + len(archive)
+        age_sum = population.age.sum() + archive.age_sum
+
+        life_stage_counts = population.count_life_stages()
+        life_stage_counts[LifeStage.DEAD] += len(archive)
+
+        return n_total, age_sum, life_stage_counts
+
+    def _recompute_metrics_from_agents(self):
+        jotr_agents = self.agents.select(agent_type=JoshuaTreeAgent)
+        archive = self.jotr_archive
+
+        n_total = len(jotr_agents) + len(archive)
+        age_sum = jotr_agents.agg("age", np.sum) + archive.age_sum
+
+        count_dict = jotr_agents.groupby("life_stage").count()
+        life_stage_counts = np.zeros(len(LifeStage), dtype=np.int64)
+        for life_stage, count in count_dict.items():
+            life_stage_counts[life_stage] = count
+        life_stage_counts[LifeStage.DEAD] += len(archive)
+
+        return n_total, age_sum, life_stage_counts
+
+    def check_metrics(self):
+        if self.vectorized:
+            n_total, age_sum, life_stage_counts = (
+                self._recompute_metrics_from_population()
+            )
+        else:
+            n_total, age_sum, life_stage_counts = self._recompute_metrics_from_agents()
+        if self.jotr_cohorts is not None:
+            cohort_n_total, cohort_age_sum, cohort_life_stage_counts = (
+                self.jotr_cohorts.get_metrics()
+            )
+            n_total += cohort_n_total
+            age_sum += cohort_age_sum
+            life_stage_counts = life_stage_counts + cohort_life_stage_counts
+        n_refugia_cells_occupied = self.space.count_refugia_cells_occupied()
+
+        metrics = self.jotr_metrics
+        mismatches = {
+            name: (running, recomputed)
+            for name, running, recomputed in [
+                ("n_total", metrics.n_total, n_total),
+                ("age_sum", metrics.age_sum, age_sum),
+                (
+                    "life_stage_counts",
+                    metrics.life_stage_counts.tolist(),
+                    life_stage_counts.tolist(),
+                ),
+                (
+                    "n_refugia_cells_occupied",
+                    self.space.n_refugia_cells_occupied,
+                    n_refugia_cells_occupied,
+                ),
+            ]
+            if running != recomputed
+        }
+        if mismatches:
+            raise ValueError(
+                f"Running metrics disagree with recomputed metrics (running, recomputed): {mismatches}"
+            )
+
+    def update_metrics(self):
+        # All O(1) reads of the running counters
+        metrics = self.jotr_metrics
+
+        self.mean_age = metrics.mean_age
+
+        self.n_seeds = metrics.count(LifeStage.SEED)
+        self.n_seedlings = metrics.count(LifeStage.SEEDLING)
+        self.n_juveniles = metrics.count(LifeStage.JUVENILE)
+        self.n_adults = metrics.count(LifeStage.ADULT)
+        self.n_breeding = metrics.count(LifeStage.BREEDING)
+        self.n_dead = metrics.count(LifeStage.DEAD)
+
+        self.n_agents = metrics.n_alive
+
+        self.pct_refugia_cells_occupied = self.space.get_pct_refugia_cells_occupied()
+
+        if self.metrics_debug:
+            self.check_metrics()
 
     def step(self):
         # Print timestep header
-        timestep_str = f"# {STD_INDENT*0}🕰️  Time passes. It is the year {self.steps}. #"
-        nchar_timestep_str = len(timestep_str)
-        print("#" * (nchar_timestep_str - 1))
-        print(timestep_str)
-        print("#" * (nchar_timestep_str - 1))
-        print("\n")
+        log_step_header(self.event_log, self.steps)
+
+        if self._pending_plantings:
+            with self.time_phase("planting"):
+                self._add_pending_plantings()
+
+        if self.space.aridity_series is not None:
+            with self.time_phase("climate"):
+                self.space.update_aridity()
 
         # Step agents
-        self.agents.shuffle_do("step")
-        self.update_metrics()
+        if self.vectorized:
+            self.jotr_population.step()
+        else:
+            # Cells track nothing themselves anymore (see StudyArea.jotr_occupancy),
+            # so only the Joshua trees need stepping - if there are any left, since
+            # compaction can remove every one of them. Scheduled trees aren't
+            # stepped, their events are
+            if self.jotr_schedule is None:
+                jotr_agents = self.agents_by_type.get(JoshuaTreeAgent)
+            else:
+                jotr_agents = self.unscheduled_jotr_agents
+            # Each agent's step rolls its survival, ages it and queues its seeds
+            # in one call, so these are timed together as one phase, rather
+            # than as the vectorized engine's survival phase
+            if jotr_agents is not None:
+                with self.time_phase("agent_step"):
+                    jotr_agents.shuffle_do("step")
+            if self.jotr_schedule is not None:
+                with self.time_phase("schedule"):
+                    self._step_jotr_schedule()
+            if self.jotr_cohorts is not None:
+                with self.time_phase("cohorts"):
+                    self.jotr_cohorts.step()
+            self._disperse_queued_seeds()
+
+        with self.time_phase("update_metrics"):
+            self.update_metrics()
 
-        # Print end of timestep summary (just padding)
-        print("\n")
+        # Compaction doesn't change the metrics, since they account for the archive
+        if self._should_compact():
+            with self.time_phase("compaction"):
+                n_compacted = self.compact_dead_agents()
+            if self.event_log.summary_enabled:
+                self.event_log.summary(
+                    f"{STD_INDENT*1}🗄️  Archived {n_compacted} dead agents"
+                )
+
+        # Print end of timestep summary
+        log_step_summary(self.event_log, self)
+        self.event_log.flush()
 
         # Collect data
-        self.datacollector.collect(self)
+        with self.time_phase("datacollector"):
+            self.datacollector.collect(self)
+        if self.exporter is not None:
+            with self.time_phase("export"):
+                self.exporter.record_step(self)
+
+        if self.timer is not None:
+            self.timer.end_step(self.steps)
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def get_row_sums(counts):
+    # Prefix sums along each row, padded with a column of zeros: [i, j] is the
+    # total of counts[i, :j], so any run of cells in a row sums in two lookups
+    row_sums = np.zeros((counts.shape[0], counts.shape[1] + 1), dtype=np.int64)
+    np.cumsum(counts, axis=1, out=row_sums[:, 1:])
+    return row_sums
+
+
+def get_disk_footprint(radius, cell_size):
+    # The cells whose centers are within `radius` meters of a cell's center, as
+    # the half-width in columns of the footprint at each row offset from it
+    cell_size_x, cell_size_y = cell_size
+    row_radius = int(radius // cell_size_y)
+    row_offsets = np.arange(-row_radius, row_radius + 1)
+    half_widths = np.sqrt(
+        np.maximum(radius**2 - (row_offsets * cell_size_y) ** 2, 0)
+    )
+    return row_offsets, (half_widths // cell_size_x).astype(np.int64)
+
+
+def get_window_edges(n, radius):
+    # Start and stop of the window of `radius` cells either side of each of
+    # `n` cells, clipped to the raster
+    idx = np.arange(n)
+    return np.clip(idx - radius, 0, n), np.clip(idx + radius + 1, 0, n)
+
+
+class JoshuaTreeNeighborhood:
+    """
+    Counts of Joshua trees around every raster cell, for neighborhood effects
+    like nurse plants or competition.
+
+    Counts are read from StudyArea.jotr_occupancy (the per cell, per life stage
+    index the StudyArea already keeps up to date), summed over the requested
+    life stages into prefix sums along each row, and from those into a raster
+    of the number of trees within a radius of each cell, one run of cells per
+    row of the footprint. Answering the query for any number of trees is then
+    a lookup at their (row, col) indices.
+
+    Radii are in meters, measured between cell centers: the footprint is the
+    disk of cells whose centers are within the radius of the cell's center.
+    Trees are counted by cell, not by their position within it.
+
+    Count rasters are kept until `reset`, which the StudyArea does at the start
+    of each step (see StudyArea.jotr_neighborhood), so that every tree counts
+    its neighbors as they were before the step, in whatever order trees step.
+    """
+
+    def __init__(self, occupancy, cell_size):
+        self.occupancy = occupancy
+        self.cell_size = cell_size
+        self._count_rasters = {}
+
+    def reset(self):
+        self._count_rasters = {}
+
+    def get_count_raster(self, life_stages, radius):
+        key = (tuple(int(life_stage) for life_stage in life_stages), radius)
+        counts = self._count_rasters.get(key)
+        if counts is not None:
+            return counts
+
+        row_sums = get_row_sums(self.occupancy[list(key[0])].sum(axis=0))
+        height, width = self.occupancy.shape[1:]
+        rows = np.arange(height)
+
+        counts = np.zeros((height, width), dtype=np.int64)
+        for row_offset, half_width in zip(*get_disk_footprint(radius, self.cell_size)):
+            left, right = get_window_edges(width, half_width)
+            target_rows = rows[
+                (rows + row_offset >= 0) & (rows + row_offset < height)
+            ]
+            source_rows = target_rows + row_offset
+            counts[target_rows] += (
+                row_sums[np.ix_(source_rows, right)] - row_sums[np.ix_(source_rows, left)]
+            )
+        self._count_rasters[key] = counts
+        return counts
+
+    def count_within(self, life_stages, rows, cols, radius):
+        # Trees of `life_stages` within `radius` of each (row, col), including
+        # the tree at (row, col) itself. Works on scalars and on arrays of trees
+        return self.get_count_raster(life_stages, radius)[rows, cols]
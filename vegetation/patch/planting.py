@@ -0,0 +1,78 @@
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+
+# Management draws come from the Leaflet map, in lon / lat
+DRAW_CRS = "EPSG:4326"
+
+# Seedlings are planted at the youngest SEEDLING age, see config.transitions
+DEFAULT_PLANTING_AGE = 1
+DEFAULT_PLANTING_DENSITY = 10
+
+
+def get_planting_mask(geometries, transform, shape, crs, geometries_crs=DRAW_CRS):
+    # (row, col) mask of the cells whose centers fall in any of `geometries`
+    # (GeoJSON geometry dicts), rasterized once for the whole draw
+    if CRS.from_user_input(geometries_crs) != CRS.from_user_input(crs):
+        geometries = [
+            transform_geom(geometries_crs, crs, geometry) for geometry in geometries
+        ]
+    return geometry_mask(geometries, out_shape=shape, transform=transform, invert=True)
+
+
+def sample_planting(
+    mask, transform, rng, density=None, n_trees=None, age=DEFAULT_PLANTING_AGE
+):
+    """
+    Positions and ages of trees planted in the cells of `mask`: either
+    `n_trees` in total, in cells drawn uniformly (so, uniform over the area),
+    or a Poisson number of trees per cell with mean `density`. `age` is an age
+    for every tree, or an inclusive (min, max) range to draw them from.
+
+    Trees are placed uniformly within their cell. Returns (x, y, age, float
+    col, float row) arrays, with the float indices for placing the trees on the
+    raster without inverting the transform again.
+    """
+
+    if (density is None) == (n_trees is None):
+        raise ValueError("Pass either density or n_trees")
+
+    # Areas that cover no cell centers (e.g. drawn off the raster) get no trees
+    cells = np.flatnonzero(mask)
+    if len(cells) == 0:
+        tree_cells = cells
+    elif n_trees is not None:
+        tree_cells = cells[rng.integers(0, len(cells), n_trees)]
+    else:
+        tree_cells = np.repeat(cells, rng.poisson(density, len(cells)))
+
+    n_planted = len(tree_cells)
+    rows, cols = np.divmod(tree_cells, mask.shape[1])
+    float_cols = cols + rng.random(n_planted)
+    float_rows = rows + rng.random(n_planted)
+    x, y = transform @ (float_cols, float_rows)
+
+    if np.isscalar(age):
+        ages = np.full(n_planted, age, dtype=np.int64)
+    else:
+        min_age, max_age = age
+        ages = rng.integers(min_age, max_age + 1, n_planted)
+
+    return np.asarray(x), np.asarray(y), ages, float_cols, float_rows
+
+
+def sample_planting_area(
+    geometries,
+    transform,
+    shape,
+    crs,
+    rng,
+    density=None,
+    n_trees=None,
+    age=DEFAULT_PLANTING_AGE,
+    geometries_crs=DRAW_CRS,
+):
+    # get_planting_mask then sample_planting, as one task for a worker thread
+    mask = get_planting_mask(geometries, transform, shape, crs, geometries_crs)
+    return sample_planting(mask, transform, rng, density, n_trees, age)
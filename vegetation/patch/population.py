@@ -0,0 +1,491 @@
+import itertools
+
+import mesa_geo as mg
+import numpy as np
+from shapely.geometry import Point
+
+from config.stages import LifeStage
+from patch.dispersal import disperse_seed_locations, get_raster_indices
+from patch.metrics import NOT_COUNTED
+from patch.schedule import JOTR_IS_SCHEDULED_STAGE
+
+NO_PARENT_ID = -1
+NO_STEP = -1
+LIFE_STAGE_NAMES = np.array([life_stage.name for life_stage in LifeStage])
+
+
+class JoshuaTreePopulation:
+    """
+    Struct-of-arrays representation of every Joshua tree in a `Vegetation` model.
+
+    Each tree is a row across the parallel arrays below, so survival, aging and
+    life stage promotion are applied to the whole population at once instead of
+    stepping one `JoshuaTreeAgent` at a time. Dead trees keep their row (and stop
+    aging), mirroring the per-agent path where dead agents remain in the model.
+    """
+
+    FIELDS = {
+        "unique_id": np.int64,
+        "parent_id": np.int64,
+        "age": np.int64,
+        "life_stage": np.int8,
+        "row": np.int64,
+        "col": np.int64,
+        "x": np.float64,
+        "y": np.float64,
+        "birth_step": np.int64,
+        "death_step": np.int64,
+    }
+
+    def __init__(self, model, capacity=1024):
+        self.model = model
+        self.n = 0
+        self._capacity = capacity
+        for field, dtype in self.FIELDS.items():
+            setattr(self, f"_{field}", np.empty(capacity, dtype=dtype))
+
+        self.space = model.space
+        raster_layer = model.space.raster_layer
+        self.height = raster_layer.height
+        self.width = raster_layer.width
+        self.transform = raster_layer.transform
+
+        # JoshuaTreeAgent objects are only built on request, see `materialize`
+        self._materialized = {}
+
+        # Trees that land off the raster are dropped, unless this is set to a
+        # list, in which case they are collected there as (x, y, age, parent_id)
+        # arrays for the caller to place elsewhere (see patch.tiles)
+        self.off_raster = None
+
+        # With the model's event schedule, trees added in scheduled life stages
+        # (rows, as arrays) are stepped once, like any other, before they join
+        # the schedule. See _split_scheduled
+        self._unscheduled = []
+
+    def __len__(self):
+        return self.n
+
+    def __getattr__(self, name):
+        # Expose the live slice of each field array, e.g. `population.age`
+        if name in JoshuaTreePopulation.FIELDS:
+            return self.__dict__[f"_{name}"][: self.n]
+        raise AttributeError(name)
+
+    @property
+    def alive(self):
+        return self.life_stage != LifeStage.DEAD
+
+    def _reserve(self, n_new):
+        if self.n + n_new <= self._capacity:
+            return
+        capacity = max(self._capacity * 2, self.n + n_new)
+        for field in self.FIELDS:
+            old = self.__dict__[f"_{field}"]
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.n] = old[: self.n]
+            self.__dict__[f"_{field}"] = new
+        self._capacity = capacity
+
+    def _next_unique_ids(self, n):
+        # Draw from the same per-model counter mesa uses for Agent.unique_id, so
+        # ids never collide with materialized JoshuaTreeAgents
+        counter = mg.GeoAgent._ids[self.model]
+        return np.fromiter(itertools.islice(counter, n), dtype=np.int64, count=n)
+
+    def raster_indices(self, x, y):
+        float_col, float_row = get_raster_indices(self.transform, x, y)
+        return np.floor(float_row).astype(np.int64), np.floor(float_col).astype(
+            np.int64
+        )
+
+    def add(self, x, y, age, parent_id=None, row=None, col=None, birth_step=None):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        age = np.asarray(age, dtype=np.int64)
+        if parent_id is None:
+            parent_id = np.full(len(x), NO_PARENT_ID, dtype=np.int64)
+        parent_id = np.asarray(parent_id, dtype=np.int64)
+
+        # Raster indices can be passed in when the caller has already located
+        # the trees, so that points right on a cell edge aren't re-rounded
+        if row is None or col is None:
+            row, col = self.raster_indices(x, y)
+        else:
+            row, col = np.asarray(row, dtype=np.int64), np.asarray(col, dtype=np.int64)
+
+        # Trees outside the raster have no cell to draw their rates from, so they
+        # are dropped (e.g. seeds dispersed across the study area boundary)
+        on_raster = (row >= 0) & (row < self.height) & (col >= 0) & (col < self.width)
+
+        if self.off_raster is not None and not on_raster.all():
+            off_raster = ~on_raster
+            self.off_raster.append(
+                (x[off_raster], y[off_raster], age[off_raster], parent_id[off_raster])
+            )
+
+        # With the model's cohorts, seeds and seedlings are counted there instead
+        cohorts = self.model.jotr_cohorts
+        if cohorts is not None:
+            is_cohort = on_raster & cohorts.is_cohort_age(age)
+            cohorts.add(row[is_cohort], col[is_cohort], age[is_cohort])
+            on_raster &= ~is_cohort
+        n_new = int(on_raster.sum())
+
+        self._reserve(n_new)
+        new = slice(self.n, self.n + n_new)
+        self._unique_id[new] = self._next_unique_ids(n_new)
+        self._parent_id[new] = parent_id[on_raster]
+        self._age[new] = age[on_raster]
+        self._life_stage[new] = self.space.jotr_rates.get_life_stage(age[on_raster])
+        self._row[new] = row[on_raster]
+        self._col[new] = col[on_raster]
+        self._x[new] = x[on_raster]
+        self._y[new] = y[on_raster]
+        self._birth_step[new] = self.model.steps if birth_step is None else birth_step
+        self._death_step[new] = NO_STEP
+        self.n += n_new
+
+        if self.model.jotr_schedule is not None:
+            self._unscheduled.append(
+                np.arange(new.start, new.stop)[
+                    JOTR_IS_SCHEDULED_STAGE[self._life_stage[new]]
+                ]
+            )
+
+        self.space.update_jotr_occupancy(
+            self._row[new],
+            self._col[new],
+            np.full(n_new, NOT_COUNTED),
+            self._life_stage[new],
+        )
+        self.model.jotr_metrics.update_life_stages(
+            np.full(n_new, NOT_COUNTED), self._life_stage[new]
+        )
+        self.model.jotr_metrics.add_to_age_sum(self._age[new].sum())
+
+        return self._unique_id[new]
+
+    def pop_off_raster(self):
+        # Trees collected in `off_raster` since the last call, as concatenated
+        # (x, y, age, parent_id) arrays
+        off_raster = self.off_raster or []
+        self.off_raster = []
+        if not off_raster:
+            return (
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+            )
+        return tuple(np.concatenate(columns) for columns in zip(*off_raster))
+
+    def get_survival_rates(self, idx):
+        # Survival (or, for seeds, emergence) rates from the StudyArea's rate
+        # rasters, with the nurse bonus where there are nurse plants nearby
+        life_stage, row, col = self._life_stage[idx], self._row[idx], self._col[idx]
+        return self.space.jotr_rates.get_survival_rate(
+            life_stage,
+            row,
+            col,
+            self.space.get_jotr_nurse_indicator(life_stage, row, col),
+        )
+
+    def step(self):
+        with self.model.time_phase("survival"):
+            idx = self._step_survival()
+
+        # Cohorts step after the trees, so that the juveniles they hand over
+        # aren't stepped again this step
+        if self.model.jotr_cohorts is not None:
+            with self.model.time_phase("cohorts"):
+                self.model.jotr_cohorts.step()
+
+        breeding_idx = idx[self._life_stage[idx] == LifeStage.BREEDING]
+        if len(breeding_idx) > 0:
+            with self.model.time_phase("dispersal"):
+                jotr_breeding_poisson_lambda = (
+                    self.space.jotr_rates.get_breeding_poisson_lambda(
+                        self._row[breeding_idx], self._col[breeding_idx]
+                    )
+                )
+                n_seeds = self.model.rng.poisson(jotr_breeding_poisson_lambda)
+            self.disperse_seeds(breeding_idx, n_seeds)
+
+    def _split_scheduled(self, idx):
+        # Rows of `idx` that roll for survival this step, and rows that are in
+        # the event schedule instead
+        is_scheduled = JOTR_IS_SCHEDULED_STAGE[self._life_stage[idx]]
+        if self._unscheduled:
+            is_unscheduled = np.zeros(self.n, dtype=bool)
+            is_unscheduled[np.concatenate(self._unscheduled)] = True
+            is_scheduled &= ~is_unscheduled[idx]
+            self._unscheduled = []
+        return idx[~is_scheduled], idx[is_scheduled]
+
+    def _schedule(self, rows, step):
+        # Queue the next events of `rows`, as of the end of `step`
+        life_stage = self._life_stage[rows]
+        self.model.jotr_schedule.push(
+            rows,
+            step,
+            life_stage,
+            self._age[rows],
+            self.space.jotr_rates.get_survival_rate(
+                life_stage, self._row[rows], self._col[rows]
+            ),
+            self.model.rng,
+        )
+
+    def _step_survival(self):
+        # Only trees that existed at the start of the step are stepped, as with
+        # shuffle_do, which does not step agents created during the step
+        idx = np.flatnonzero(self.alive)
+
+        # With an event schedule, scheduled trees don't roll for survival, they
+        # die (or are promoted) as their events come up. The schedule is redrawn
+        # from the end of the last step whenever the rates change
+        schedule = self.model.jotr_schedule
+        if schedule is None:
+            rolled = idx
+        else:
+            rolled, scheduled = self._split_scheduled(idx)
+            if schedule.rates is not self.space.jotr_rates:
+                schedule.clear()
+                self._schedule(scheduled, self.model.steps - 1)
+                schedule.rates = self.space.jotr_rates
+
+        rolled_life_stage = self._life_stage[rolled]
+        survival_rate = self.get_survival_rates(rolled)
+
+        # One draw for the whole population
+        dice_roll_zero_to_one = self.model.rng.random(len(rolled))
+        rolled_died = dice_roll_zero_to_one >= survival_rate
+
+        events = None
+        if schedule is None:
+            died = rolled_died
+        else:
+            died_rows = np.zeros(self.n, dtype=bool)
+            died_rows[rolled[rolled_died]] = True
+            events = schedule.pop(self.model.steps)
+            if events is not None:
+                event_rows, is_death = events
+                died_rows[event_rows[is_death]] = True
+            died = died_rows[idx]
+
+        initial_life_stage = self._life_stage[idx]
+
+        self._age[idx] += 1
+        self._life_stage[idx] = np.where(
+            died, LifeStage.DEAD, self.space.jotr_rates.get_life_stage(self._age[idx])
+        )
+        self._death_step[idx[died]] = self.model.steps
+
+        changed = initial_life_stage != self._life_stage[idx]
+        self.space.update_jotr_occupancy(
+            self._row[idx[changed]],
+            self._col[idx[changed]],
+            initial_life_stage[changed],
+            self._life_stage[idx[changed]],
+        )
+        self.model.jotr_metrics.update_life_stages(
+            initial_life_stage[changed], self._life_stage[idx[changed]]
+        )
+        self.model.jotr_metrics.add_to_age_sum(len(idx))
+
+        # Rolled trees that are now in scheduled life stages join the schedule,
+        # and promoted trees are queued again at their new survival rate
+        if schedule is not None:
+            to_schedule = [
+                rolled[JOTR_IS_SCHEDULED_STAGE[self._life_stage[rolled]]]
+            ]
+            if events is not None:
+                to_schedule.append(event_rows[~is_death])
+            self._schedule(np.concatenate(to_schedule), self.model.steps)
+
+        event_log = self.model.event_log
+        if event_log.agent_enabled:
+            for event, is_event in [("survived", ~rolled_died), ("died", rolled_died)]:
+                event_log.agent(
+                    event,
+                    step=self.model.steps,
+                    unique_id=self._unique_id[rolled[is_event]],
+                    life_stage=LIFE_STAGE_NAMES[rolled_life_stage[is_event]],
+                    age=self._age[rolled[is_event]] - 1,
+                    dice_roll=dice_roll_zero_to_one[is_event],
+                    survival_rate=survival_rate[is_event],
+                )
+            if events is not None:
+                scheduled_died = event_rows[is_death]
+                event_log.agent(
+                    "died",
+                    step=self.model.steps,
+                    unique_id=self._unique_id[scheduled_died],
+                    life_stage=LIFE_STAGE_NAMES[
+                        initial_life_stage[np.searchsorted(idx, scheduled_died)]
+                    ],
+                    age=self._age[scheduled_died] - 1,
+                )
+            promoted = changed & ~died
+            event_log.agent(
+                "promoted",
+                step=self.model.steps,
+                unique_id=self._unique_id[idx[promoted]],
+                initial_life_stage=LIFE_STAGE_NAMES[initial_life_stage[promoted]],
+                life_stage=LIFE_STAGE_NAMES[self._life_stage[idx[promoted]]],
+            )
+
+        return idx
+
+    def disperse_seeds(self, parent_idx, n_seeds):
+        with self.model.time_phase("dispersal"):
+            seed_parent_idx, seed_x, seed_y = disperse_seed_locations(
+                self._x[parent_idx],
+                self._y[parent_idx],
+                n_seeds,
+                self.model.rng,
+                crs=self.model.space.crs.to_string(),
+                max_dispersal_distance=self.model.transitions["seed_dispersal_distance"],
+            )
+
+        with self.model.time_phase("agent_creation"):
+            seed_ids = self.add(
+                seed_x,
+                seed_y,
+                np.zeros(len(seed_x), dtype=np.int64),
+                parent_id=self._unique_id[parent_idx][seed_parent_idx],
+            )
+
+        event_log = self.model.event_log
+        if event_log.agent_enabled:
+            event_log.agent(
+                "dispersing",
+                step=self.model.steps,
+                unique_id=self._unique_id[parent_idx],
+                n_seeds=np.asarray(n_seeds),
+            )
+            seeds = slice(self.n - len(seed_ids), self.n)
+            event_log.agent(
+                "seed",
+                step=self.model.steps,
+                unique_id=seed_ids,
+                parent_id=self._parent_id[seeds],
+                row=self._row[seeds],
+                col=self._col[seeds],
+            )
+
+    def compact(self, archive):
+        # Move dead trees out of the arrays and into the archive, so per-step
+        # work only scales with the living population
+        dead = ~self.alive
+        n_dead = int(dead.sum())
+        if n_dead == 0:
+            return 0
+
+        archive.append(
+            unique_id=self.unique_id[dead],
+            parent_id=self.parent_id[dead],
+            birth_step=self.birth_step[dead],
+            death_step=self.death_step[dead],
+            age=self.age[dead],
+        )
+        self.space.update_jotr_occupancy(
+            self.row[dead],
+            self.col[dead],
+            self.life_stage[dead],
+            np.full(n_dead, NOT_COUNTED),
+        )
+
+        for unique_id in self.unique_id[dead]:
+            agent = self._materialized.pop(int(unique_id), None)
+            if agent is not None:
+                self.model.remove_jotr_agents([agent])
+
+        n_keep = self.n - n_dead
+        for field in self.FIELDS:
+            values = self.__dict__[f"_{field}"]
+            values[:n_keep] = values[: self.n][~dead]
+
+        # Rows queued for or in the event schedule are all alive, and move down
+        # by the number of dead rows before them
+        if self.model.jotr_schedule is not None:
+            new_rows = np.cumsum(~dead) - 1
+            self.model.jotr_schedule.remap(new_rows)
+            self._unscheduled = [new_rows[rows] for rows in self._unscheduled]
+        self.n = n_keep
+
+        return n_dead
+
+    def get_state(self):
+        return {field: getattr(self, field).copy() for field in self.FIELDS}
+
+    def set_state(self, fields):
+        # Fill an empty population from `get_state` output (see patch.checkpoint).
+        # Only the occupancy index is updated here, the caller is responsible for
+        # restoring the model's running metrics
+        if self.n:
+            raise ValueError("Can only set the state of an empty population")
+
+        n_new = len(fields["unique_id"])
+        self._reserve(n_new)
+        for field, dtype in self.FIELDS.items():
+            self.__dict__[f"_{field}"][:n_new] = np.asarray(fields[field], dtype=dtype)
+        self.n = n_new
+
+        self.space.update_jotr_occupancy(
+            self.row, self.col, np.full(n_new, NOT_COUNTED), self.life_stage
+        )
+
+        # The event schedule isn't saved, scheduled trees are stepped once and
+        # drawn again (see JoshuaTreeSchedule)
+        if self.model.jotr_schedule is not None:
+            self._unscheduled.append(
+                np.flatnonzero(JOTR_IS_SCHEDULED_STAGE[self.life_stage])
+            )
+
+    def count_life_stages(self):
+        return np.bincount(self.life_stage, minlength=len(LifeStage))
+
+    def materialize(self):
+        """
+        Build (or refresh) a `JoshuaTreeAgent` for every row of the population.
+
+        Agents are added to the space (which links them to their cells) so the
+        visualization and any agent-based user code can see them, but they are
+        not stepped - the arrays remain the source of truth, and calling this
+        again syncs the agents with the current state of the population.
+        """
+
+        from patch.model import JoshuaTreeAgent
+
+        new_agents = []
+        for i in range(self.n):
+            unique_id = int(self._unique_id[i])
+            agent = self._materialized.get(unique_id)
+            if agent is None:
+                agent = JoshuaTreeAgent(
+                    model=self.model,
+                    geometry=Point(self._x[i], self._y[i]),
+                    crs=self.model.space.crs,
+                    age=int(self._age[i]),
+                    parent_id=(
+                        None
+                        if self._parent_id[i] == NO_PARENT_ID
+                        else int(self._parent_id[i])
+                    ),
+                )
+                agent.unique_id = unique_id
+                self._materialized[unique_id] = agent
+                new_agents.append(agent)
+
+            agent.age = int(self._age[i])
+
+            # Bypass the life_stage setter, the population already counts this
+            # tree in the StudyArea's occupancy index
+            agent._life_stage = LifeStage(self._life_stage[i])
+
+        if new_agents:
+            self.model.space.add_agents(new_agents)
+
+        return list(self._materialized.values())
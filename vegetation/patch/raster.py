@@ -0,0 +1,165 @@
+import mesa_geo as mg
+import numpy as np
+from mesa_geo.raster_layers import RasterBase
+
+
+class LazyCell(mg.Cell):
+    """
+    A view of one cell of a `LazyRasterLayer`.
+
+    Raster attributes (e.g. `cell.elevation`) are read from the layer's band
+    arrays, so the view itself only holds its position (in slots, with its
+    indices derived from its pos) and whatever is set on it directly.
+    """
+
+    __slots__ = ("model", "unique_id", "pos", "layer")
+
+    def __init__(self, model, pos=None, layer=None):
+        # Views are created and thrown away as cells are touched, so unlike other
+        # agents they aren't registered with the model (which would keep every
+        # view alive, and bring back the memory cost of one object per pixel)
+        self.model = model
+        self.unique_id = None
+        self.pos = pos
+        self.layer = layer
+
+    @property
+    def indices(self):
+        x, y = self.pos
+        return self.layer.height - y - 1, x
+
+    def __getattr__(self, name):
+        # Only reached when normal attribute lookup fails, i.e. for bands (or for
+        # the slots, before they're set)
+        if name not in LazyCell.__slots__:
+            layer = self.layer
+            if layer is not None and name in layer.bands:
+                return layer.bands[name][self.indices]
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
+
+class LazyCellColumn:
+    # `layer.cells[x]`, so that `layer.cells[x][y]` works as for mg.RasterLayer
+
+    def __init__(self, layer, x):
+        self.layer = layer
+        self.x = x
+
+    def __len__(self):
+        return self.layer.height
+
+    def __getitem__(self, y):
+        ys = range(self.layer.height)[y]
+        if isinstance(ys, range):
+            return [self.layer.get_cell(self.x, y) for y in ys]
+        return self.layer.get_cell(self.x, ys)
+
+    def __iter__(self):
+        for y in range(self.layer.height):
+            yield self.layer.get_cell(self.x, y)
+
+
+class LazyCells:
+    # `layer.cells`, indexed by pos, i.e. `layer.cells[x][y]`
+
+    def __init__(self, layer):
+        self.layer = layer
+
+    def __len__(self):
+        return self.layer.width
+
+    def __getitem__(self, x):
+        xs = range(self.layer.width)[x]
+        if isinstance(xs, range):
+            return [LazyCellColumn(self.layer, x) for x in xs]
+        return LazyCellColumn(self.layer, xs)
+
+    def __iter__(self):
+        for x in range(self.layer.width):
+            yield LazyCellColumn(self.layer, x)
+
+
+class LazyRasterLayer(mg.RasterLayer):
+    """
+    A `mg.RasterLayer` that keeps its attributes as (row, col) band arrays
+    instead of on one cell object per pixel.
+
+    Bands are stored as given, so a band memory-mapped from the raster cache
+    stays on disk until it is read. Cells are `LazyCell` views, created when
+    they are first looked up through `cells[x][y]` (e.g. by an agent, or to
+    link agents to it) and kept from then on, so memory scales with the
+    number of cells touched rather than with the size of the study area.
+    Iterating over the whole layer (as the map does, through `to_image`)
+    yields throwaway views for cells that haven't been touched.
+    """
+
+    def __init__(
+        self, width, height, crs, total_bounds, model, cell_cls: type[LazyCell] = LazyCell
+    ):
+        # Skip mg.RasterLayer.__init__, which builds every cell up front
+        RasterBase.__init__(self, width, height, crs, total_bounds)
+        self.model = model
+        self.cell_cls = cell_cls
+        self.cells = LazyCells(self)
+        self.bands = {}
+
+        self._cell_views = {}
+        self._attributes = set()
+        self._neighborhood_cache = {}
+
+    @property
+    def n_cell_views(self):
+        return len(self._cell_views)
+
+    def _make_cell(self, x, y):
+        return self.cell_cls(self.model, pos=(x, y), layer=self)
+
+    def get_cell(self, x, y):
+        cell = self._cell_views.get((x, y))
+        if cell is None:
+            cell = self._make_cell(x, y)
+            # Keyed by the view's own pos, rather than another (x, y) tuple
+            self._cell_views[cell.pos] = cell
+        return cell
+
+    def _peek_cell(self, x, y):
+        # Like get_cell, but doesn't keep views of untouched cells around
+        cell = self._cell_views.get((x, y))
+        if cell is None:
+            cell = self._make_cell(x, y)
+        return cell
+
+    def __iter__(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                yield self._peek_cell(x, y)
+
+    def coord_iter(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                yield self._peek_cell(x, y), x, y
+
+    def apply_raster(self, data, attr_name=None):
+        if data.shape != (1, self.height, self.width):
+            raise ValueError(
+                f"Data shape does not match raster shape. "
+                f"Expected {(1, self.height, self.width)}, received {data.shape}."
+            )
+        if attr_name is None:
+            attr_name = f"attribute_{len(self.bands)}"
+        self._attributes.add(attr_name)
+
+        # No copy, so views see the band as given (memory-mapped or not)
+        self.bands[attr_name] = data[0]
+
+    def get_raster(self, attr_name=None):
+        if attr_name is not None and attr_name not in self.attributes:
+            raise ValueError(
+                f"Attribute {attr_name} does not exist. "
+                f"Choose from {self.attributes}, or set `attr_name` to `None` to retrieve all."
+            )
+        if attr_name is None:
+            return np.stack([self.bands[name] for name in sorted(self.attributes)])
+        return np.asarray(self.bands[attr_name])[np.newaxis]
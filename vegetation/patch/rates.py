@@ -0,0 +1,68 @@
+import numpy as np
+
+from config.stages import LifeStage
+from config.transitions import (
+    JOTR_SURVIVAL_STAGES,
+    get_jotr_survival_rate,
+    get_jotr_breeding_poisson_lambda,
+)
+
+
+class JoshuaTreeRates:
+    """
+    A transitions config (see config.transitions) compiled for an aridity
+    raster: survival rates as a (life stage, row, col) raster, breeding Poisson
+    lambdas as a (row, col) raster and life stages as a table by age, so that
+    per-tree lookups in the step are array indexing.
+
+    Built by StudyArea.jotr_rates, which rebuilds it when aridity changes.
+    """
+
+    def __init__(self, transitions, aridity):
+        aridity = np.asarray(aridity)
+
+        # Rates without a nurse plant, which adds the stage's nurse_bonus. The
+        # DEAD plane is NaN, since dead trees aren't stepped
+        self.survival_rate = np.full((len(LifeStage), *aridity.shape), np.nan)
+        self.nurse_bonus = np.zeros(len(LifeStage))
+        for life_stage in JOTR_SURVIVAL_STAGES:
+            self.survival_rate[life_stage] = get_jotr_survival_rate(
+                life_stage, aridity, 0, transitions
+            )
+            self.nurse_bonus[life_stage] = transitions["survival"][life_stage.name][
+                "nurse_bonus"
+            ]
+
+        self.breeding_poisson_lambda = np.asarray(
+            get_jotr_breeding_poisson_lambda(aridity, transitions), dtype=np.float64
+        )
+
+        # Life stage by age, up to the reproductive age, after which every tree
+        # is BREEDING (see config.transitions for the boundaries)
+        stage_ages = transitions["stage_ages"]
+        age = np.arange(stage_ages["reproductive"] + 1)
+        self.life_stage_by_age = np.select(
+            [
+                age == 0,
+                age <= stage_ages["juvenile"],
+                age <= stage_ages["adult"],
+                age < stage_ages["reproductive"],
+            ],
+            [LifeStage.SEED, LifeStage.SEEDLING, LifeStage.JUVENILE, LifeStage.ADULT],
+            default=LifeStage.BREEDING,
+        ).astype(np.int8)
+
+    def get_survival_rate(self, life_stage, row, col, nurse_indicator=None):
+        # Works on scalars and on arrays of trees
+        survival_rate = self.survival_rate[life_stage, row, col]
+        if nurse_indicator is not None:
+            survival_rate = survival_rate + self.nurse_bonus[life_stage] * nurse_indicator
+        return survival_rate
+
+    def get_breeding_poisson_lambda(self, row, col):
+        return self.breeding_poisson_lambda[row, col]
+
+    def get_life_stage(self, age):
+        return self.life_stage_by_age[
+            np.minimum(age, len(self.life_stage_by_age) - 1)
+        ]
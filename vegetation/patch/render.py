@@ -0,0 +1,81 @@
+import base64
+import io
+
+import mesa_geo as mg
+import numpy as np
+from PIL import Image
+
+from config.stages import LifeStage, LIFE_STAGE_RGB_VIZ_MAP
+
+# Leaflet places image overlays by lon / lat bounds
+LEAFLET_CRS = "epsg:4326"
+
+# Cells without Joshua trees are drawn in grayscale by elevation, from black at
+# 0 to white at MAX_VIZ_ELEVATION meters, except for refugia which are green
+MAX_VIZ_ELEVATION = 5000
+ELEVATION_VIZ_ALPHA = 0.25
+REFUGIA_RGBA = (0, 255, 0, 1)
+
+
+def to_rgba8(rgba):
+    # (r, g, b, a) with a from 0 to 1, as in LIFE_STAGE_RGB_VIZ_MAP, to bytes
+    r, g, b, a = rgba
+    return r, g, b, round(a * 255)
+
+
+# RGBA of cells by the highest life stage in them, indexed by life stage
+LIFE_STAGE_RGBA8 = np.array(
+    [to_rgba8(LIFE_STAGE_RGB_VIZ_MAP[life_stage]) for life_stage in LifeStage],
+    dtype=np.uint8,
+)
+
+
+def get_jotr_rgba(space):
+    """
+    The study area as a (row, col, RGBA) uint8 image: each cell colored by the
+    highest life stage of any Joshua tree in it, or if there are none, green
+    for refugia and grayscale by elevation otherwise.
+
+    Built from the StudyArea's rasters and occupancy index, for every cell at
+    once, rather than by portraying each cell.
+    """
+
+    elevation = np.nan_to_num(np.asarray(space.rasters["elevation"], dtype=np.float64))
+    normalized_elevation = np.clip(elevation / MAX_VIZ_ELEVATION * 255, 0, 255)
+
+    rgba = np.empty((*elevation.shape, 4), dtype=np.uint8)
+    rgba[..., :3] = normalized_elevation.astype(np.uint8)[..., np.newaxis]
+    rgba[..., 3] = round(ELEVATION_VIZ_ALPHA * 255)
+    rgba[np.asarray(space.rasters["refugia_status"], dtype=bool)] = to_rgba8(
+        REFUGIA_RGBA
+    )
+
+    max_life_stage = space.get_max_jotr_life_stage_raster()
+    has_jotr = max_life_stage >= 0
+    rgba[has_jotr] = LIFE_STAGE_RGBA8[max_life_stage[has_jotr]]
+    return rgba
+
+
+def get_png_url(rgba):
+    # Images are encoded every frame and only sent to the browser, so they are
+    # compressed for speed rather than size
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="png", compress_level=1)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_jotr_overlay(space):
+    # The study area image as a PNG data URL, with its bounds as Leaflet
+    # expects them, [[min_lat, min_lon], [max_lat, max_lon]]
+    rgba = get_jotr_rgba(space)
+    total_bounds = space.raster_layer.total_bounds
+
+    if not space.crs.equals(LEAFLET_CRS):
+        image = mg.ImageLayer(
+            values=rgba.transpose(2, 0, 1), crs=space.crs, total_bounds=total_bounds
+        ).to_crs(LEAFLET_CRS)
+        rgba = np.ascontiguousarray(image.values.transpose(1, 2, 0), dtype=np.uint8)
+        total_bounds = image.total_bounds
+
+    min_x, min_y, max_x, max_y = total_bounds
+    return get_png_url(rgba), [[min_y, min_x], [max_y, max_x]]
@@ -0,0 +1,96 @@
+import numpy as np
+
+from config.stages import LifeStage
+from config.transitions import JOTR_SCHEDULED_STAGES
+
+# Lookup table of whether each life stage is scheduled, by life stage
+JOTR_IS_SCHEDULED_STAGE = np.isin(np.arange(len(LifeStage)), JOTR_SCHEDULED_STAGES)
+
+# Years to an event that never happens, e.g. death at a survival rate of 1
+NEVER = np.iinfo(np.int64).max
+
+
+class JoshuaTreeSchedule:
+    """
+    Next-event scheduling for long-lived Joshua trees (JOTR_SCHEDULED_STAGES).
+
+    Adults and breeding trees survive most years, at a rate that only changes
+    when they're promoted (at a known age) or when the rates themselves do. So
+    rather than rolling for them every step, each tree's years until death are
+    drawn once, from the geometric distribution of its survival rate, and the
+    tree is queued in a bucket for the step of its next event: death, or for
+    ADULT trees promotion to BREEDING if that comes first. Each step then only
+    touches the trees with an event in that step.
+
+    The geometric distribution is memoryless, so the queue can be thrown away
+    and redrawn at any step without changing the distribution of lifespans.
+    That's what happens when the rates it was drawn with change (see `rates`).
+
+    Items are whatever identifies a tree to the model: rows of a
+    JoshuaTreePopulation, or JoshuaTreeAgents.
+    """
+
+    def __init__(self, reproductive_age):
+        self.reproductive_age = reproductive_age
+
+        # The JoshuaTreeRates the queue was drawn with, for the model to check
+        # against StudyArea.jotr_rates
+        self.rates = None
+
+        # Lists of (items, is_death) arrays, by event step
+        self._buckets = {}
+
+    def __len__(self):
+        return sum(
+            len(items) for bucket in self._buckets.values() for items, _ in bucket
+        )
+
+    def push(self, items, step, life_stages, ages, survival_rates, rng):
+        """
+        Queue the next event of each of `items` (an array), whose last survival
+        roll was in `step`, from their life stages, ages and survival rates as
+        of then, drawing from `rng` (the model's, which patch.tiles replaces
+        after the schedule is made). Trees that can never die or be promoted
+        aren't queued.
+        """
+
+        p_death = 1 - np.clip(survival_rates, 0, 1)
+        years_to_death = np.full(len(items), NEVER)
+        dies = p_death > 0
+        years_to_death[dies] = rng.geometric(p_death[dies])
+
+        years_to_promotion = np.where(
+            life_stages == LifeStage.ADULT, self.reproductive_age - ages, NEVER
+        )
+
+        is_death = years_to_death <= years_to_promotion
+        years_to_event = np.minimum(years_to_death, years_to_promotion)
+        queued = np.flatnonzero(years_to_event != NEVER)
+
+        # One chunk per distinct event step
+        event_steps = step + years_to_event[queued]
+        order = np.argsort(event_steps, kind="stable")
+        splits = np.flatnonzero(np.diff(event_steps[order])) + 1
+        for chunk in np.split(order, splits):
+            if len(chunk) == 0:
+                continue
+            self._buckets.setdefault(int(event_steps[chunk[0]]), []).append(
+                (items[queued[chunk]], is_death[queued[chunk]])
+            )
+
+    def pop(self, step):
+        # (items, is_death) of the events in `step`, or None if there are none
+        bucket = self._buckets.pop(step, None)
+        if not bucket:
+            return None
+        items, is_death = zip(*bucket)
+        return np.concatenate(items), np.concatenate(is_death)
+
+    def clear(self):
+        self._buckets = {}
+
+    def remap(self, new_items):
+        # Replace every queued item i with new_items[i], e.g. population rows
+        # after compaction
+        for bucket in self._buckets.values():
+            bucket[:] = [(new_items[items], is_death) for items, is_death in bucket]
@@ -3,137 +3,240 @@ from __future__ import annotations
 import mesa
 import mesa_geo as mg
 import numpy as np
-import stackstac
-from pystac_client import Client as PystacClient
-import planetary_computer
-import random
-import os
-import hashlib
-import logging
 import time
 
 from config.stages import LifeStage
+from config.paths import LOCAL_RASTER_CACHE_DIR, DEM_STAC_PATH
+from config.transitions import JOTR_NURSE_STAGES
+from patch.cache import RasterCache, CachedRaster, get_raster_cache_key
+from patch.climate import AriditySeries
+from patch.dispersal import JOTR_UTM_PROJ, get_transformer
+from patch.neighborhood import JoshuaTreeNeighborhood
+from patch.raster import LazyCell, LazyRasterLayer
+from patch.rates import JoshuaTreeRates
+from patch.stac import is_local_catalog, search_local_catalog, read_stac_band
 
 # from patch.model import JoshuaTreeAgent
 # import rioxarray as rxr
 
-DEM_STAC_PATH = "https://planetarycomputer.microsoft.com/api/stac/v1/"
-LOCAL_STAC_CACHE_FSTRING = "/local_dev_data/{band_name}_{bounds_md5}.tif"
+DEM_STAC_COLLECTION = "cop-dem-glo-30"
+DEM_STAC_ASSET = "data"
 SAVE_LOCAL_STAC_CACHE = True
 
+# Aridity is elevation plus a uniform noise offset in +/- ARIDITY_NOISE_RANGE,
+# see get_aridity_noise
+ARIDITY_NOISE_RANGE = 300
 
-class VegCell(mg.Cell):
+def get_aridity_noise(bounds, crs):
+    # Drawn once per study area, from a stream seeded by its raster cache key
+    # rather than from the model's rng. The same area then gets the same
+    # aridity however its bands were made (downloaded, cropped or cached), and
+    # drawing it never shifts the model's stream, whose seed varies the trees
+    # rather than the landscape
+    key = get_raster_cache_key(DEM_STAC_COLLECTION, bounds, crs)
+    return np.random.default_rng(int(key, 16)).uniform(
+        -ARIDITY_NOISE_RANGE, ARIDITY_NOISE_RANGE
+    )
+
+
+# Lookup table of whether each life stage is a nurse plant, by life stage
+JOTR_IS_NURSE_STAGE = np.isin(np.arange(len(LifeStage)), JOTR_NURSE_STAGES)
+
+
+# Shared by every cell without any linked Joshua trees, rather than an empty
+# list per cell
+NO_JOTR_AGENTS = ()
+
+
+class VegCell(LazyCell):
+    # Read from the StudyArea's raster layer bands, see LazyCell
     elevation: int | None
     aridity: int | None
-    refugia_status: bool = False
+    refugia_status: bool
+
+    __slots__ = ("jotr_agents",)
 
     def __init__(
         self,
         model,
         pos: mesa.space.Coordinate | None = None,
-        indices: mesa.space.Coordinate | None = None,
+        layer: LazyRasterLayer | None = None,
     ):
-        super().__init__(model, pos, indices)
-        self.elevation = None
-        self.aridity = None
+        super().__init__(model, pos, layer)
 
         # TODO: Improve patch level tracking of JOTR agents
         # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/1
-        # For now, this is somewhat of a hack to track which agents are present within a patch cell
-        # This is something I suspect is an offshoot of my question posed to the mesa-geo team
-        # (https://github.com/projectmesa/mesa-geo/issues/267), where the cell does not have a geometry
-        # and thus I can't use the various geometry based intersection methods to find agents. My guess
-        # is that this will either not work or be very slow, but itll get us started
-        self.jotr_agents = []
-        self.occupied_by_jotr_agents = False
-
-    def step(self):
-        # Right now, this cell is being updated by the JOTR agent step, but it probably shouldn't be
-        self.update_occupancy()
-        pass
-    
-    def update_occupancy(self):
-            # Very clunky way to exclude dead agents
-            alive_jotr_agents = [agent for agent in self.jotr_agents if agent.life_stage != LifeStage.DEAD]
-            self.occupied_by_jotr_agents = True if len(alive_jotr_agents) > 0 else False
+        # The cell does not have a geometry (https://github.com/projectmesa/mesa-geo/issues/267),
+        # so agents are linked to their cell once, when they are added to the StudyArea. Occupancy
+        # itself is tracked by StudyArea.jotr_occupancy, so this is only for user code that
+        # needs the agent objects: NO_JOTR_AGENTS until a first agent is linked, then a list
+        self.jotr_agents = NO_JOTR_AGENTS
+
+    @property
+    def occupied_by_jotr_agents(self):
+        return self.model.space.is_occupied_by_jotr_agents(*self.indices)
+
+    @property
+    def max_jotr_life_stage(self):
+        return self.model.space.get_max_jotr_life_stage(*self.indices)
 
     def add_agent_link(self, jotr_agent):
-        if jotr_agent.life_stage and jotr_agent not in self.jotr_agents:
+        if self.jotr_agents is NO_JOTR_AGENTS:
+            self.jotr_agents = [jotr_agent]
+        else:
             self.jotr_agents.append(jotr_agent)
 
+
 class StudyArea(mg.GeoSpace):
-    def __init__(self, bounds, epsg, model):
+    def __init__(
+        self,
+        bounds,
+        epsg,
+        model,
+        raster_cache_dir=LOCAL_RASTER_CACHE_DIR,
+        mmap_rasters=True,
+        stac_path=DEM_STAC_PATH,
+    ):
         super().__init__(crs=f"epsg:{epsg}")
         self.bounds = bounds
         self.model = model
         self.epsg = epsg
 
-        # For local development, we want to cache the STAC data so we don't
-        # have to download it every time. This hash is used to uniquely identify
-        # the bounds of the study area, so that we can grab if we already have it
-        self.bounds_md5 = hashlib.md5(str(bounds).encode()).hexdigest()
-
+        # For local development, we want to cache the STAC data (and everything
+        # we derive from it) so we don't have to download it every time. The
+        # entry for this study area is set by get_elevation, and derived bands
+        # are added to it as they are computed
+        self.raster_cache = RasterCache(raster_cache_dir) if SAVE_LOCAL_STAC_CACHE else None
+        self.cached_raster = None
+
+        # Whether cached bands are read memory-mapped, rather than into memory
+        self.mmap_rasters = mmap_rasters
+
+        # Band values as (row, col) arrays, the same arrays the raster layer's
+        # cells read from, so array-based code doesn't have to go through the cells
+        self.rasters = {}
+
+        # Live count of Joshua trees per (life stage, row, col), updated as agents
+        # are born, promoted, die and are removed. Dead agents are counted (in the
+        # LifeStage.DEAD plane) until they are compacted out of the model
+        self._jotr_occupancy = None
+        self.n_refugia_cells_occupied = 0
+
+        # Transition rates compiled for the aridity raster, see jotr_rates
+        self._jotr_rates = None
+
+        # With a yearly aridity series, aridity changes every step rather than
+        # staying as derived from elevation, see set_aridity_series
+        self.aridity_series = None
+
+        # Tree counts around each cell, as of the start of the step, see
+        # jotr_neighborhood
+        self._jotr_neighborhood = None
+        self._jotr_neighborhood_step = None
+
+        # Elevation is read from a STAC API, or a static catalog on disk (see
+        # patch.stac), when it isn't in the cache
+        self.stac_path = stac_path
         self.pystac_client = None
-        if not LOCAL_STAC_CACHE_FSTRING:
-            self.pystac_client = PystacClient.open(
-                DEM_STAC_PATH, modifier=planetary_computer.sign_inplace
+
+    def _get_cached_raster(self):
+        if self.raster_cache is None:
+            return None
+        return self.raster_cache.get(
+            source=DEM_STAC_COLLECTION,
+            bounds=self.bounds,
+            crs=self.crs.to_string(),
+            mmap=self.mmap_rasters,
+        )
+
+    def _cache_band(self, band_name, band):
+        self.cached_raster.bands[band_name] = band
+        if self.raster_cache is not None:
+            self.cached_raster.content_hash = self.raster_cache.put_band(
+                self.cached_raster.key, band_name, band
             )
 
-    def get_elevation(self):
+    def _get_cached_band(self, band_name):
+        if self.cached_raster is None:
+            return None
+        return self.cached_raster.bands.get(band_name)
+
+    def _build_raster_layer(self, elevation, transform):
+        height, width = elevation.shape
+        min_x, max_y = transform @ (0, 0)
+        max_x, min_y = transform @ (width, height)
+
+        elevation_layer = LazyRasterLayer(
+            model=self.model,
+            height=height,
+            width=width,
+            cell_cls=VegCell,
+            total_bounds=[min_x, min_y, max_x, max_y],
+            crs=self.crs,
+        )
+        elevation_layer._transform = transform
 
-        local_elevation_path = LOCAL_STAC_CACHE_FSTRING.format(
-            band_name="elevation",
-            bounds_md5=self.bounds_md5,
+        elevation_layer.apply_raster(
+            data=np.asarray(elevation)[np.newaxis],
+            attr_name="elevation",
         )
+        return elevation_layer
 
-        if os.path.exists(local_elevation_path):
+    def get_elevation(self):
 
-            print(f"Loading elevation from local cache: {local_elevation_path}")
+        cached_raster = self._get_cached_raster()
 
-            try:
-                elevation_layer = mg.RasterLayer.from_file(
-                    raster_file=local_elevation_path,
-                    model=self.model,
-                    cell_cls=VegCell,
-                    attr_name="elevation",
-                )
-            except Exception as e:
-                logging.warning(
-                    f"Failed to load elevation from local cache ({local_elevation_path}): {e}"
-                )
-                raise e
+        if cached_raster is not None and cached_raster.exact:
 
-        else:
+            print(f"Loading elevation from local cache: {cached_raster.key[:8]}")
+            self.cached_raster = cached_raster
 
-            print("No local cache found, downloading elevation from STAC")
-            time_at_start = time.time()
+        elif cached_raster is not None:
 
-            elevation = self.get_elevation_from_stac()
+            # Served by cropping a larger cached extent. Derived bands are
+            # recomputed for ours, since refugia depend on the extent as a whole
+            # (a percentile), and aridity noise on the study area
+            print(f"Loading elevation from a larger cached extent: {cached_raster.key[:8]}")
+            self.cached_raster = self.raster_cache.put(
+                source=DEM_STAC_COLLECTION,
+                bounds=self.bounds,
+                crs=self.crs.to_string(),
+                bands={"elevation": cached_raster.bands["elevation"]},
+                transform=cached_raster.transform,
+            )
 
-            __elevation_bands, elevation_height, elevation_width = elevation.shape
+        else:
 
-            elevation_layer = mg.RasterLayer(
-                model=self.model,
-                height=elevation_height,
-                width=elevation_width,
-                # cell_cls=VegCell,
-                total_bounds=self.bounds,
-                # crs=f"epsg:{self.epsg}",
-                crs=self.crs,
-            )
+            print("No local cache found, downloading elevation from STAC")
+            time_at_start = time.time()
 
-            elevation_layer.apply_raster(
-                data=elevation,
-                attr_name="elevation",
-            )
+            elevation, transform = self.get_elevation_from_stac()
 
-            if SAVE_LOCAL_STAC_CACHE:
-                print(f"Saving elevation to local cache: {local_elevation_path}")
-                elevation_layer.to_file(local_elevation_path)
+            if self.raster_cache is not None:
+                print("Saving elevation to local cache")
+                self.cached_raster = self.raster_cache.put(
+                    source=DEM_STAC_COLLECTION,
+                    bounds=self.bounds,
+                    crs=self.crs.to_string(),
+                    bands={"elevation": elevation},
+                    transform=transform,
+                )
+            else:
+                self.cached_raster = CachedRaster(
+                    key=None,
+                    bands={"elevation": elevation},
+                    transform=transform,
+                    crs=self.crs.to_string(),
+                )
 
             print(f"Downloaded elevation in {time.time() - time_at_start} seconds")
 
+        elevation_layer = self._build_raster_layer(
+            self.cached_raster.bands["elevation"], self.cached_raster.transform
+        )
+
         super().add_layer(elevation_layer)
+        self.rasters["elevation"] = self.cached_raster.bands["elevation"]
 
     def get_aridity(self):
 
@@ -142,64 +245,163 @@ class StudyArea(mg.GeoSpace):
         # positive relationship with elevation, with a little noise. This is
         # smelly because it relies on elevation being set first, but it's
         # a placeholder for now
-        elevation_array = self.raster_layer.get_raster("elevation")
-        inverse_elevation = np.array(elevation_array + random.uniform(-300, 300))
+        aridity = self._get_cached_band("aridity")
+        if aridity is None:
+            noise = get_aridity_noise(self.bounds, self.crs.to_string())
+            aridity = np.array(self.rasters["elevation"] + noise)
+            self._cache_band("aridity", aridity)
+        self._set_aridity(aridity)
+        super().add_layer(self.raster_layer)
+
+    def _set_aridity(self, aridity):
+        self.rasters["aridity"] = aridity
+        self.invalidate_jotr_rates()
 
         self.raster_layer.apply_raster(
-            data=inverse_elevation,
+            data=np.asarray(aridity)[np.newaxis],
             attr_name="aridity",
         )
-        super().add_layer(self.raster_layer)
+
+    def set_aridity_series(self, path):
+        # Read aridity from a yearly series from now on, see update_aridity and
+        # patch.climate.AriditySeries. The first year is read in the background
+        # straight away, since the next step needs it
+        if self.aridity_series is not None:
+            self.aridity_series.close()
+        self.aridity_series = AriditySeries(
+            path,
+            self.raster_layer.transform,
+            self.rasters["elevation"].shape,
+            self.crs,
+        )
+        self.aridity_series.prefetch(self.model.steps + 1)
+
+    def update_aridity(self):
+        # Swap in this step's year of the aridity series, if there is one. The
+        # rates are recompiled from it on first use (see jotr_rates)
+        if self.aridity_series is None:
+            return
+        self._set_aridity(self.aridity_series.get(self.model.steps))
 
     def get_refugia_status(self):
-        elevation_array = self.raster_layer.get_raster("elevation")
-        ninetyfive_percentile = np.percentile(elevation_array, 95)
-        refugia = elevation_array > ninetyfive_percentile
+        refugia = self._get_cached_band("refugia_status")
+        if refugia is None:
+            elevation_array = self.rasters["elevation"]
+            ninetyfive_percentile = np.percentile(elevation_array, 95)
+            refugia = elevation_array > ninetyfive_percentile
+            self._cache_band("refugia_status", refugia)
+        self.rasters["refugia_status"] = refugia
+        self.n_refugia_cells = int(refugia.sum())
 
         self.raster_layer.apply_raster(
-            data=refugia,
+            data=np.asarray(refugia)[np.newaxis],
             attr_name="refugia_status",
         )
         super().add_layer(self.raster_layer)
 
-    def get_elevation_from_stac(self):
+    def set_rasters(self, cached_raster):
+        # Use bands that were loaded or derived elsewhere instead of fetching
+        # them, e.g. a window of a larger StudyArea's rasters (see patch.tiles)
+        self.cached_raster = cached_raster
+        bands = cached_raster.bands
 
-        print("Collecting STAC Items")
-        items_generator = self.pystac_client.search(
-            collections=["cop-dem-glo-30"],
-            bbox=self.bounds,
-        ).items()
-
-        items = [item for item in items_generator]
-        print(f"Found {len(items)} items")
-
-        print("Stacking STAC Items")
-        elevation = stackstac.stack(
-            items=items,
-            assets=["data"],
-            bounds=self.bounds,
-            epsg=self.epsg,
+        raster_layer = self._build_raster_layer(
+            bands["elevation"], cached_raster.transform
         )
+        for band_name in ["aridity", "refugia_status"]:
+            raster_layer.apply_raster(
+                data=np.asarray(bands[band_name])[np.newaxis],
+                attr_name=band_name,
+            )
+        super().add_layer(raster_layer)
 
-        # TODO: It seems weird that we have duplicate time dimension, it seems like
-        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/15
-        # stackstac should automatically ignore the `id` dimension which is just
-        # is contains the cog name, which doesn't really matter to us. This check
-        # ensures that there aren't overlap issues where we introduce some kind of
-        # bias, but this seems like a code smell to me
+        for band_name in ["elevation", "aridity", "refugia_status"]:
+            self.rasters[band_name] = bands[band_name]
+        self.n_refugia_cells = int(bands["refugia_status"].sum())
+        self.invalidate_jotr_rates()
 
-        print("Checking for duplicate elevation data")
-        n_not_nan = np.unique(elevation.count(dim="time"))
-        if not n_not_nan == [1]:
-            raise ValueError(
-                f"Some cells have no, or duplicate, elevation data. Unique number of non-nan values: {n_not_nan}"
+    @property
+    def jotr_rates(self):
+        # Compiled on first use, and again only after aridity (or the model's
+        # transitions) change, see invalidate_jotr_rates
+        if self._jotr_rates is None:
+            self._jotr_rates = JoshuaTreeRates(
+                self.model.transitions, self.rasters["aridity"]
+            )
+        return self._jotr_rates
+
+    def invalidate_jotr_rates(self):
+        self._jotr_rates = None
+
+    @property
+    def jotr_neighborhood(self):
+        # Counts are reset on first use in each step, so within a step they're
+        # as of its start, see JoshuaTreeNeighborhood
+        if self._jotr_neighborhood is None:
+            self._jotr_neighborhood = JoshuaTreeNeighborhood(
+                self.jotr_occupancy, self.get_cell_size()
             )
+        if self._jotr_neighborhood_step != self.model.steps:
+            self._jotr_neighborhood.reset()
+            self._jotr_neighborhood_step = self.model.steps
+        return self._jotr_neighborhood
+
+    def get_cell_size(self):
+        # (x, y) size of a cell in meters, in UTM as for seed dispersal (see
+        # patch.dispersal), measured at the center of the raster
+        transform = self.raster_layer.transform
+        col, row = self.raster_layer.width // 2, self.raster_layer.height // 2
+        x, y = zip(
+            transform @ (col, row), transform @ (col + 1, row), transform @ (col, row + 1)
+        )
+        x_utm, y_utm = get_transformer(self.crs.to_string(), JOTR_UTM_PROJ).transform(
+            np.array(x), np.array(y)
+        )
+        return (
+            float(np.hypot(x_utm[1] - x_utm[0], y_utm[1] - y_utm[0])),
+            float(np.hypot(x_utm[2] - x_utm[0], y_utm[2] - y_utm[0])),
+        )
+
+    def get_jotr_nurse_indicator(self, life_stages, rows, cols):
+        # Whether trees of `life_stages` at (rows, cols) have a nurse plant, i.e.
+        # another ADULT or BREEDING tree within the transitions' nurse_radius,
+        # or None if nurse plants aren't modeled. Works on scalars and arrays
+        nurse_radius = self.model.transitions.get("nurse_radius")
+        if nurse_radius is None:
+            return None
+        n_nurse_plants = self.jotr_neighborhood.count_within(
+            JOTR_NURSE_STAGES, rows, cols, nurse_radius
+        )
+        # Trees don't nurse themselves
+        n_nurse_plants = n_nurse_plants - JOTR_IS_NURSE_STAGE[life_stages]
+        return n_nurse_plants > 0
+
+    def get_elevation_from_stac(self):
 
-        # Collapse along time dimension, ignoring COG source
-        print("Collapsing time dimension")
-        elevation = elevation.median(dim="time")
+        print("Collecting STAC Items")
+        if is_local_catalog(self.stac_path):
+            items = search_local_catalog(
+                self.stac_path, DEM_STAC_COLLECTION, self.bounds
+            )
+        else:
+            if self.pystac_client is None:
+                # Network dependencies are only imported once elevation actually
+                # has to be fetched, so cached (or headless, see __main__) runs
+                # start without them
+                from pystac_client import Client as PystacClient
+                import planetary_computer
+
+                self.pystac_client = PystacClient.open(
+                    self.stac_path, modifier=planetary_computer.sign_inplace
+                )
+            items = self.pystac_client.search(
+                collections=[DEM_STAC_COLLECTION],
+                bbox=self.bounds,
+            ).items()
 
-        return elevation
+        # Items are read as the search pages through them, rather than after
+        print("Reading STAC Items")
+        return read_stac_band(items, self.bounds, self.epsg, asset=DEM_STAC_ASSET)
 
     @property
     def raster_layer(self):
@@ -212,6 +414,122 @@ class StudyArea(mg.GeoSpace):
         else:
             self.layers.append(value)
 
+    def is_on_raster(self, float_cols, float_rows):
+        # Works on scalars and on arrays of float (col, row) indices
+        return (
+            (float_cols >= 0)
+            & (float_cols < self.raster_layer.width)
+            & (float_rows >= 0)
+            & (float_rows < self.raster_layer.height)
+        )
+
+    def _check_agent(self, agent):
+        # Joshua trees are placed by their indices on the raster layer, so are
+        # always in the space's crs, and their geometry is only built on demand
+        if hasattr(agent, "life_stage"):
+            return
+        super()._check_agent(agent)
+
+    def add_agents(self, agents):
+        super().add_agents(agents)
+
+        # Link Joshua trees to their cell (the layer is keyed by pos, not indices)
+        if not isinstance(agents, list):
+            agents = [agents]
+        for agent in agents:
+            if hasattr(agent, "life_stage"):
+                self.raster_layer.cells[agent._pos[0]][agent._pos[1]].add_agent_link(
+                    agent
+                )
+
+    @property
+    def jotr_occupancy(self):
+        if self._jotr_occupancy is None:
+            self._jotr_occupancy = np.zeros(
+                (len(LifeStage), self.raster_layer.height, self.raster_layer.width),
+                dtype=np.int32,
+            )
+        return self._jotr_occupancy
+
+    def update_jotr_occupancy(
+        self, rows, cols, old_life_stages, new_life_stages, counts=None
+    ):
+        # Move agents at (rows, cols) from their old to their new life stage. A
+        # life stage of None (or -1, for arrays) means not counted, i.e. for
+        # agents that are being born or removed. With `counts` (arrays only),
+        # each entry moves that many agents at once (see patch.cohorts)
+        occupancy = self.jotr_occupancy
+        living_occupancy = occupancy[LifeStage.DEAD + 1 :]
+        refugia = self.rasters["refugia_status"]
+
+        if np.isscalar(rows):
+            was_occupied = living_occupancy[:, rows, cols].any()
+            if old_life_stages is not None and old_life_stages >= 0:
+                occupancy[old_life_stages, rows, cols] -= 1
+            if new_life_stages is not None and new_life_stages >= 0:
+                occupancy[new_life_stages, rows, cols] += 1
+
+            if refugia[rows, cols]:
+                is_occupied = living_occupancy[:, rows, cols].any()
+                self.n_refugia_cells_occupied += int(is_occupied) - int(was_occupied)
+            return
+
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        old_life_stages = np.asarray(old_life_stages)
+        new_life_stages = np.asarray(new_life_stages)
+
+        # Only refugia cells touched by this update can change occupied status
+        touched_refugia = np.unique(rows * self.raster_layer.width + cols)
+        touched_refugia = touched_refugia[refugia.ravel()[touched_refugia]]
+        living_occupancy_flat = living_occupancy.reshape(len(living_occupancy), -1)
+        n_was_occupied = living_occupancy_flat[:, touched_refugia].any(axis=0).sum()
+
+        is_counted = old_life_stages >= 0
+        np.subtract.at(
+            occupancy,
+            (old_life_stages[is_counted], rows[is_counted], cols[is_counted]),
+            1 if counts is None else counts[is_counted],
+        )
+        is_counted = new_life_stages >= 0
+        np.add.at(
+            occupancy,
+            (new_life_stages[is_counted], rows[is_counted], cols[is_counted]),
+            1 if counts is None else counts[is_counted],
+        )
+
+        n_is_occupied = living_occupancy_flat[:, touched_refugia].any(axis=0).sum()
+        self.n_refugia_cells_occupied += int(n_is_occupied) - int(n_was_occupied)
+
+    def get_occupied_by_jotr_agents(self):
+        # Living agents only, so skip the DEAD plane
+        return self.jotr_occupancy[LifeStage.DEAD + 1 :].any(axis=0)
+
+    def is_occupied_by_jotr_agents(self, row_idx, col_idx):
+        return bool(self.jotr_occupancy[LifeStage.DEAD + 1 :, row_idx, col_idx].any())
+
+    def get_max_jotr_life_stage(self, row_idx, col_idx):
+        present_life_stages = np.flatnonzero(self.jotr_occupancy[:, row_idx, col_idx])
+        if len(present_life_stages) == 0:
+            return None
+        return LifeStage(present_life_stages[-1])
+
+    def get_max_jotr_life_stage_raster(self):
+        # Highest life stage present in each cell, or -1 where there are no agents
+        is_present = self.jotr_occupancy > 0
+        n_life_stages = is_present.shape[0]
+        max_life_stage = n_life_stages - 1 - np.argmax(is_present[::-1], axis=0)
+        return np.where(is_present.any(axis=0), max_life_stage, -1)
+
+    def get_pct_refugia_cells_occupied(self):
+        if not self.n_refugia_cells:
+            return np.nan
+        return self.n_refugia_cells_occupied / self.n_refugia_cells
+
+    def count_refugia_cells_occupied(self):
+        # Full recomputation of n_refugia_cells_occupied, for cross-checking
+        refugia = self.rasters["refugia_status"]
+        return int(self.get_occupied_by_jotr_agents()[refugia].sum())
+
     def is_at_boundary(self, row_idx, col_idx):
         return (
             row_idx == 0
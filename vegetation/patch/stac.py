@@ -0,0 +1,188 @@
+import concurrent.futures
+import math
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import Resampling, calculate_default_transform, transform_bounds
+
+# COG reads are I/O bound, so this is about open requests, not cores
+STAC_MAX_WORKERS = 8
+
+# Each read covers at most this many rows of one item, which bounds memory
+# (and reads in flight are bounded to twice the number of workers)
+STAC_CHUNK_ROWS = 1024
+
+# In pixels, see get_target_grid
+SNAP_TOLERANCE = 1e-6
+
+# Only read the COG itself, not every sidecar file GDAL would look for
+COG_GDAL_ENV = {"GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR"}
+
+
+def is_local_catalog(stac_path):
+    return not stac_path.startswith(("http://", "https://"))
+
+
+def search_local_catalog(catalog_path, collection, bbox):
+    """
+    Items of `collection` intersecting `bbox` (in lon / lat, as for a STAC API
+    search) in a static STAC catalog on disk, e.g. a directory of COGs with a
+    catalog.json, standing in for Planetary Computer.
+    """
+
+    import pystac
+
+    catalog = pystac.Catalog.from_file(catalog_path)
+    min_x, min_y, max_x, max_y = bbox
+    for item in catalog.get_items(recursive=True):
+        if item.collection_id != collection:
+            continue
+        item_min_x, item_min_y, item_max_x, item_max_y = item.bbox
+        if (
+            item_min_x < max_x
+            and item_max_x > min_x
+            and item_min_y < max_y
+            and item_max_y > min_y
+        ):
+            yield item
+
+
+def get_target_grid(bounds, resolution):
+    # As stackstac does: bounds snapped outwards to multiples of the resolution,
+    # except that bounds within SNAP_TOLERANCE of a pixel edge count as on it,
+    # so float error doesn't add a row or column with no data
+    x_res, y_res = resolution
+    min_x, min_y, max_x, max_y = bounds
+    min_x = math.floor(min_x / x_res + SNAP_TOLERANCE) * x_res
+    min_y = math.floor(min_y / y_res + SNAP_TOLERANCE) * y_res
+    max_x = math.ceil(max_x / x_res - SNAP_TOLERANCE) * x_res
+    max_y = math.ceil(max_y / y_res - SNAP_TOLERANCE) * y_res
+
+    transform = Affine(x_res, 0.0, min_x, 0.0, -y_res, max_y)
+    height = int(round((max_y - min_y) / y_res))
+    width = int(round((max_x - min_x) / x_res))
+    return transform, (height, width)
+
+
+def get_cog_resolution(href, crs):
+    # Native resolution of a COG, in the units of `crs`
+    with rasterio.Env(**COG_GDAL_ENV), rasterio.open(href) as src:
+        if src.crs == crs:
+            return src.res
+        transform, _, _ = calculate_default_transform(
+            src.crs, crs, src.width, src.height, *src.bounds
+        )
+        return abs(transform.a), abs(transform.e)
+
+
+def get_item_windows(item_bounds, transform, shape, chunk_rows):
+    # The (row_start, row_stop, col_start, col_stop) windows of the target grid
+    # an item covers, split into chunks of at most `chunk_rows` rows. Windows
+    # are padded by a pixel, since reads outside of the item just come back NaN
+    height, width = shape
+    item_min_x, item_min_y, item_max_x, item_max_y = item_bounds
+    col_min, row_min = ~transform @ (item_min_x, item_max_y)
+    col_max, row_max = ~transform @ (item_max_x, item_min_y)
+
+    row_start = max(int(math.floor(row_min)) - 1, 0)
+    row_stop = min(int(math.ceil(row_max)) + 1, height)
+    col_start = max(int(math.floor(col_min)) - 1, 0)
+    col_stop = min(int(math.ceil(col_max)) + 1, width)
+
+    for chunk_start in range(row_start, row_stop, chunk_rows):
+        yield chunk_start, min(chunk_start + chunk_rows, row_stop), col_start, col_stop
+
+
+def read_cog_window(href, transform, crs, window, band=1):
+    # One window of the target grid from one band of a COG, NaN wherever it has
+    # no data (the COG's own nodata, and cells outside of it)
+    row_start, row_stop, col_start, col_stop = window
+    with rasterio.Env(**COG_GDAL_ENV), rasterio.open(href) as src, WarpedVRT(
+        src,
+        crs=crs,
+        transform=transform @ Affine.translation(col_start, row_start),
+        height=row_stop - row_start,
+        width=col_stop - col_start,
+        resampling=Resampling.nearest,
+        nodata=np.nan,
+        dtype="float64",
+    ) as vrt:
+        data = vrt.read(band, masked=True).filled(np.nan)
+    return window, data
+
+
+def read_stac_band(
+    items,
+    bounds,
+    epsg,
+    asset,
+    max_workers=STAC_MAX_WORKERS,
+    chunk_rows=STAC_CHUNK_ROWS,
+):
+    """
+    Read one band from STAC `items` (any iterable, e.g. a search that's still
+    paging) onto a grid covering `bounds` in `epsg`, at the first item's native
+    resolution, as a (row, col) float array and its transform.
+
+    Windows of every item are read concurrently, and folded into the result as
+    they arrive, counting how many items had data for each cell. Every cell
+    must be covered by exactly one item, so the count is checked once at the
+    end, rather than taking a median over a stack of every item.
+    """
+
+    crs = CRS.from_epsg(epsg)
+
+    band = None
+    n_not_nan = None
+    n_items = 0
+
+    def fold(done):
+        for future in done:
+            (row_start, row_stop, col_start, col_stop), data = future.result()
+            is_data = ~np.isnan(data)
+            n_not_nan[row_start:row_stop, col_start:col_stop] += is_data
+            band[row_start:row_stop, col_start:col_stop][is_data] = data[is_data]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for item in items:
+            href = item.assets[asset].get_absolute_href()
+            n_items += 1
+
+            if band is None:
+                transform, shape = get_target_grid(
+                    bounds, get_cog_resolution(href, crs)
+                )
+                band = np.full(shape, np.nan)
+                n_not_nan = np.zeros(shape, dtype=np.uint8)
+
+            item_bounds = transform_bounds("EPSG:4326", crs, *item.bbox)
+            for window in get_item_windows(item_bounds, transform, shape, chunk_rows):
+                pending.add(
+                    executor.submit(read_cog_window, href, transform, crs, window)
+                )
+                if len(pending) >= 2 * max_workers:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    fold(done)
+
+        fold(concurrent.futures.as_completed(pending))
+
+    if band is None:
+        raise ValueError(f"No STAC items found for bounds {bounds}")
+
+    print(f"Read {n_items} items")
+
+    # Overlapping items would otherwise silently bias the result, see
+    # https://github.com/SchmidtDSE/mesa_abm_poc/issues/15
+    n_not_nan = np.unique(n_not_nan)
+    if not np.array_equal(n_not_nan, [1]):
+        raise ValueError(
+            f"Some cells have no, or duplicate, data. Unique number of non-nan values: {n_not_nan}"
+        )
+
+    return band, transform
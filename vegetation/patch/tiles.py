@@ -0,0 +1,366 @@
+import itertools
+import multiprocessing
+import os
+import weakref
+
+import mesa
+import mesa_geo as mg
+import numpy as np
+from affine import Affine
+
+from config.paths import INITIAL_AGENTS_PATH, LOCAL_RASTER_CACHE_DIR
+from config.stages import LifeStage
+from patch.cache import CachedRaster
+from patch.dispersal import get_raster_indices
+from patch.events import EventLog, EventLevel
+from patch.metrics import JoshuaTreeMetrics
+from patch.model import (
+    Vegetation,
+    EMPTY_GEOJSON,
+    JOTR_MODEL_REPORTERS,
+    get_model_rng,
+    log_step_header,
+    log_step_summary,
+)
+from patch.inventory import read_jotr_inventory
+from patch.population import JoshuaTreePopulation, NO_PARENT_ID
+from patch.space import StudyArea
+
+TILE_BANDS = ["elevation", "aridity", "refugia_status"]
+
+
+def get_tile_grid(height, width, n_tiles):
+    """
+    Split a `height` x `width` raster into `n_tiles` tiles, as row and col edges
+    (tile (i, j) covers rows row_edges[i]:row_edges[i + 1], and so on). Of the
+    ways to factor `n_tiles` into rows x cols of tiles, the one whose tiles are
+    closest to square is used, which keeps the boundary (and so the number of
+    seeds crossing it) small.
+    """
+
+    n_tile_rows = min(
+        (n for n in range(1, n_tiles + 1) if n_tiles % n == 0),
+        key=lambda n: abs(np.log((height / n) / (width / (n_tiles // n)))),
+    )
+    n_tile_cols = n_tiles // n_tile_rows
+    if n_tile_rows > height or n_tile_cols > width:
+        raise ValueError(
+            f"Can't split a {height}x{width} raster into {n_tile_rows}x{n_tile_cols} tiles"
+        )
+
+    row_edges = np.linspace(0, height, n_tile_rows + 1).round().astype(np.int64)
+    col_edges = np.linspace(0, width, n_tile_cols + 1).round().astype(np.int64)
+    return row_edges, col_edges
+
+
+def get_tile_metrics(model):
+    return {
+        "life_stage_counts": model.jotr_metrics.life_stage_counts.copy(),
+        "n_total": model.jotr_metrics.n_total,
+        "age_sum": model.jotr_metrics.age_sum,
+        "n_refugia_cells_occupied": model.space.n_refugia_cells_occupied,
+    }
+
+
+def _run_tile(connection, tile_index, n_tiles, rasters, initial_agents, rng, model_kwargs):
+    # Worker process for one tile: a vectorized Vegetation model over the tile's
+    # window of the rasters, driven by commands from the TiledVegetation
+    model = Vegetation(
+        bounds=rasters.total_bounds,
+        rasters=rasters,
+        initial_agents=EMPTY_GEOJSON,
+        vectorized=True,
+        log_level=EventLevel.OFF,
+        **model_kwargs,
+    )
+
+    # Interleave unique ids across tiles (tile i gets i + 1, i + 1 + n_tiles, ...)
+    # so that they are unique across the whole study area
+    mg.GeoAgent._ids[model] = itertools.count(tile_index + 1, n_tiles)
+    model.reset_rng(rng)
+
+    population = model.jotr_population
+    population.off_raster = []
+    population.add(*initial_agents)
+    model.update_metrics()
+    connection.send(get_tile_metrics(model))
+
+    while True:
+        command, payload = connection.recv()
+        if command == "step":
+            model.step()
+            connection.send(population.pop_off_raster())
+        elif command == "immigrate":
+            population.add(*payload)
+            model.update_metrics()
+            connection.send(get_tile_metrics(model))
+        elif command == "gather":
+            connection.send(
+                (population.get_state(), model.jotr_archive.to_dict())
+            )
+        elif command == "close":
+            connection.close()
+            return
+        else:
+            raise ValueError(f"Unknown tile command: {command}")
+
+
+def _close_tile_workers(connections, processes):
+    # Run by TiledVegetation's finalizer, which mustn't hold on to the model
+    for connection in connections:
+        try:
+            connection.send(("close", None))
+        except (BrokenPipeError, OSError):
+            pass
+    for process in processes:
+        process.join()
+    connections.clear()
+    processes.clear()
+
+
+class TiledVegetation(mesa.Model):
+    """
+    A vectorized `Vegetation` model split into tiles that step in parallel, one
+    worker process per tile, for study areas too big to step on one core.
+
+    The parent loads the rasters for the whole study area (so refugia status is
+    relative to the whole area, as in a single-process run) and hands each
+    worker its window of them. Each step, every tile steps its own trees, and
+    seeds that land outside of their parent's tile - at most
+    JOTR_SEED_DISPERSAL_DISTANCE from its edge - are sent back to the parent and
+    routed to the tile they landed in before the step's metrics are taken.
+    Per-tile counters are then summed into this model's DataCollector, which
+    has the same reporters as `Vegetation`.
+
+    Each tile draws from its own stream spawned from this model's rng, so runs
+    are reproducible for a given `seed` and number of tiles, and statistically
+    equivalent (not identical) to a single-process run.
+    """
+
+    def __init__(
+        self,
+        bounds,
+        n_tiles=None,
+        num_steps=20,
+        epsg=4326,
+        compact_every=None,
+        compact_dead_fraction=None,
+        log_level=EventLevel.SUMMARY,
+        raster_cache_dir=LOCAL_RASTER_CACHE_DIR,
+        initial_agents=None,
+        seed=None,
+        rng=None,
+        transitions=None,
+        aridity_series=None,
+        event_scheduling=False,
+        seedling_cohorts=False,
+    ):
+        super().__init__(rng=get_model_rng(seed, rng))
+        self.bounds = bounds
+        self.num_steps = num_steps
+
+        self.event_log = EventLog(log_level)
+        if self.event_log.agent_enabled:
+            self.event_log.close()
+            raise ValueError(
+                "Per-agent event logs aren't supported for tiled runs, use SUMMARY or OFF"
+            )
+
+        self.space = StudyArea(
+            bounds, epsg=epsg, model=self, raster_cache_dir=raster_cache_dir
+        )
+        self.space.get_elevation()
+        self.space.get_aridity()
+        self.space.get_refugia_status()
+
+        # Sum of the tiles' running counters, see update_metrics
+        self.jotr_metrics = JoshuaTreeMetrics()
+
+        height, width = self.space.raster_layer.height, self.space.raster_layer.width
+        self.row_edges, self.col_edges = get_tile_grid(
+            height, width, n_tiles or os.cpu_count()
+        )
+        self.n_tiles = (len(self.row_edges) - 1) * (len(self.col_edges) - 1)
+
+        if initial_agents is None:
+            initial_agents = INITIAL_AGENTS_PATH
+        x, y, age = read_jotr_inventory(initial_agents, self.space.crs)
+        tile_initial_agents = self._route(
+            x, y, age, np.full(len(x), NO_PARENT_ID, dtype=np.int64)
+        )
+
+        model_kwargs = {
+            "num_steps": num_steps,
+            "epsg": epsg,
+            # Tiles are handed their rasters, but still open the raster cache
+            "raster_cache_dir": raster_cache_dir,
+            "compact_every": compact_every,
+            "compact_dead_fraction": compact_dead_fraction,
+            "transitions": transitions,
+            # Each tile streams its own window of the series
+            "aridity_series": aridity_series,
+            "event_scheduling": event_scheduling,
+            "seedling_cohorts": seedling_cohorts,
+        }
+
+        # Workers are started up front and kept for the life of the model, since
+        # each holds its tile's population
+        context = multiprocessing.get_context()
+        self._connections = []
+        self._processes = []
+        # Workers are stopped at exit if they haven't been by then, or once the
+        # model is garbage collected
+        self._finalizer = weakref.finalize(
+            self, _close_tile_workers, self._connections, self._processes
+        )
+        tile_seed_sequences = np.random.SeedSequence(
+            int(self.rng.integers(np.iinfo(np.int64).max))
+        ).spawn(self.n_tiles)
+        for tile_index, tile_seed_sequence in enumerate(tile_seed_sequences):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_run_tile,
+                args=(
+                    worker_connection,
+                    tile_index,
+                    self.n_tiles,
+                    self._get_tile_rasters(tile_index),
+                    tile_initial_agents[tile_index],
+                    np.random.default_rng(tile_seed_sequence),
+                    model_kwargs,
+                ),
+                name=f"VegetationTile-{tile_index}",
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+        self.update_metrics([connection.recv() for connection in self._connections])
+
+        self.datacollector = mesa.DataCollector(JOTR_MODEL_REPORTERS)
+
+    def _get_tile_window(self, tile_index):
+        n_tile_cols = len(self.col_edges) - 1
+        tile_row, tile_col = divmod(tile_index, n_tile_cols)
+        return (
+            (self.row_edges[tile_row], self.row_edges[tile_row + 1]),
+            (self.col_edges[tile_col], self.col_edges[tile_col + 1]),
+        )
+
+    def _get_tile_rasters(self, tile_index):
+        (row_start, row_stop), (col_start, col_stop) = self._get_tile_window(tile_index)
+        return CachedRaster(
+            key=None,
+            bands={
+                band_name: np.array(
+                    self.space.rasters[band_name][row_start:row_stop, col_start:col_stop]
+                )
+                for band_name in TILE_BANDS
+            },
+            transform=self.space.raster_layer.transform
+            @ Affine.translation(int(col_start), int(row_start)),
+            crs=self.space.crs.to_string(),
+        )
+
+    def _route(self, x, y, age, parent_id):
+        # Split trees by the tile they fall in, as (x, y, age, parent_id, row, col)
+        # with tile-relative raster indices. Trees outside the study area are
+        # dropped, as in a single-process run
+        float_col, float_row = get_raster_indices(self.space.raster_layer.transform, x, y)
+        on_raster = self.space.is_on_raster(float_col, float_row)
+        row = np.floor(float_row[on_raster]).astype(np.int64)
+        col = np.floor(float_col[on_raster]).astype(np.int64)
+        x, y, age, parent_id = x[on_raster], y[on_raster], age[on_raster], parent_id[on_raster]
+
+        tile_row = np.searchsorted(self.row_edges, row, side="right") - 1
+        tile_col = np.searchsorted(self.col_edges, col, side="right") - 1
+        tile_index = tile_row * (len(self.col_edges) - 1) + tile_col
+
+        routed = []
+        for i in range(self.n_tiles):
+            in_tile = tile_index == i
+            (row_start, _), (col_start, _) = self._get_tile_window(i)
+            routed.append(
+                (
+                    x[in_tile],
+                    y[in_tile],
+                    age[in_tile],
+                    parent_id[in_tile],
+                    row[in_tile] - row_start,
+                    col[in_tile] - col_start,
+                )
+            )
+        return routed
+
+    def _send_all(self, command, payloads=None):
+        if payloads is None:
+            payloads = [None] * self.n_tiles
+        for connection, payload in zip(self._connections, payloads):
+            connection.send((command, payload))
+        return [connection.recv() for connection in self._connections]
+
+    def update_metrics(self, tile_metrics):
+        metrics = self.jotr_metrics
+        metrics.life_stage_counts = np.sum(
+            [tile["life_stage_counts"] for tile in tile_metrics], axis=0
+        )
+        metrics.n_total = sum(tile["n_total"] for tile in tile_metrics)
+        metrics.age_sum = sum(tile["age_sum"] for tile in tile_metrics)
+        self.space.n_refugia_cells_occupied = sum(
+            tile["n_refugia_cells_occupied"] for tile in tile_metrics
+        )
+
+        self.mean_age = metrics.mean_age
+
+        self.n_seeds = metrics.count(LifeStage.SEED)
+        self.n_seedlings = metrics.count(LifeStage.SEEDLING)
+        self.n_juveniles = metrics.count(LifeStage.JUVENILE)
+        self.n_adults = metrics.count(LifeStage.ADULT)
+        self.n_breeding = metrics.count(LifeStage.BREEDING)
+        self.n_dead = metrics.count(LifeStage.DEAD)
+
+        self.n_agents = metrics.n_alive
+
+        self.pct_refugia_cells_occupied = self.space.get_pct_refugia_cells_occupied()
+
+    def gather_jotr_population(self):
+        # The living (and not yet compacted) trees of every tile, with raster
+        # indices relative to the whole study area
+        populations = []
+        for tile_index, (population, _) in enumerate(self._send_all("gather")):
+            (row_start, _), (col_start, _) = self._get_tile_window(tile_index)
+            population["row"] += row_start
+            population["col"] += col_start
+            populations.append(population)
+        return {
+            field: np.concatenate([population[field] for population in populations])
+            for field in JoshuaTreePopulation.FIELDS
+        }
+
+    def gather_jotr_archive(self):
+        archives = [archive for _, archive in self._send_all("gather")]
+        return {
+            column: np.concatenate([archive[column] for archive in archives])
+            for column in archives[0]
+        }
+
+    def step(self):
+        log_step_header(self.event_log, self.steps)
+
+        # Step every tile, then hand seeds that crossed a tile boundary to the
+        # tile they landed in
+        emigrants = self._send_all("step")
+        immigrants = self._route(
+            *(np.concatenate(columns) for columns in zip(*emigrants))
+        )
+        self.update_metrics(self._send_all("immigrate", immigrants))
+
+        log_step_summary(self.event_log, self)
+        self.event_log.flush()
+
+        self.datacollector.collect(self)
+
+    def close(self):
+        self._finalizer()
@@ -0,0 +1,114 @@
+import contextlib
+import gc
+import time
+
+import pandas as pd
+
+# Shared do-nothing phase, for when timing is off
+NO_TIMING = contextlib.nullcontext()
+
+
+class _ObjectCounter:
+    # Net number of objects tracked by the garbage collector (i.e. containers:
+    # agents, lists, dicts, ... but not e.g. numpy buffers) allocated since it
+    # was created. gc's generation 0 count is exactly that, but is reset by
+    # every collection, so it's carried over just before each one
+
+    def __init__(self):
+        self.n_objects_before_collections = 0
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self.n_objects_before_collections += gc.get_count()[0]
+
+    def get(self):
+        return self.n_objects_before_collections + gc.get_count()[0]
+
+
+# Created on first use, and shared by every PhaseTimer, so that timing never
+# adds more than one gc callback
+_object_counter = None
+
+
+class _Phase:
+    # Context manager accumulating a phase's totals over a step. One is kept
+    # per phase and reused, so timing a phase allocates nothing itself
+
+    __slots__ = [
+        "seconds",
+        "calls",
+        "allocated_objects",
+        "time_at_start",
+        "objects_at_start",
+    ]
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.allocated_objects = 0
+
+    def __enter__(self):
+        self.objects_at_start = _object_counter.get()
+        self.time_at_start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self.time_at_start
+        self.calls += 1
+        # The bound __enter__ method is counted at the start, but freed by now
+        self.allocated_objects += (
+            _object_counter.get() - self.objects_at_start + 1
+        )
+
+
+class PhaseTimer:
+    """
+    Wall time, call count and net allocated objects per phase of the step loop.
+
+    Phases are timed with
+
+        with model.time_phase("update_metrics"):
+            ...
+
+    and accumulate until `end_step` records them as that step's row of the
+    time series, so phases timed between steps (e.g. rendering) count towards
+    the next step. Phases shouldn't be nested, or the inner phase is counted
+    twice.
+    """
+
+    COLUMNS = ["step", "phase", "seconds", "calls", "allocated_objects"]
+
+    def __init__(self):
+        global _object_counter
+        if _object_counter is None:
+            _object_counter = _ObjectCounter()
+
+        self._phases = {}
+        self.records = {column: [] for column in self.COLUMNS}
+
+    def phase(self, name):
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase()
+        return phase
+
+    def end_step(self, step):
+        for name, phase in self._phases.items():
+            if not phase.calls:
+                continue
+            self.records["step"].append(step)
+            self.records["phase"].append(name)
+            self.records["seconds"].append(phase.seconds)
+            self.records["calls"].append(phase.calls)
+            self.records["allocated_objects"].append(phase.allocated_objects)
+            phase.__init__()
+
+    def get_dataframe(self):
+        # Long format, one row per (step, phase)
+        return pd.DataFrame(self.records, columns=self.COLUMNS)
+
+    def get_phase_seconds(self):
+        # Wide format, one row per step and one column per phase
+        return self.get_dataframe().pivot_table(
+            index="step", columns="phase", values="seconds", fill_value=0.0
+        )
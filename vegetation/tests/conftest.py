@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Modules import each other as top-level `config` and `patch` packages, as when
+# run from within the `vegetation` directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents  # noqa: E402
+from patch.events import EventLevel  # noqa: E402
+from patch.model import Vegetation  # noqa: E402
+
+RASTER_SIZE = 30
+N_INITIAL_AGENTS = 200
+
+
+@pytest.fixture
+def raster_cache_dir(tmp_path):
+    return str(tmp_path / "raster_cache")
+
+
+@pytest.fixture
+def make_model(raster_cache_dir):
+    # Models on the same small synthetic raster, with the same initial trees
+    rng = np.random.default_rng(0)
+    bounds = cache_synthetic_dem(raster_cache_dir, RASTER_SIZE, rng)
+    initial_agents = make_initial_agents(bounds, N_INITIAL_AGENTS, rng)
+
+    def make_model(**model_kwargs):
+        model_kwargs = {
+            "log_level": EventLevel.OFF,
+            "initial_agents": initial_agents,
+            "seed": 0,
+            **model_kwargs,
+        }
+        return Vegetation(bounds=bounds, raster_cache_dir=raster_cache_dir, **model_kwargs)
+
+    return make_model
+
+
+@pytest.fixture
+def mean_life_stage_counts(make_model):
+    # Life stage counts after `n_steps`, averaged over replicates seeded 0 to
+    # n_seeds - 1, for comparing engines that should agree in distribution
+    def mean_life_stage_counts(n_seeds, n_steps, **model_kwargs):
+        counts = []
+        for seed in range(n_seeds):
+            model = make_model(seed=seed, **model_kwargs)
+            for _ in range(n_steps):
+                model.step()
+            counts.append(model.jotr_metrics.life_stage_counts.copy())
+        return np.mean(counts, axis=0)
+
+    return mean_life_stage_counts
@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from patch.cache import RasterCache
+
+BOUNDS = [0.0, 0.0, 1.0, 1.0]
+CRS = "epsg:4326"
+
+
+def test_concurrent_band_writes_are_all_kept(tmp_path):
+    cache = RasterCache(cache_dir=str(tmp_path))
+    key = cache.put("test", BOUNDS, CRS, {"elevation": np.zeros((16, 16))}).key
+
+    band_names = [f"band_{i}" for i in range(32)]
+
+    def put_band(band_name):
+        # A cache of its own, as a model in another process would have
+        RasterCache(cache_dir=str(tmp_path)).put_band(key, band_name, np.ones((16, 16)))
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(put_band, band_names))
+
+    cached = RasterCache(cache_dir=str(tmp_path)).get("test", BOUNDS, CRS)
+    assert sorted(cached.bands) == sorted(["elevation", *band_names])
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+from patch.checkpoint import fork_model, load_checkpoint, save_checkpoint
+from patch.events import EventLevel
+from patch.export import MODEL_VARS_PREFIX, read_model_vars
+
+
+def test_forks_export_to_their_own_directories(make_model, tmp_path):
+    export_dir = tmp_path / "export"
+    model = make_model(export_data=str(export_dir), export_chunk_steps=1)
+    model.step()
+
+    forks = fork_model(model, 2, seed=0)
+    for fork in forks:
+        fork.step()
+        fork.step()
+        fork.exporter.close()
+    model.exporter.close()
+
+    for i in range(len(forks)):
+        fork_export_dir = export_dir / f"fork-{i}"
+        chunks = [
+            filename
+            for filename in os.listdir(fork_export_dir)
+            if filename.startswith(MODEL_VARS_PREFIX)
+        ]
+        assert chunks
+        assert read_model_vars(str(fork_export_dir)).index.tolist() == [2, 3]
+
+
+def test_forks_of_a_model_exporting_to_new_directories_get_one_each(
+    make_model, tmp_path, monkeypatch
+):
+    monkeypatch.setattr("patch.model.LOCAL_EXPORT_DIR", str(tmp_path / "exports"))
+    model = make_model(export_data=True)
+    model.step()
+
+    forks = fork_model(model, 2, seed=0)
+    for fork in forks:
+        fork.exporter.close()
+    model.exporter.close()
+
+    export_dirs = {model.exporter.directory, *(fork.exporter.directory for fork in forks)}
+    assert len(export_dirs) == 3
+
+
+@pytest.mark.parametrize(
+    "model_kwargs",
+    [{}, {"vectorized": True}, {"seedling_cohorts": True}],
+    ids=["agents", "vectorized", "cohorts"],
+)
+def test_restored_models_continue_exactly_as_saved(make_model, tmp_path, model_kwargs):
+    model = make_model(**model_kwargs)
+    for _ in range(3):
+        model.step()
+    checkpoint_path = str(tmp_path / "checkpoint.npz")
+    save_checkpoint(model, checkpoint_path)
+
+    restored = load_checkpoint(
+        checkpoint_path,
+        raster_cache_dir=model.space.raster_cache.cache_dir,
+        log_level=EventLevel.OFF,
+    )
+    for _ in range(3):
+        model.step()
+        restored.step()
+
+    assert restored.steps == model.steps
+    state, restored_state = model.get_jotr_state(), restored.get_jotr_state()
+    for field, values in state.items():
+        if field in ["x", "y"]:
+            # Agents keep their positions as raster indices, which are
+            # restored from x and y, so they round trip to within a rounding
+            np.testing.assert_allclose(restored_state[field], values, rtol=1e-15)
+        else:
+            np.testing.assert_array_equal(restored_state[field], values, err_msg=field)
+    assert restored.datacollector.model_vars == model.datacollector.model_vars
+    np.testing.assert_array_equal(
+        restored.jotr_metrics.life_stage_counts, model.jotr_metrics.life_stage_counts
+    )
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+# As in test_population: seeded replicates, within a few standard errors
+N_SEEDS = 8
+N_STEPS = 8
+RTOL = 0.1
+ATOL = 3
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_seedling_cohorts_match_individual_trees(mean_life_stage_counts, vectorized):
+    np.testing.assert_allclose(
+        mean_life_stage_counts(
+            N_SEEDS, N_STEPS, vectorized=vectorized, seedling_cohorts=True
+        ),
+        mean_life_stage_counts(N_SEEDS, N_STEPS, vectorized=vectorized),
+        rtol=RTOL,
+        atol=ATOL,
+    )
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents
+from config.stages import LifeStage
+from patch.events import EventLevel
+from patch.model import Vegetation
+
+COMPACT_DEAD_FRACTION = 0.5
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_dead_fraction_counts_only_resident_trees_with_cohorts(tmp_path, vectorized):
+    rng = np.random.default_rng(0)
+    bounds = cache_synthetic_dem(str(tmp_path), 30, rng)
+    model = Vegetation(
+        bounds=bounds,
+        vectorized=vectorized,
+        compact_dead_fraction=COMPACT_DEAD_FRACTION,
+        seedling_cohorts=True,
+        log_level=EventLevel.OFF,
+        raster_cache_dir=str(tmp_path),
+        initial_agents=make_initial_agents(bounds, 200, rng),
+        seed=0,
+    )
+
+    for _ in range(10):
+        model.step()
+
+        # Dead cohort trees were never agents or population rows, so they
+        # mustn't count towards the trigger
+        life_stages = model.get_jotr_state()["life_stage"]
+        dead_fraction = np.mean(life_stages == LifeStage.DEAD) if len(life_stages) else 0
+        assert model.jotr_cohorts.n_dead > 0
+        assert model._should_compact() == (dead_fraction > COMPACT_DEAD_FRACTION)
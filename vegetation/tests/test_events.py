@@ -0,0 +1,42 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import weakref
+
+from patch.events import EventLevel, EventLog
+
+
+def read_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unclosed_event_log_is_collected_and_flushed(tmp_path):
+    path = tmp_path / "events.ndjson"
+    event_log = EventLog(EventLevel.AGENT, path=str(path))
+    event_log.agent("died", unique_id=1)
+
+    event_log_ref = weakref.ref(event_log)
+    del event_log
+    gc.collect()
+
+    assert event_log_ref() is None
+    assert read_events(path) == [{"unique_id": 1, "event": "died"}]
+
+
+def test_unclosed_event_log_is_flushed_at_exit(tmp_path):
+    path = tmp_path / "events.ndjson"
+    code = (
+        "from patch.events import EventLevel, EventLog\n"
+        f"event_log = EventLog(EventLevel.AGENT, path={str(path)!r})\n"
+        "event_log.agent('died', unique_id=1)\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+    )
+
+    assert read_events(path) == [{"unique_id": 1, "event": "died"}]
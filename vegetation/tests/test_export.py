@@ -0,0 +1,26 @@
+import gc
+import os
+import weakref
+from types import SimpleNamespace
+
+from patch.export import ModelExporter, get_export_dir, read_model_vars
+
+
+def test_unclosed_exporter_is_collected_and_flushed(tmp_path):
+    exporter = ModelExporter(str(tmp_path), {"Mean age": "mean_age"})
+    for step in range(1, 4):
+        exporter.record_step(SimpleNamespace(steps=step, mean_age=step * 2.0))
+
+    exporter_ref = weakref.ref(exporter)
+    del exporter
+    gc.collect()
+
+    assert exporter_ref() is None
+    assert read_model_vars(str(tmp_path))["Mean age"].tolist() == [2.0, 4.0, 6.0]
+
+
+def test_export_dirs_started_together_are_distinct(tmp_path):
+    export_dirs = [get_export_dir(str(tmp_path / "exports")) for _ in range(5)]
+
+    assert len(set(export_dirs)) == len(export_dirs)
+    assert all(os.listdir(export_dir) == [] for export_dir in export_dirs)
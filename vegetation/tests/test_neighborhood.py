@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from config.stages import LifeStage
+from patch.neighborhood import JoshuaTreeNeighborhood
+
+NURSE_STAGES = [LifeStage.ADULT, LifeStage.BREEDING]
+
+
+@pytest.mark.parametrize("radius", [0, 25, 30, 61, 100])
+def test_counts_are_over_cells_within_the_radius(radius):
+    rng = np.random.default_rng(0)
+    occupancy = rng.integers(0, 3, (len(LifeStage), 12, 15))
+    cell_size = (30.0, 20.0)
+    neighborhood = JoshuaTreeNeighborhood(occupancy, cell_size)
+
+    stage_counts = occupancy[NURSE_STAGES].sum(axis=0)
+    rows, cols = np.indices(stage_counts.shape)
+    expected = np.zeros(stage_counts.shape, dtype=np.int64)
+    for row, col in zip(rows.ravel(), cols.ravel()):
+        distances = np.hypot((rows - row) * cell_size[1], (cols - col) * cell_size[0])
+        expected[row, col] = stage_counts[distances <= radius].sum()
+
+    np.testing.assert_array_equal(
+        neighborhood.count_within(NURSE_STAGES, rows, cols, radius), expected
+    )
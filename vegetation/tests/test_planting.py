@@ -0,0 +1,57 @@
+import gc
+import weakref
+
+import numpy as np
+import pytest
+from affine import Affine
+from shapely.geometry import Point, box, mapping
+
+from patch.model import EMPTY_GEOJSON
+from patch.planting import get_planting_mask
+
+N_PLANTED = 50
+
+
+def test_planting_mask_covers_cells_whose_centers_are_in_the_area():
+    transform = Affine(10, 0, 0, 0, -10, 100)
+    geometries = [mapping(box(0, 60, 30, 100)), mapping(Point(85, 15).buffer(6))]
+
+    mask = get_planting_mask(geometries, transform, (10, 10), "EPSG:32611", "EPSG:32611")
+
+    expected = np.zeros((10, 10), dtype=bool)
+    expected[:4, :3] = True
+    expected[8, 8] = True
+    np.testing.assert_array_equal(mask, expected)
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_planted_trees_are_added_in_the_area_at_the_next_step(make_model, vectorized):
+    model = make_model(vectorized=vectorized, initial_agents=EMPTY_GEOJSON)
+    min_x, min_y, max_x, max_y = model.bounds
+    area = box(min_x, min_y, (min_x + max_x) / 2, (min_y + max_y) / 2)
+
+    future = model.plant([mapping(area)], n_trees=N_PLANTED, age=(1, 3))
+    x, y, age, _, _ = future.result()
+    assert len(x) == N_PLANTED
+    assert all(area.contains(Point(x_i, y_i)) for x_i, y_i in zip(x, y))
+    assert age.min() >= 1 and age.max() <= 3
+
+    assert model.get_jotr_state()["age"].size == 0
+    model.step()
+    np.testing.assert_array_equal(
+        np.sort(model.get_jotr_state()["x"]), np.sort(x)
+    )
+
+
+def test_planting_thread_is_shut_down_with_the_model(make_model):
+    # Without trees, since mesa keeps unique id counters by model
+    model = make_model(initial_agents=EMPTY_GEOJSON)
+    model.plant([mapping(box(*model.bounds))], n_trees=1).result()
+    executor = model._planting_executor
+
+    model_ref = weakref.ref(model)
+    del model
+    gc.collect()
+
+    assert model_ref() is None
+    assert executor._shutdown
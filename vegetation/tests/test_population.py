@@ -0,0 +1,17 @@
+import numpy as np
+
+# Replicates are seeded, so these comparisons are deterministic. The tolerance
+# is a few standard errors of the replicate means
+N_SEEDS = 8
+N_STEPS = 8
+RTOL = 0.1
+ATOL = 3
+
+
+def test_vectorized_engine_matches_agents_in_distribution(mean_life_stage_counts):
+    np.testing.assert_allclose(
+        mean_life_stage_counts(N_SEEDS, N_STEPS, vectorized=True),
+        mean_life_stage_counts(N_SEEDS, N_STEPS, vectorized=False),
+        rtol=RTOL,
+        atol=ATOL,
+    )
@@ -0,0 +1,47 @@
+import numpy as np
+
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents
+from patch.events import EventLevel
+from patch.model import Vegetation
+from patch.space import ARIDITY_NOISE_RANGE, get_aridity_noise
+
+
+def test_aridity_and_model_stream_dont_depend_on_the_cache(make_model):
+    cold = make_model()
+    warm = make_model()
+
+    np.testing.assert_array_equal(cold.space.rasters["aridity"], warm.space.rasters["aridity"])
+    assert cold.rng.random() == warm.rng.random()
+
+
+def test_aridity_noise_is_per_study_area(make_model):
+    model = make_model()
+    other_seed = make_model(seed=1)
+
+    noise = get_aridity_noise(model.bounds, model.space.crs.to_string())
+    assert abs(noise) <= ARIDITY_NOISE_RANGE
+    np.testing.assert_allclose(
+        model.space.rasters["aridity"], model.space.rasters["elevation"] + noise
+    )
+    np.testing.assert_array_equal(
+        model.space.rasters["aridity"], other_seed.space.rasters["aridity"]
+    )
+
+
+def test_cropped_study_areas_get_their_own_aridity_noise(raster_cache_dir):
+    rng = np.random.default_rng(0)
+    min_x, min_y, max_x, max_y = cache_synthetic_dem(raster_cache_dir, 40, rng)
+    bounds = [min_x, min_y, (min_x + max_x) / 2, (min_y + max_y) / 2]
+
+    model = Vegetation(
+        bounds=bounds,
+        log_level=EventLevel.OFF,
+        raster_cache_dir=raster_cache_dir,
+        initial_agents=make_initial_agents(bounds, 0, rng),
+        seed=0,
+    )
+
+    noise = get_aridity_noise(bounds, model.space.crs.to_string())
+    np.testing.assert_allclose(
+        model.space.rasters["aridity"], model.space.rasters["elevation"] + noise
+    )
@@ -0,0 +1,32 @@
+import numpy as np
+
+from benchmarks.synthetic import cache_synthetic_dem, make_initial_agents
+from patch.events import EventLevel
+from patch.tiles import TiledVegetation
+
+
+def test_tiles_use_the_given_raster_cache_dir(tmp_path, monkeypatch):
+    # Tile workers are spawned, so they'd pick up a default cache dir from here
+    default_cache_dir = tmp_path / "default_raster_cache"
+    monkeypatch.setenv("VEGETATION_RASTER_CACHE_DIR", str(default_cache_dir))
+
+    raster_cache_dir = tmp_path / "raster_cache"
+    rng = np.random.default_rng(0)
+    bounds = cache_synthetic_dem(str(raster_cache_dir), 40, rng)
+
+    model = TiledVegetation(
+        bounds,
+        n_tiles=2,
+        num_steps=2,
+        log_level=EventLevel.OFF,
+        raster_cache_dir=str(raster_cache_dir),
+        initial_agents=make_initial_agents(bounds, 100, rng),
+        seed=0,
+    )
+    try:
+        for _ in range(2):
+            model.step()
+    finally:
+        model.close()
+
+    assert not default_cache_dir.exists()
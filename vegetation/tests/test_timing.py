@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize(
+    "vectorized, step_phase, other_step_phase",
+    [(False, "agent_step", "survival"), (True, "survival", "agent_step")],
+)
+def test_step_phases_are_recorded(make_model, vectorized, step_phase, other_step_phase):
+    model = make_model(vectorized=vectorized, timing=True)
+    for _ in range(3):
+        model.step()
+
+    timings = model.timer.get_dataframe()
+    phases = set(timings["phase"])
+    assert {step_phase, "dispersal", "update_metrics", "datacollector"} <= phases
+    assert other_step_phase not in phases
+    assert timings["step"].unique().tolist() == [1, 2, 3]
+    assert (timings["seconds"] >= 0).all()
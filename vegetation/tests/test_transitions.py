@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from config.transitions import JOTR_TRANSITIONS, read_jotr_transitions
+
+
+def test_partial_overrides_keep_the_other_nested_defaults(tmp_path):
+    path = tmp_path / "transitions.json"
+    path.write_text(
+        json.dumps(
+            {
+                "stage_ages": {"adult": 20},
+                "survival": {"SEED": {"base_rate": 0.5}},
+                "breeding_poisson_lambda": {"base_rate": 5},
+            }
+        )
+    )
+    transitions = read_jotr_transitions(str(path))
+
+    assert transitions["stage_ages"] == {**JOTR_TRANSITIONS["stage_ages"], "adult": 20}
+    assert transitions["survival"]["SEED"] == {
+        **JOTR_TRANSITIONS["survival"]["SEED"],
+        "base_rate": 0.5,
+    }
+    assert transitions["survival"]["BREEDING"] == JOTR_TRANSITIONS["survival"]["BREEDING"]
+    assert transitions["breeding_poisson_lambda"] == {
+        **JOTR_TRANSITIONS["breeding_poisson_lambda"],
+        "base_rate": 5,
+    }
+    assert JOTR_TRANSITIONS["stage_ages"]["adult"] == 15
+
+
+def test_missing_survival_parameters_are_reported_at_load_time(tmp_path):
+    path = tmp_path / "transitions.json"
+    path.write_text(json.dumps({"survival": {"SEEDLING": None}}))
+
+    with pytest.raises(ValueError, match="SEEDLING"):
+        read_jotr_transitions(str(path))